@@ -0,0 +1,87 @@
+"""
+Реестр типов осмотров элементов (DM, TS, RP, TSS, GGS, TSG)
+Таблицы осмотров находятся в БД проекта. Реестр связывает тип с таблицей и схемами,
+списки колонок строятся из схем, чтобы SQL и API не расходились.
+"""
+
+import typing
+from dataclasses import dataclass, field
+from typing import Dict, List, Literal, Tuple, Type
+from pydantic import BaseModel
+from core.schemas import (
+    DMInspectionCreate, DMInspectionUpdate, DMInspectionResponse, DMInspectionBatchItem,
+    TSInspectionCreate, TSInspectionUpdate, TSInspectionResponse, TSInspectionBatchItem,
+    RPInspectionCreate, RPInspectionUpdate, RPInspectionResponse, RPInspectionBatchItem,
+    TSSInspectionCreate, TSSInspectionUpdate, TSSInspectionResponse, TSSInspectionBatchItem,
+    GGSInspectionCreate, GGSInspectionUpdate, GGSInspectionResponse, GGSInspectionBatchItem,
+    TSGInspectionCreate, TSGInspectionUpdate, TSGInspectionResponse, TSGInspectionBatchItem,
+)
+
+# Служебные поля, не относящиеся к чеклисту
+NON_CHECKLIST_FIELDS = ("cycle_id", "element_id", "note", "state_id", "photos", "photo_id")
+PHOTO_COLUMN = "photos"
+# Поля ответа, вычисляемые в API (в таблице их нет)
+DERIVED_RESPONSE_FIELDS = ("photo",)
+
+# Режим выдачи фото в ответах осмотров (query-параметр photos):
+# inline - байты в base64 в поле photos, descriptor - только описание со ссылкой (поле photo)
+PhotoMode = Literal["inline", "descriptor"]
+
+# Ключ осмотра: одна запись на элемент в цикле
+CONFLICT_COLUMNS = ("element_id", "cycle_id")
+
+# Типы колонок для jsonb_to_recordset (bytea передается в base64)
+SQL_TYPES = {int: "integer", float: "double precision", str: "text", bytes: "text"}
+
+
+def sql_type(annotation) -> str:
+    """Тип PostgreSQL по аннотации поля схемы (Optional[X] -> X)"""
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    return SQL_TYPES[args[0] if args else annotation]
+
+
+@dataclass(frozen=True)
+class InspectionType:
+    key: str  # dm, ts, rp, tss, ggs, tsg
+    table: str  # Таблица осмотров в БД проекта
+    create_schema: Type[BaseModel]
+    update_schema: Type[BaseModel]
+    response_schema: Type[BaseModel]
+    batch_item_schema: Type[BaseModel]
+    has_photo_column: bool = True  # В таблице TSS колонки photos нет
+    checklist_fields: Tuple[str, ...] = field(init=False)
+
+    def __post_init__(self):
+        fields = tuple(name for name in self.create_schema.model_fields if name not in NON_CHECKLIST_FIELDS)
+        object.__setattr__(self, "checklist_fields", fields)
+
+    def response_columns(self, include_photos: bool = True) -> List[str]:
+        """Колонки для SELECT ответа; без фото bytea-колонка не читается вовсе"""
+        include_photos = include_photos and self.has_photo_column
+        return [
+            name for name in self.response_schema.model_fields
+            if name not in DERIVED_RESPONSE_FIELDS and (include_photos or name != PHOTO_COLUMN)
+        ]
+
+    def write_columns(self) -> Dict[str, str]:
+        """
+        Колонки записи пакета осмотров и их типы (по схеме элемента пакета). Колонка photos
+        пакетом не пишется: фото из photos переносится в хранилище, осмотр ссылается на photo_id
+        """
+        return {
+            name: sql_type(info.annotation)
+            for name, info in self.batch_item_schema.model_fields.items()
+            if name != PHOTO_COLUMN
+        }
+
+
+INSPECTION_TYPES: Dict[str, InspectionType] = {
+    item.key: item for item in (
+        InspectionType("dm", "dm_inspections", DMInspectionCreate, DMInspectionUpdate, DMInspectionResponse, DMInspectionBatchItem),
+        InspectionType("ts", "ts_inspections", TSInspectionCreate, TSInspectionUpdate, TSInspectionResponse, TSInspectionBatchItem),
+        InspectionType("rp", "rp_inspections", RPInspectionCreate, RPInspectionUpdate, RPInspectionResponse, RPInspectionBatchItem),
+        InspectionType("tss", "tss_inspections", TSSInspectionCreate, TSSInspectionUpdate, TSSInspectionResponse, TSSInspectionBatchItem, has_photo_column=False),
+        InspectionType("ggs", "ggs_inspections", GGSInspectionCreate, GGSInspectionUpdate, GGSInspectionResponse, GGSInspectionBatchItem),
+        InspectionType("tsg", "tsg_inspections", TSGInspectionCreate, TSGInspectionUpdate, TSGInspectionResponse, TSGInspectionBatchItem),
+    )
+}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON, LargeBinary, Float
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, Text, ForeignKey, JSON, LargeBinary, Float, Index
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -73,7 +73,10 @@ class ProjectPermission(Base):
     project = relationship("Project", back_populates="permissions")
     
     # Уникальный индекс для комбинации пользователя и проекта
-    __table_args__ = ({"extend_existing": True})
+    __table_args__ = (
+        Index("uq_project_permissions_user_project", "user_id", "project_id", unique=True),
+        {"extend_existing": True},
+    )
     
     def __repr__(self):
         return f"<ProjectPermission(user_id={self.user_id}, project_id={self.project_id}, role='{self.role}')>"
@@ -107,6 +110,96 @@ class AuditLog(Base):
         return f"<AuditLog(id={self.id}, user_id={self.user_id}, action='{self.action_name}', category='{self.category}')>"
 
 
+class Photo(Base):
+    """
+    Фотографии осмотров (content-addressed)
+    Файл хранится в PHOTO_STORAGE_DIR по SHA-256 содержимого, в БД - только метаданные
+    и счетчик ссылок (одно фото может использоваться в нескольких осмотрах и циклах)
+    """
+    __tablename__ = "photos"
+    
+    sha256 = Column(String(64), primary_key=True)  # SHA-256 содержимого (hex) - он же ID фото
+    size = Column(BigInteger, nullable=False)  # Размер в байтах
+    content_type = Column(String(100), nullable=True)  # MIME тип (image/jpeg и т.д.)
+    ref_count = Column(Integer, default=0, server_default="0", nullable=False)  # Количество осмотров, ссылающихся на фото
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())  # Последняя загрузка или изменение ссылок
+    
+    __table_args__ = (
+        # Кандидаты для сборщика мусора
+        Index("ix_photos_orphans", "updated_at", postgresql_where=(ref_count == 0)),
+    )
+    
+    def __repr__(self):
+        return f"<Photo(sha256='{self.sha256}', size={self.size}, refs={self.ref_count})>"
+
+
+class PhotoProject(Base):
+    """
+    Принадлежность фото проекту: файл в хранилище общий, но доступен только проектам,
+    в которые он был загружен
+    """
+    __tablename__ = "photo_projects"
+
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    sha256 = Column(String(64), ForeignKey("photos.sha256", ondelete="CASCADE"), primary_key=True, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<PhotoProject(project_id={self.project_id}, sha256='{self.sha256}')>"
+
+
+class IdempotencyKey(Base):
+    """
+    Ключи идемпотентности (заголовок Idempotency-Key) повторяемых POST-запросов
+    Хранит отпечаток запроса и ответ: повтор с тем же ключом получает сохраненный ответ
+    без повторного выполнения
+    """
+    __tablename__ = "idempotency_keys"
+    
+    scope = Column(String(255), primary_key=True)  # Метод, путь и пользователь
+    idempotency_key = Column(String(255), primary_key=True)  # Значение заголовка Idempotency-Key
+    fingerprint = Column(String(64), nullable=False)  # SHA-256 строки запроса и тела
+    status = Column(String(20), default="in_progress", nullable=False)  # in_progress, completed
+    response_status = Column(Integer, nullable=True)
+    response_content_type = Column(String(255), nullable=True)
+    response_headers = Column(JSONB, nullable=True)  # Заголовки ответа: пары [имя, значение]
+    response_body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<IdempotencyKey(scope='{self.scope}', key='{self.idempotency_key}', status='{self.status}')>"
+
+
+class PositionAttributeCopyJob(Base):
+    """
+    Фоновые задачи копирования параметров позиций на крупную цель (объект, проект)
+    Прогресс и запрос отмены хранятся в центральной БД и видны всем воркерам API
+    """
+    __tablename__ = "position_attribute_copy_jobs"
+
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    source_position_id = Column(Integer, nullable=False)
+    target_type = Column(String(20), nullable=False)  # position, subobject, object, project
+    target_id = Column(Integer, nullable=True)
+    status = Column(String(20), default="pending", nullable=False)  # pending, running, completed, failed, cancelled
+    total = Column(Integer, default=0, nullable=False)  # Позиций в цели на момент запуска
+    processed = Column(Integer, default=0, nullable=False)
+    created = Column(Integer, default=0, nullable=False)
+    updated = Column(Integer, default=0, nullable=False)
+    cancel_requested = Column(Boolean, default=False, nullable=False)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<PositionAttributeCopyJob(id={self.id}, project_id={self.project_id}, status='{self.status}')>"
+
+
 class GeologyEgeCatalogGlobal(Base):
     """
     Общий справочник ИГЭ (Инженерно-геологических элементов)
@@ -0,0 +1,115 @@
+"""
+Подключения к БД проектов
+У каждого проекта своя БД (параметры в таблице projects, пароль зашифрован Fernet).
+Движки кэшируются по проекту и пересоздаются при изменении параметров подключения.
+"""
+
+import os
+import threading
+from typing import Dict, Generator, Tuple
+from cryptography.fernet import Fernet, InvalidToken
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, URL
+from sqlalchemy.orm import Session, sessionmaker
+from core.database import get_db
+from core.models import Project
+from utils.auth_utils import get_encryption_key
+import structlog
+
+logger = structlog.get_logger()
+
+PROJECT_DB_POOL_SIZE = int(os.environ.get("PROJECT_DB_POOL_SIZE", "5"))
+PROJECT_DB_MAX_OVERFLOW = int(os.environ.get("PROJECT_DB_MAX_OVERFLOW", "5"))
+
+_ConnectionKey = Tuple[str, int, str, str, str]
+
+_lock = threading.Lock()
+_sessionmakers: Dict[int, Tuple[_ConnectionKey, sessionmaker]] = {}
+
+
+def decrypt_db_password(encrypted_password: str) -> str:
+    """Расшифровка пароля БД проекта"""
+    try:
+        return Fernet(get_encryption_key()).decrypt(encrypted_password.encode()).decode()
+    except InvalidToken:
+        raise ValueError("Не удалось расшифровать пароль БД проекта")
+
+
+def _connection_key(project: Project) -> _ConnectionKey:
+    return (project.db_host, project.db_port, project.db_name, project.db_user, project.db_password)
+
+
+def _create_engine(project: Project) -> Engine:
+    url = URL.create(
+        "postgresql",
+        username=project.db_user,
+        password=decrypt_db_password(project.db_password),
+        host=project.db_host,
+        port=project.db_port,
+        database=project.db_name,
+    )
+    return create_engine(
+        url,
+        pool_pre_ping=True,
+        pool_recycle=300,
+        pool_size=PROJECT_DB_POOL_SIZE,
+        max_overflow=PROJECT_DB_MAX_OVERFLOW,
+    )
+
+
+def get_project_sessionmaker(project: Project) -> sessionmaker:
+    """Фабрика сессий БД проекта (движок создается один раз на проект)"""
+    key = _connection_key(project)
+    with _lock:
+        cached = _sessionmakers.get(project.id)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        if cached is not None:
+            cached[1].kw["bind"].dispose()
+        factory = sessionmaker(autocommit=False, autoflush=False, bind=_create_engine(project))
+        _sessionmakers[project.id] = (key, factory)
+        logger.info("Project database engine created", project_id=project.id, host=project.db_host)
+        return factory
+
+
+def dispose_project_engines() -> None:
+    """Закрытие всех подключений к БД проектов"""
+    with _lock:
+        for _, factory in _sessionmakers.values():
+            factory.kw["bind"].dispose()
+        _sessionmakers.clear()
+
+
+def get_project_factory(project_id: int, db: Session = Depends(get_db)) -> sessionmaker:
+    """Зависимость: фабрика сессий БД проекта (для фоновых задач, переживающих запрос)"""
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if project is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Проект не найден"
+        )
+    if not project.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Проект отключен"
+        )
+
+    try:
+        return get_project_sessionmaker(project)
+    except ValueError as e:
+        logger.error("Project database unavailable", project_id=project_id, error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="БД проекта недоступна"
+        )
+
+
+def get_project_db(factory: sessionmaker = Depends(get_project_factory)) -> Generator[Session, None, None]:
+    """Зависимость для получения сессии БД проекта"""
+    project_db = factory()
+    try:
+        yield project_db
+    finally:
+        project_db.close()
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr, Field, validator, field_validator
-from typing import Optional, List, Dict, Any, Union
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, ValidationError, WrapValidator, validator, field_validator, model_validator
+from typing import Annotated, Optional, List, Dict, Any, Union, Literal
+from datetime import date, datetime
 from uuid import UUID
 from fastapi import UploadFile
 import base64
@@ -77,6 +77,31 @@ class ProjectPermissionUpdate(BaseModel):
     role: str  # operator, manager, viewer, no_access
 
 
+class ProjectPermissionBulkGrant(BaseModel):
+    user_emails: List[str] = Field(..., min_length=1)
+    project_ids: List[int] = Field(..., min_length=1)
+    roles: List[str] = Field(..., min_length=1, description="Одна роль для всех email или по роли на каждый email")
+
+
+class ProjectPermissionBulkRevoke(BaseModel):
+    user_emails: List[str] = Field(..., min_length=1)
+    project_ids: List[int] = Field(..., min_length=1)
+
+
+class ProjectPermissionKey(BaseModel):
+    user_id: int
+    project_id: int
+
+
+class ProjectPermissionBulkResponse(BaseModel):
+    created: List[ProjectPermissionKey] = []
+    updated: List[ProjectPermissionKey] = []
+    unchanged: List[ProjectPermissionKey] = []
+    deleted: List[ProjectPermissionKey] = []
+    unknown_emails: List[str] = []
+    unknown_project_ids: List[int] = []
+
+
 class ProjectPermissionResponse(BaseModel):
     id: int
     user_id: int
@@ -175,14 +200,20 @@ class PasswordResetRequest(BaseModel):
 class SchedulerTaskCreate(BaseModel):
     subobject_id: int
     cycle_id: int
-    start_date: str  # YYYY-MM-DD
-    end_date: str  # YYYY-MM-DD
+    start_date: date  # YYYY-MM-DD
+    end_date: date  # YYYY-MM-DD, включительно
+
+    @model_validator(mode='after')
+    def validate_period(self):
+        if self.end_date < self.start_date:
+            raise ValueError('end_date раньше start_date')
+        return self
 
 
 class SchedulerTaskUpdate(BaseModel):
     cycle_id: Optional[int] = None
-    start_date: Optional[str] = None  # YYYY-MM-DD
-    end_date: Optional[str] = None  # YYYY-MM-DD
+    start_date: Optional[date] = None  # YYYY-MM-DD
+    end_date: Optional[date] = None  # YYYY-MM-DD
 
 
 class SchedulerTaskResponse(BaseModel):
@@ -193,8 +224,8 @@ class SchedulerTaskResponse(BaseModel):
     object_name: str
     cycle_id: int
     cycle_number: Optional[int] = None
-    start_date: str  # YYYY-MM-DD
-    end_date: str  # YYYY-MM-DD
+    start_date: date  # YYYY-MM-DD
+    end_date: date  # YYYY-MM-DD
     total_positions: int
     completed_positions: int
     progress: float  # 0-100
@@ -208,6 +239,110 @@ class SchedulerTaskResponse(BaseModel):
     completed_ts_elements: Optional[int] = None
 
 
+class SchedulerTaskProgress(BaseModel):
+    """Прогресс задачи планировщика (из счетчиков по подобъекту и циклу)"""
+    task_id: int
+    subobject_id: int
+    cycle_id: int
+    total_positions: int
+    completed_positions: int
+    progress: float  # 0-100
+    total_dm_elements: int
+    completed_dm_elements: int
+    total_ts_elements: int
+    completed_ts_elements: int
+
+
+class SchedulerCalendarTask(BaseModel):
+    """Задача в окне календаря"""
+    id: int
+    subobject_id: int
+    cycle_id: int
+    start_date: date
+    end_date: date
+
+
+class SchedulerProposedTask(BaseModel):
+    """Предлагаемое окно задачи (task_id - перенос существующей задачи)"""
+    task_id: Optional[int] = None
+    subobject_id: int
+    start_date: date
+    end_date: date
+
+    @model_validator(mode='after')
+    def validate_period(self):
+        if self.end_date < self.start_date:
+            raise ValueError('end_date раньше start_date')
+        return self
+
+
+class SchedulerConflictCheckRequest(BaseModel):
+    tasks: List[SchedulerProposedTask] = Field(..., max_length=5000)
+
+
+class SchedulerTaskConflict(BaseModel):
+    """Пересечение: с существующей задачей (task_id) или с другой задачей запроса (index)"""
+    task_id: Optional[int] = None
+    index: Optional[int] = None
+    start_date: date
+    end_date: date
+
+
+class SchedulerConflictResult(BaseModel):
+    index: int  # Позиция задачи в запросе
+    conflicts: List[SchedulerTaskConflict]
+
+
+class SchedulerConflictCheckResponse(BaseModel):
+    """Только задачи с пересечениями; пустой items - расписание без конфликтов"""
+    has_conflicts: bool
+    items: List[SchedulerConflictResult] = []
+
+
+class SchedulerPlanRequest(BaseModel):
+    """План цикла: задача с одним окном для каждого подобъекта (или для перечисленных)"""
+    cycle_id: int
+    start_date: date
+    end_date: date
+    subobject_ids: Optional[List[int]] = Field(None, max_length=10000)
+
+    @model_validator(mode='after')
+    def validate_period(self):
+        if self.end_date < self.start_date:
+            raise ValueError('end_date раньше start_date')
+        return self
+
+
+class SchedulerPlanResponse(BaseModel):
+    cycle_id: int
+    created: int
+    skipped_existing: int  # У подобъекта уже есть задача в этом цикле
+    skipped_conflicts: int  # Окно пересекается с другой задачей подобъекта
+    not_found: List[int] = []  # Перечисленные подобъекты без позиций
+    task_ids: List[int] = []
+
+
+class RouteStop(BaseModel):
+    position_id: int
+    x: float  # Координаты с поправкой азимута севера
+    y: float
+    leg_distance: float  # От предыдущей позиции
+    bearing: Optional[float] = None  # Азимут перехода от предыдущей позиции, градусы
+
+
+class RoutePlanResponse(BaseModel):
+    """Порядок обхода позиций подобъекта"""
+    subobject_id: int
+    version: str  # Версия набора позиций (хэш id и координат)
+    positions: int
+    total_distance: float
+    nearest_neighbour_distance: float  # Длина жадного маршрута до улучшения
+    improvement_passes: int
+    azimuth_correction: float
+    order: List[RouteStop]
+    cached: bool = False
+
+
 # Схемы для циклов
 class CycleCreate(BaseModel):
     number: int
@@ -231,6 +366,22 @@ class CycleResponse(BaseModel):
     description: Optional[str] = None
     has_data: bool = False
     cycle_status: int = 0  # 0=план, 1=активный, 2=завершенный
+    frozen: bool = False  # Осмотры цикла сохранены в снимок
+
+
+class CycleSnapshotInfo(BaseModel):
+    """Снимок замороженного цикла"""
+    cycle_id: int
+    archived: bool  # Строки цикла удалены из таблиц осмотров (читаются из снимка)
+    created_at: datetime
+    rows: Dict[str, int] = {}  # Таблица -> строк в снимке
+
+
+class CycleUnfreezeResponse(BaseModel):
+    cycle_id: int
+    archived: bool
+    restored: Dict[str, int] = {}  # Таблица -> возвращено строк
+    conflicts: Dict[str, int] = {}  # Таблица -> строк снимка, не возвращенных из-за живых строк с тем же ключом
 
 
 # Схемы для логирования действий
@@ -281,6 +432,7 @@ class ProjectMetadataResponse(BaseModel):
     current_cycle_id: Optional[int] = None
     planned_cycle_id: Optional[int] = None
     excluded_positions: List[int] = []
+    excluded_position_ranges: List[List[int]] = []  # Те же позиции диапазонами [start, end]
 
 
 class ProjectMetadataUpdate(BaseModel):
@@ -288,6 +440,19 @@ class ProjectMetadataUpdate(BaseModel):
     current_cycle_id: Optional[int] = Field(None, description="ID текущего цикла, -1 для удаления")
     planned_cycle_id: Optional[int] = Field(None, description="ID планируемого цикла, -1 для удаления")
     excluded_positions: Optional[List[int]] = None
+    # Дельты для списков (применяются в БД, без передачи всего списка)
+    completed_cycles_add: Optional[List[int]] = None
+    completed_cycles_remove: Optional[List[int]] = None
+    excluded_positions_add: Optional[List[int]] = None
+    excluded_positions_remove: Optional[List[int]] = None
+
+    @model_validator(mode='after')
+    def validate_list_changes(self):
+        for field in ('completed_cycles', 'excluded_positions'):
+            has_delta = getattr(self, f"{field}_add") is not None or getattr(self, f"{field}_remove") is not None
+            if getattr(self, field) is not None and has_delta:
+                raise ValueError(f"{field}: укажите либо полный список, либо изменения (_add/_remove)")
+        return self
 
 
 # Схемы для параметров позиций (positions_attributes)
@@ -322,14 +487,133 @@ class PositionAttributeResponse(PositionAttributeBase):
         from_attributes = True
 
 
+# ==================== Пакеты с поэлементной проверкой ====================
+
+class InvalidBatchItem(BaseModel):
+    """Строка пакета, не прошедшая проверку схемы: не записывается, ошибка уходит в результат строки"""
+    raw: Any = None
+    error: str
+
+    def raw_int(self, name: str) -> Optional[int]:
+        """Целое поле исходной строки (ID для результата), если оно есть"""
+        value = self.raw.get(name) if isinstance(self.raw, dict) else None
+        return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def validation_message(error: ValidationError, skip: int = 0) -> str:
+    """Первая ошибка проверки: путь к полю и сообщение (skip - число отбрасываемых частей пути)"""
+    first = error.errors()[0]
+    location = ".".join(str(part) for part in first["loc"][skip:])
+    return f"{location}: {first['msg']}" if location else first["msg"]
+
+
+def batch_items(max_length: Optional[int] = None) -> WrapValidator:
+    """
+    Поэлементная проверка списка пакета: строки проверяются схемой элемента по отдельности,
+    ошибочная строка заменяется InvalidBatchItem и не отклоняет пакет. Схема элемента
+    остается в OpenAPI. max_length проверяется здесь: ограничение Field применяется к каждой строке
+    """
+    def validate(value: Any, handler):
+        if not isinstance(value, list):
+            return handler(value)
+        if max_length is not None and len(value) > max_length:
+            raise ValueError(f"Не более {max_length} строк в пакете")
+        items = []
+        for raw in value:
+            try:
+                items.extend(handler([raw]))
+            except ValidationError as e:
+                items.append(InvalidBatchItem(raw=raw, error=validation_message(e, skip=1)))
+        return items
+
+    return WrapValidator(validate)
+
+
+# Строк в пакете параметров позиций не больше
+POSITION_ATTRIBUTES_BULK_MAX_ROWS = 10000
+
+
 class PositionAttributesBulkUpdate(BaseModel):
-    attributes: List[PositionAttributeUpdate]
+    """
+    Пакет параметров позиций (строки PositionAttributeUpdate). Строки проверяются по отдельности,
+    ошибка одной строки не отклоняет пакет. Обновляются только поля, переданные в строке
+    """
+    attributes: Annotated[
+        List[PositionAttributeUpdate],
+        batch_items(POSITION_ATTRIBUTES_BULK_MAX_ROWS),
+        Field(max_length=POSITION_ATTRIBUTES_BULK_MAX_ROWS)
+    ]
+
+
+class PositionAttributeRecord(PositionAttributeUpdate):
+    attr_id: int
+
+
+class PositionAttributeBulkItemResult(BaseModel):
+    """Результат записи строки пакета параметров"""
+    index: int  # Позиция строки в attributes
+    position_id: Optional[int] = None
+    status: Literal["created", "updated", "unchanged", "duplicate", "error"]
+    attr_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class PositionAttributesBulkResult(BaseModel):
+    """Ответ пакетного обновления параметров: измененные строки и результат по каждой строке"""
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    attributes: List[PositionAttributeRecord] = []
+    items: List[PositionAttributeBulkItemResult] = []
 
 
 class PositionAttributesCopyRequest(BaseModel):
     source_position_id: int
     target_type: str = Field(..., description="Тип цели: 'position', 'subobject', 'object' или 'project'")
     target_id: Optional[int] = Field(None, description="ID цели (position_id, subobject_id или object_id). Не требуется для 'project'")
+    dry_run: bool = Field(False, description="Только подсчет затрагиваемых позиций, без записи")
+
+    @model_validator(mode='after')
+    def validate_target(self):
+        if self.target_type not in ('position', 'subobject', 'object', 'project'):
+            raise ValueError("target_type: ожидается 'position', 'subobject', 'object' или 'project'")
+        if self.target_type != 'project' and self.target_id is None:
+            raise ValueError(f"target_id обязателен для target_type '{self.target_type}'")
+        return self
+
+
+class PositionAttributeCopyJobResponse(BaseModel):
+    """Фоновая задача копирования параметров (крупная цель)"""
+    id: int
+    status: Literal["pending", "running", "completed", "failed", "cancelled"]
+    source_position_id: int
+    target_type: str
+    target_id: Optional[int] = None
+    total: int  # Позиций в цели на момент запуска
+    processed: int
+    created: int
+    updated: int
+    cancel_requested: bool
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None  # Последний прогресс или пульс выполняемой задачи
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class PositionAttributesCopyResult(BaseModel):
+    """
+    Результат копирования параметров. Для крупной цели копирование идет в фоне (job),
+    created/updated - оценка на момент запуска
+    """
+    dry_run: bool
+    targets: int  # Позиций в цели (без позиции-источника)
+    created: int  # Позиций без параметров - получат новую строку
+    updated: int  # Позиций, параметры которых отличаются от источника
+    job: Optional[PositionAttributeCopyJobResponse] = None
 
 
 class PositionAttributesDeleteRequest(BaseModel):
@@ -669,6 +953,35 @@ class GeologyLayerUpdate(BaseModel):
     skip_validation: Optional[bool] = False  # Пропустить проверку пересечений (для операций перемещения/изменения мощности)
 
 
+# ==================== Схемы для фотографий ====================
+
+class PhotoUploadResponse(BaseModel):
+    """Загруженное фото (ID = SHA-256 содержимого)"""
+    photo_id: str
+    size: int
+    content_type: Optional[str] = None
+
+
+class PhotoHaveNeedRequest(BaseModel):
+    """Предпроверка перед загрузкой: SHA-256 фото, которые клиент собирается отправить"""
+    photo_ids: List[str]
+
+
+class PhotoHaveNeedResponse(BaseModel):
+    have: List[str] = []  # Уже есть на сервере - загружать не нужно
+    need: List[str] = []  # Нужно загрузить
+
+
+class PhotoDescriptor(BaseModel):
+    """Описание фото без содержимого: байты загружаются отдельно по url"""
+    photo_id: str
+    size: int
+    sha256: str
+    url: str  # Оригинал (архивная копия)
+    display_url: Optional[str] = None  # Пережатое фото для просмотра
+    thumbnail_url: Optional[str] = None  # Миниатюра для списков и сеток
+
+
 # ==================== Схемы для осмотров элементов ====================
 
 # DM Inspection - существующие таблицы с дополнениями
@@ -699,6 +1012,7 @@ class DMInspectionCreate(BaseModel):
     note: Optional[str] = Field(None, description="Комментарии к осмотру")
     state_id: Optional[str] = Field("exist", description="Статус элемента")
     photos: Optional[bytes] = Field(None, description="Фотографии осмотра")
+    photo_id: Optional[str] = Field(None, description="SHA-256 фото, загруженного через /photos (вместо base64 в photos)")
 
     @field_validator('photos', mode='before')
     @classmethod
@@ -727,6 +1041,7 @@ class DMInspectionUpdate(BaseModel):
     inspectresult: Optional[int] = Field(None, ge=0, le=5, description="Общий результат осмотра")
     note: Optional[str] = Field(None, description="Комментарии к осмотру")
     photos: Optional[bytes] = Field(None, description="Фотографии осмотра")
+    photo_id: Optional[str] = Field(None, description="SHA-256 фото, загруженного через /photos (вместо base64 в photos)")
 
 
 class DMInspectionResponse(BaseModel):
@@ -743,6 +1058,8 @@ class DMInspectionResponse(BaseModel):
     note: Optional[str]
     state_id: str
     photos: Optional[Union[bytes, str]]
+    photo_id: Optional[str] = None  # SHA-256 фото в хранилище
+    photo: Optional[PhotoDescriptor] = None  # Ссылка на фото вместо байт (photos=descriptor)
 
     @field_validator('photos', mode='before')
     @classmethod
@@ -773,6 +1090,7 @@ class TSInspectionCreate(BaseModel):
     depth: Optional[float] = Field(None, description="Глубина")
     h: Optional[float] = Field(None, description="Высота термотрубки")
     photos: Optional[bytes] = Field(None, description="Фотографии осмотра")
+    photo_id: Optional[str] = Field(None, description="SHA-256 фото, загруженного через /photos (вместо base64 в photos)")
 
     @field_validator('photos', mode='before')
     @classmethod
@@ -806,6 +1124,7 @@ class TSInspectionUpdate(BaseModel):
     depth: Optional[float] = Field(None, description="Глубина")
     h: Optional[float] = Field(None, description="Высота термотрубки")
     photos: Optional[bytes] = Field(None, description="Фотографии осмотра")
+    photo_id: Optional[str] = Field(None, description="SHA-256 фото, загруженного через /photos (вместо base64 в photos)")
 
 
 class TSInspectionResponse(BaseModel):
@@ -826,6 +1145,8 @@ class TSInspectionResponse(BaseModel):
     depth: Optional[float] = None
     h: Optional[float] = None
     photos: Optional[Union[bytes, str]]
+    photo_id: Optional[str] = None  # SHA-256 фото в хранилище
+    photo: Optional[PhotoDescriptor] = None  # Ссылка на фото вместо байт (photos=descriptor)
 
     @field_validator('photos', mode='before')
     @classmethod
@@ -854,6 +1175,7 @@ class RPInspectionCreate(BaseModel):
     note: Optional[str] = Field(None, description="Комментарии к осмотру")
     state_id: Optional[str] = Field("exist", description="Статус элемента")
     photos: Optional[bytes] = Field(None, description="Фотографии осмотра")
+    photo_id: Optional[str] = Field(None, description="SHA-256 фото, загруженного через /photos (вместо base64 в photos)")
 
     @field_validator('photos', mode='before')
     @classmethod
@@ -884,6 +1206,7 @@ class RPInspectionUpdate(BaseModel):
     inspectresult: Optional[int] = Field(None, ge=0, le=5, description="Общий результат осмотра")
     note: Optional[str] = Field(None, description="Комментарии к осмотру")
     photos: Optional[bytes] = Field(None, description="Фотографии осмотра")
+    photo_id: Optional[str] = Field(None, description="SHA-256 фото, загруженного через /photos (вместо base64 в photos)")
 
 
 class RPInspectionResponse(BaseModel):
@@ -901,6 +1224,8 @@ class RPInspectionResponse(BaseModel):
     note: Optional[str]
     state_id: str
     photos: Optional[Union[bytes, str]]
+    photo_id: Optional[str] = None  # SHA-256 фото в хранилище
+    photo: Optional[PhotoDescriptor] = None  # Ссылка на фото вместо байт (photos=descriptor)
 
     @field_validator('photos', mode='before')
     @classmethod
@@ -951,6 +1276,7 @@ class TSSInspectionCreate(BaseModel):
     note: Optional[str] = Field(None, description="Комментарии к осмотру")
     state_id: Optional[str] = Field("exist", description="Статус элемента")
     photos: Optional[bytes] = Field(None, description="Фотографии осмотра")  # Добавлено для совместимости, хотя в SQL нет
+    photo_id: Optional[str] = Field(None, description="SHA-256 фото, загруженного через /photos (вместо base64 в photos)")
 
     @field_validator('photos', mode='before')
     @classmethod
@@ -976,6 +1302,7 @@ class TSSInspectionUpdate(BaseModel):
     inspectresult: Optional[int] = Field(None, ge=0, le=5, description="Общий результат осмотра")
     note: Optional[str] = Field(None, description="Комментарии к осмотру")
     photos: Optional[bytes] = Field(None, description="Фотографии осмотра")
+    photo_id: Optional[str] = Field(None, description="SHA-256 фото, загруженного через /photos (вместо base64 в photos)")
 
 
 class TSSInspectionResponse(BaseModel):
@@ -989,6 +1316,8 @@ class TSSInspectionResponse(BaseModel):
     note: Optional[str]
     state_id: str
     photos: Optional[Union[bytes, str]] = None  # Возможно нет в БД, но для унификации оставим
+    photo_id: Optional[str] = None  # SHA-256 фото в хранилище
+    photo: Optional[PhotoDescriptor] = None  # Ссылка на фото вместо байт (photos=descriptor)
 
     @field_validator('photos', mode='before')
     @classmethod
@@ -1020,6 +1349,7 @@ class GGSInspectionCreate(BaseModel):
     note: Optional[str] = Field(None, description="Комментарии к осмотру")
     state_id: Optional[str] = Field("exist", description="Статус элемента")
     photos: Optional[bytes] = Field(None, description="Фотографии осмотра")
+    photo_id: Optional[str] = Field(None, description="SHA-256 фото, загруженного через /photos (вместо base64 в photos)")
 
     @field_validator('photos', mode='before')
     @classmethod
@@ -1052,6 +1382,7 @@ class GGSInspectionUpdate(BaseModel):
     h: Optional[float] = Field(None, description="Высота")
     note: Optional[str] = Field(None, description="Комментарии к осмотру")
     photos: Optional[bytes] = Field(None, description="Фотографии осмотра")
+    photo_id: Optional[str] = Field(None, description="SHA-256 фото, загруженного через /photos (вместо base64 в photos)")
 
 
 class GGSInspectionResponse(BaseModel):
@@ -1072,6 +1403,8 @@ class GGSInspectionResponse(BaseModel):
     note: Optional[str]
     state_id: str
     photos: Optional[Union[bytes, str]] = None
+    photo_id: Optional[str] = None  # SHA-256 фото в хранилище
+    photo: Optional[PhotoDescriptor] = None  # Ссылка на фото вместо байт (photos=descriptor)
 
     @field_validator('photos', mode='before')
     @classmethod
@@ -1095,6 +1428,7 @@ class TSGInspectionCreate(BaseModel):
     note: Optional[str] = Field(None, description="Комментарии к осмотру")
     state_id: Optional[str] = Field("exist", description="Статус элемента")
     photos: Optional[bytes] = Field(None, description="Фотографии осмотра")
+    photo_id: Optional[str] = Field(None, description="SHA-256 фото, загруженного через /photos (вместо base64 в photos)")
 
     @field_validator('photos', mode='before')
     @classmethod
@@ -1119,6 +1453,7 @@ class TSGInspectionUpdate(BaseModel):
     inspectresult: Optional[int] = Field(None, ge=0, le=5, description="Общий результат осмотра")
     note: Optional[str] = Field(None, description="Комментарии к осмотру")
     photos: Optional[bytes] = Field(None, description="Фотографии осмотра")
+    photo_id: Optional[str] = Field(None, description="SHA-256 фото, загруженного через /photos (вместо base64 в photos)")
 
 
 class TSGInspectionResponse(BaseModel):
@@ -1131,6 +1466,8 @@ class TSGInspectionResponse(BaseModel):
     note: Optional[str]
     state_id: str
     photos: Optional[Union[bytes, str]] = None
+    photo_id: Optional[str] = None  # SHA-256 фото в хранилище
+    photo: Optional[PhotoDescriptor] = None  # Ссылка на фото вместо байт (photos=descriptor)
 
     @field_validator('photos', mode='before')
     @classmethod
@@ -1168,12 +1505,16 @@ class TSGInspectionBatchItem(TSGInspectionCreate):
 
 
 class UnifiedInspectionBatchCreate(BaseModel):
-    dm: List[DMInspectionBatchItem] = []
-    ts: List[TSInspectionBatchItem] = []
-    rp: List[RPInspectionBatchItem] = []
-    tss: List[TSSInspectionBatchItem] = []
-    ggs: List[GGSInspectionBatchItem] = []
-    tsg: List[TSGInspectionBatchItem] = []
+    """
+    Пакет осмотров для поэлементной записи: элементы проверяются по отдельности
+    (batch_items), ошибка одного элемента не отклоняет весь пакет
+    """
+    dm: Annotated[List[DMInspectionBatchItem], batch_items()] = []
+    ts: Annotated[List[TSInspectionBatchItem], batch_items()] = []
+    rp: Annotated[List[RPInspectionBatchItem], batch_items()] = []
+    tss: Annotated[List[TSSInspectionBatchItem], batch_items()] = []
+    ggs: Annotated[List[GGSInspectionBatchItem], batch_items()] = []
+    tsg: Annotated[List[TSGInspectionBatchItem], batch_items()] = []
 
 
 class UnifiedInspectionResponse(BaseModel):
@@ -1185,4 +1526,72 @@ class UnifiedInspectionResponse(BaseModel):
     rp: List[RPInspectionResponse]
     tss: List[TSSInspectionResponse]
     ggs: List[GGSInspectionResponse]
-    tsg: List[TSGInspectionResponse]
\ No newline at end of file
+    tsg: List[TSGInspectionResponse]
+
+class InspectionBatchItemResult(BaseModel):
+    """Результат записи элемента пакета"""
+    type: str  # dm, ts, rp, tss, ggs, tsg
+    index: int  # Позиция элемента в списке своего типа
+    element_id: Optional[int] = None
+    status: Literal["created", "updated", "duplicate", "error"]
+    inspect_id: Optional[int] = None
+    photo_id: Optional[str] = None  # Фото осмотра в хранилище (в т.ч. принятое из photos)
+    error: Optional[str] = None
+
+
+class InspectionBatchResult(BaseModel):
+    """Ответ пакетной записи осмотров"""
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    items: List[InspectionBatchItemResult] = []
+
+
+# ==================== Схемы для дельта-синхронизации ====================
+
+class SyncChange(BaseModel):
+    """Изменение сущности: upsert (data - строка целиком) или tombstone (deleted)"""
+    entity: str  # dm, ts, rp, tss, ggs, tsg, position_attributes, scheduler_tasks
+    id: int
+    deleted: bool = False
+    data: Optional[Dict[str, Any]] = None
+
+
+class SyncChangesResponse(BaseModel):
+    """
+    Страница изменений. Пока next_cursor не пуст - запрашивать следующую страницу с cursor;
+    после последней страницы сохранить version и передать как since в следующей синхронизации
+    """
+    version: int
+    next_cursor: Optional[str] = None
+    changes: List[SyncChange] = []
+
+
+class FieldPackageStatus(BaseModel):
+    """Состояние полевого пакета цикла (ответ 202, пока пакет собирается)"""
+    status: Literal["ready", "building"]
+    cycle_id: int
+    version: int
+    size: Optional[int] = None
+
+
+# ==================== Схемы сводки осмотров ====================
+
+class InspectionSummaryItem(BaseModel):
+    """Сводка по циклу и типу осмотра (из таблицы inspection_summary)"""
+    cycle_id: int
+    type: str  # dm, ts, rp, tss, ggs, tsg
+    inspected: int  # Осмотрено элементов
+    by_result: Dict[int, int] = {}  # inspectresult (0-5) -> элементов
+    by_state: Dict[str, int] = {}  # state_id -> элементов (осмотры без state_id не учитываются)
+
+
+class InspectionSummaryResponse(BaseModel):
+    """Сводка осмотров для дашбордов"""
+    items: List[InspectionSummaryItem] = []
+
+
+class InspectionHistoryResponse(BaseModel):
+    """История осмотров элемента: по типу - значения чеклиста по циклам (без фото и заметок)"""
+    element_id: int
+    history: Dict[str, List[Dict[str, Any]]] = {}
@@ -4,7 +4,19 @@ import structlog
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routes.auth_routes import auth_router
-from core.database import engine, Base
+from routes.permission_routes import permission_router
+from routes.project_routes import project_router
+from routes.photo_routes import photo_router
+from routes.inspection_routes import inspection_router
+from routes.sync_routes import sync_router
+from routes.field_package_routes import field_package_router
+from routes.scheduler_routes import scheduler_router
+from routes.cycle_routes import cycle_router
+from routes.position_attribute_routes import position_attribute_router
+from middleware.idempotency import IdempotencyMiddleware
+from core.database import engine, Base, SessionLocal
+from services.image_pipeline import image_pipeline
+from services.position_attribute_service import fail_stale_copy_jobs
 
 # Настройка логирования
 structlog.configure()
@@ -20,6 +32,18 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Идемпотентность повторяемых POST-запросов (заголовок Idempotency-Key).
+# Добавляется до CORS, чтобы сохраненные ответы тоже получали CORS-заголовки
+app.add_middleware(
+    IdempotencyMiddleware,
+    paths=[
+        "/api/v1/auth/register",
+        "/api/v1/projects/{project_id}/inspections/batch",
+        "/api/v1/projects/{project_id}/positions/attributes/bulk",
+        "/api/v1/projects/{project_id}/positions/attributes/copy",
+    ]
+)
+
 # Настройка CORS
 origins = os.environ.get("CORS_ORIGINS", "*").split(",")
 
@@ -33,6 +57,30 @@ app.add_middleware(
 
 # Подключение роутеров
 app.include_router(auth_router, prefix="/api")
+app.include_router(permission_router, prefix="/api")
+app.include_router(project_router, prefix="/api")
+app.include_router(photo_router, prefix="/api")
+app.include_router(inspection_router, prefix="/api")
+app.include_router(sync_router, prefix="/api")
+app.include_router(field_package_router, prefix="/api")
+app.include_router(scheduler_router, prefix="/api")
+app.include_router(cycle_router, prefix="/api")
+app.include_router(position_attribute_router, prefix="/api")
+
+@app.on_event("startup")
+def fail_stale_copy_jobs_on_startup():
+    """Задачи копирования, прерванные остановкой процесса, не остаются pending/running"""
+    db = SessionLocal()
+    try:
+        fail_stale_copy_jobs(db)
+    except Exception as e:
+        logger.warning("Stale copy jobs check failed", error=str(e))
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+async def shutdown_image_pipeline():
+    image_pipeline.shutdown()
 
 @app.get("/")
 async def root():
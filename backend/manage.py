@@ -0,0 +1,375 @@
+"""
+Служебные команды backend
+Запуск: python manage.py <команда> [параметры]
+"""
+
+import argparse
+import time
+from core.database import SessionLocal
+import structlog
+
+logger = structlog.get_logger()
+
+
+def photos_gc(args: argparse.Namespace) -> None:
+    """Удаление фото, на которые не ссылается ни один осмотр"""
+    from services.photo_storage import collect_garbage
+
+    db = SessionLocal()
+    try:
+        deleted, freed_bytes = collect_garbage(db, grace_hours=args.grace_hours)
+        print(f"Удалено фото: {deleted}, освобождено: {freed_bytes / (1024 * 1024):.1f} МБ")
+    finally:
+        db.close()
+
+
+def photos_link_projects(args: argparse.Namespace) -> None:
+    """Связь с проектами фото, загруженных до photo_projects (по ссылкам photo_id в осмотрах)"""
+    from sqlalchemy import text
+    from core.inspection_types import INSPECTION_TYPES
+    from core.models import Project
+    from core.project_database import get_project_sessionmaker
+    from services.photo_storage import link_project_photos
+
+    db = SessionLocal()
+    try:
+        query = db.query(Project)
+        if args.project_id is not None:
+            query = query.filter(Project.id == args.project_id)
+        factories = [(project.id, get_project_sessionmaker(project)) for project in query.order_by(Project.id).all()]
+
+        for project_id, factory in factories:
+            project_db = factory()
+            try:
+                photo_ids = set()
+                for inspection_type in INSPECTION_TYPES.values():
+                    photo_ids.update(project_db.execute(text(
+                        f"SELECT DISTINCT photo_id FROM {inspection_type.table} WHERE photo_id IS NOT NULL"
+                    )).scalars())
+            finally:
+                project_db.close()
+            linked = link_project_photos(db, project_id, photo_ids)
+            db.commit()
+            print(f"Проект {project_id}: фото в осмотрах {len(photo_ids)}, новых связей {linked}")
+    finally:
+        db.close()
+
+
+def idempotency_purge(args: argparse.Namespace) -> None:
+    """Удаление ключей идемпотентности с истекшим сроком хранения"""
+    from services.idempotency_service import purge_expired_keys
+
+    db = SessionLocal()
+    try:
+        print(f"Удалено ключей: {purge_expired_keys(db)}")
+    finally:
+        db.close()
+
+
+def build_field_package(args: argparse.Namespace) -> None:
+    """Предварительная сборка полевого пакета цикла (например, ночью перед выездом)"""
+    import asyncio
+    from core.models import Project
+    from core.project_database import get_project_sessionmaker
+    from services.field_package_service import field_package_builder, get_data_version
+    from services.project_metadata_service import get_excluded_positions
+
+    db = SessionLocal()
+    try:
+        project = db.query(Project).filter(Project.id == args.project_id).first()
+        if project is None:
+            raise SystemExit(f"Проект {args.project_id} не найден")
+        factory = get_project_sessionmaker(project)
+        excluded = get_excluded_positions(db, args.project_id)
+    finally:
+        db.close()
+
+    project_db = factory()
+    try:
+        version = get_data_version(project_db, args.cycle_id)
+    finally:
+        project_db.close()
+
+    package = field_package_builder.package_for(args.project_id, args.cycle_id, version, excluded)
+    if package.ready:
+        print(f"Пакет версии {version} уже собран: {package.path}")
+        return
+    built = asyncio.run(field_package_builder.build(factory, package))
+    if built is None:
+        raise SystemExit("Пакет не собран (ошибка или сборка уже идет в другом процессе)")
+    print(f"Пакет собран: {built.path} ({built.size / (1024 * 1024):.1f} МБ)")
+
+
+def rebuild_inspection_summary(args: argparse.Namespace) -> None:
+    """Пересчет сводки осмотров по таблицам осмотров БД проекта"""
+    from core.models import Project
+    from core.project_database import get_project_sessionmaker
+    from services.inspection_summary_service import rebuild_summary
+
+    db = SessionLocal()
+    try:
+        project = db.query(Project).filter(Project.id == args.project_id).first()
+        if project is None:
+            raise SystemExit(f"Проект {args.project_id} не найден")
+        factory = get_project_sessionmaker(project)
+    finally:
+        db.close()
+
+    project_db = factory()
+    try:
+        started = time.perf_counter()
+        rows_count = rebuild_summary(project_db)
+        print(f"Сводка пересчитана: {rows_count} строк, {time.perf_counter() - started:.2f} с")
+    finally:
+        project_db.close()
+
+
+def reconcile_scheduler_progress(args: argparse.Namespace) -> None:
+    """Сверка счетчиков прогресса планировщика (все активные проекты или один)"""
+    from core.models import Project
+    from core.project_database import get_project_sessionmaker
+    from services.scheduler_progress_service import reconcile_progress
+
+    db = SessionLocal()
+    try:
+        query = db.query(Project).filter(Project.is_active.is_(True))
+        if args.project_id is not None:
+            query = query.filter(Project.id == args.project_id)
+        projects = query.order_by(Project.id).all()
+        factories = [(project.id, get_project_sessionmaker(project)) for project in projects]
+    finally:
+        db.close()
+
+    failed = 0
+    for project_id, factory in factories:
+        project_db = factory()
+        try:
+            drift = reconcile_progress(project_db)
+            if drift:
+                logger.warning("Scheduler progress drift repaired", project_id=project_id, keys=drift)
+            print(f"Проект {project_id}: исправлено расхождений {drift}")
+        except Exception as e:
+            failed += 1
+            logger.error("Scheduler progress reconciliation failed", project_id=project_id, error=str(e))
+            print(f"Проект {project_id}: ошибка сверки ({e})")
+        finally:
+            project_db.close()
+    if failed:
+        raise SystemExit(f"Сверка не выполнена для проектов: {failed}")
+
+
+def _project_factory(project_id: int):
+    from core.models import Project
+    from core.project_database import get_project_sessionmaker
+
+    db = SessionLocal()
+    try:
+        project = db.query(Project).filter(Project.id == project_id).first()
+        if project is None:
+            raise SystemExit(f"Проект {project_id} не найден")
+        return get_project_sessionmaker(project)
+    finally:
+        db.close()
+
+
+def freeze_cycle(args: argparse.Namespace) -> None:
+    """Заморозка завершенного цикла в снимок (--archive - с удалением строк из таблиц осмотров)"""
+    from services.cycle_snapshot_service import freeze_cycle as freeze
+
+    project_db = _project_factory(args.project_id)()
+    try:
+        started = time.perf_counter()
+        info = freeze(project_db, args.project_id, args.cycle_id, archive=args.archive)
+    except FileExistsError:
+        raise SystemExit(f"Цикл {args.cycle_id} уже заморожен")
+    finally:
+        project_db.close()
+    rows = ", ".join(f"{table}: {count}" for table, count in info["rows"].items())
+    print(f"Цикл {args.cycle_id} заморожен ({rows}), {time.perf_counter() - started:.2f} с")
+
+
+def unfreeze_cycle(args: argparse.Namespace) -> None:
+    """Разморозка цикла: возврат строк архивированного цикла и удаление снимка"""
+    from services.cycle_snapshot_service import unfreeze_cycle as unfreeze
+
+    from services.cycle_snapshot_service import CycleRestoreConflict
+
+    project_db = _project_factory(args.project_id)()
+    db = SessionLocal()
+    try:
+        result = unfreeze(project_db, db, args.project_id, args.cycle_id, discard_conflicts=args.discard_conflicts)
+    except CycleRestoreConflict as e:
+        conflicts = ", ".join(f"{table}: {count}" for table, count in e.conflicts.items())
+        raise SystemExit(
+            f"Строки снимка конфликтуют с осмотрами ({conflicts}); --discard-conflicts отбросит строки снимка"
+        )
+    finally:
+        project_db.close()
+        db.close()
+    if result is None:
+        raise SystemExit(f"Цикл {args.cycle_id} не заморожен")
+    restored = ", ".join(f"{table}: {count}" for table, count in result["restored"].items()) or "строки не удалялись"
+    print(f"Цикл {args.cycle_id} разморожен ({restored})")
+    if result["conflicts"]:
+        discarded = ", ".join(f"{table}: {count}" for table, count in result["conflicts"].items())
+        print(f"Отброшены строки снимка ({discarded})")
+
+
+def bench_inspection_batch(args: argparse.Namespace) -> None:
+    """
+    Замер пакетной записи осмотров (элементов в секунду) на БД проекта.
+    Пишутся синтетические осмотры DM, транзакция откатывается - данные проекта не меняются
+    """
+    from sqlalchemy import text
+    from core.models import Project
+    from core.project_database import get_project_sessionmaker
+    from core.schemas import UnifiedInspectionBatchCreate
+    from services.inspection_batch_service import prepare_batch, write_inspections
+
+    db = SessionLocal()
+    try:
+        project = db.query(Project).filter(Project.id == args.project_id).first()
+        if project is None:
+            raise SystemExit(f"Проект {args.project_id} не найден")
+        factory = get_project_sessionmaker(project)
+    finally:
+        db.close()
+
+    for size in args.sizes:
+        items = [
+            {"element_id": args.element_start + i, "cycle_id": args.cycle_id, "inspectresult": i % 6, "note": "bench"}
+            for i in range(size)
+        ]
+
+        project_db = factory()
+        try:
+            started = time.perf_counter()
+            batch = prepare_batch(UnifiedInspectionBatchCreate(dm=items))
+            write_inspections(project_db, batch)
+            elapsed = time.perf_counter() - started
+            failed = sum(1 for item in batch.results if item.status == "error")
+            print(f"Пакет {size}: {elapsed:.3f} с, {size / elapsed:.0f} эл/с, ошибок: {failed}")
+
+            if args.baseline:
+                project_db.rollback()
+                started = time.perf_counter()
+                for item in items:
+                    with project_db.begin_nested():
+                        project_db.execute(
+                            text("""
+                                INSERT INTO dm_inspections (element_id, cycle_id, inspectresult, note)
+                                VALUES (:element_id, :cycle_id, :inspectresult, :note)
+                                ON CONFLICT (element_id, cycle_id) DO UPDATE
+                                SET inspectresult = EXCLUDED.inspectresult, note = EXCLUDED.note
+                            """),
+                            item
+                        )
+                elapsed = time.perf_counter() - started
+                print(f"  построчно: {elapsed:.3f} с, {size / elapsed:.0f} эл/с")
+        finally:
+            project_db.rollback()
+            project_db.close()
+
+
+def bench_serialization(args: argparse.Namespace) -> None:
+    """
+    Сравнение быстрой сериализации строк (utils/serialization.py) с pydantic по всем
+    схемам ответов осмотров: сначала проверка совпадения JSON, затем строк в секунду
+    """
+    import json
+    from core.inspection_types import INSPECTION_TYPES
+    from utils.serialization import compare_with_pydantic, rows_to_json, sample_rows
+
+    failed = False
+    for key, inspection_type in INSPECTION_TYPES.items():
+        model = inspection_type.response_schema
+        rows = sample_rows(model, args.rows)
+
+        mismatches = compare_with_pydantic(model, rows[:args.check_rows])
+        if mismatches:
+            failed = True
+            print(f"{key}: расхождений {len(mismatches)}, например {mismatches[:3]}")
+            continue
+
+        started = time.perf_counter()
+        json.dumps([model.model_validate(row).model_dump(mode="json") for row in rows])
+        pydantic_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        rows_to_json(model, rows)
+        fast_elapsed = time.perf_counter() - started
+
+        print(
+            f"{key}: pydantic {len(rows) / pydantic_elapsed:.0f} стр/с, "
+            f"быстрый путь {len(rows) / fast_elapsed:.0f} стр/с (x{pydantic_elapsed / fast_elapsed:.1f})"
+        )
+
+    if failed:
+        raise SystemExit("Быстрая сериализация расходится с pydantic")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Служебные команды Transport Control Service")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    gc_parser = subparsers.add_parser("photos-gc", help="Сборка мусора в хранилище фото")
+    gc_parser.add_argument("--grace-hours", type=int, default=24, help="Не удалять фото, загруженные позже (часов)")
+    gc_parser.set_defaults(handler=photos_gc)
+
+    link_parser = subparsers.add_parser("photos-link-projects", help="Связь загруженных ранее фото с проектами")
+    link_parser.add_argument("--project-id", type=int, default=None, help="ID проекта (по умолчанию все)")
+    link_parser.set_defaults(handler=photos_link_projects)
+
+    purge_parser = subparsers.add_parser("idempotency-purge", help="Удаление просроченных ключей идемпотентности")
+    purge_parser.set_defaults(handler=idempotency_purge)
+
+    package_parser = subparsers.add_parser("build-field-package", help="Сборка полевого пакета цикла")
+    package_parser.add_argument("--project-id", type=int, required=True, help="ID проекта")
+    package_parser.add_argument("--cycle-id", type=int, required=True, help="ID цикла")
+    package_parser.set_defaults(handler=build_field_package)
+
+    summary_parser = subparsers.add_parser("rebuild-inspection-summary", help="Пересчет сводки осмотров проекта")
+    summary_parser.add_argument("--project-id", type=int, required=True, help="ID проекта")
+    summary_parser.set_defaults(handler=rebuild_inspection_summary)
+
+    progress_parser = subparsers.add_parser(
+        "reconcile-scheduler-progress", help="Сверка и исправление счетчиков прогресса планировщика"
+    )
+    progress_parser.add_argument("--project-id", type=int, default=None, help="ID проекта (по умолчанию все активные)")
+    progress_parser.set_defaults(handler=reconcile_scheduler_progress)
+
+    freeze_parser = subparsers.add_parser("freeze-cycle", help="Заморозка завершенного цикла в снимок")
+    freeze_parser.add_argument("--project-id", type=int, required=True, help="ID проекта")
+    freeze_parser.add_argument("--cycle-id", type=int, required=True, help="ID цикла")
+    freeze_parser.add_argument("--archive", action="store_true", help="Удалить строки цикла из таблиц осмотров")
+    freeze_parser.set_defaults(handler=freeze_cycle)
+
+    unfreeze_parser = subparsers.add_parser("unfreeze-cycle", help="Разморозка цикла (возврат строк из снимка)")
+    unfreeze_parser.add_argument("--project-id", type=int, required=True, help="ID проекта")
+    unfreeze_parser.add_argument("--cycle-id", type=int, required=True, help="ID цикла")
+    unfreeze_parser.add_argument(
+        "--discard-conflicts", action="store_true", help="Отбросить строки снимка, ключ которых занят живыми строками"
+    )
+    unfreeze_parser.set_defaults(handler=unfreeze_cycle)
+
+    bench_parser = subparsers.add_parser("bench-inspection-batch", help="Замер пакетной записи осмотров (с откатом)")
+    bench_parser.add_argument("--project-id", type=int, required=True, help="ID проекта")
+    bench_parser.add_argument("--cycle-id", type=int, required=True, help="ID цикла для синтетических осмотров")
+    bench_parser.add_argument("--element-start", type=int, default=1, help="Первый element_id")
+    bench_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="Размеры пакетов")
+    bench_parser.add_argument("--baseline", action="store_true", help="Сравнить с построчной записью")
+    bench_parser.set_defaults(handler=bench_inspection_batch)
+
+    serialization_parser = subparsers.add_parser(
+        "bench-serialization", help="Проверка и замер быстрой сериализации ответов осмотров"
+    )
+    serialization_parser.add_argument("--rows", type=int, default=50000, help="Строк на тип осмотра")
+    serialization_parser.add_argument("--check-rows", type=int, default=1000, help="Строк для сравнения с pydantic")
+    serialization_parser.set_defaults(handler=bench_serialization)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,8 @@ from sqlalchemy.orm import Session
 from typing import Optional
 from core.database import get_db
 from core.models import User
-from utils.auth_utils import verify_token, get_user_by_id, check_user_permissions
+from utils.auth_utils import verify_token, get_user_by_id, check_user_permissions, check_project_permissions
+from services.permission_service import permission_matrix
 import structlog
 
 logger = structlog.get_logger()
@@ -76,6 +77,32 @@ def require_admin(current_user: User = Depends(get_current_user)) -> User:
     return require_role("admin")(current_user)
 
 
+def require_project_role(required_role: str):
+    """Декоратор для проверки роли пользователя в проекте (project_id из пути или query)"""
+    def project_role_checker(
+        project_id: int,
+        current_user: User = Depends(get_current_user),
+        db: Session = Depends(get_db)
+    ) -> User:
+        # Администратор системы имеет полный доступ ко всем проектам
+        if current_user.role == "admin":
+            return current_user
+
+        project_role = permission_matrix.get_role(db, current_user.id, project_id)
+        if not check_project_permissions(project_role, required_role):
+            logger.warning(
+                "Insufficient project permissions",
+                user_id=current_user.id,
+                project_id=project_id,
+                project_role=project_role,
+                required_role=required_role
+            )
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Недостаточно прав в проекте. Требуется роль: {required_role}"
+            )
+        return current_user
+    return project_role_checker
 
 
 def get_optional_current_user(
@@ -0,0 +1,230 @@
+"""
+Middleware идемпотентности POST-запросов (заголовок Idempotency-Key)
+Полевые планшеты повторяют отправку, если ответ потерялся в сети. Повтор с тем же ключом,
+той же строкой запроса и тем же телом получает сохраненный ответ с его заголовками
+(и Idempotent-Replayed: true) без повторного выполнения; параллельный повтор ждет
+завершения первого запроса. Тот же ключ с другим запросом - 422. Ответы 5xx
+не сохраняются: повтор выполнится заново.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Connection
+from sqlalchemy.pool import NullPool
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from core.database import SessionLocal, SQLALCHEMY_DATABASE_URL
+from services.idempotency_service import claim_key, get_stored_request, complete_key, release_key
+from utils.auth_utils import verify_token
+import structlog
+
+logger = structlog.get_logger()
+
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "30"))
+IDEMPOTENCY_POLL_SECONDS = 0.5
+IDEMPOTENCY_HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+# Заголовки, которые не сохраняются: длину тела и соединение выставляет сервер при повторе
+NOT_STORED_HEADERS = {"content-length", "transfer-encoding", "connection", "keep-alive", "date", "server"}
+
+# Соединения с блокировкой ключа не берутся из пула: выполняющий запрос не занимает
+# соединение пула, а закрытие соединения гарантированно снимает блокировку
+lock_engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+
+
+def _call_with_session(func, *args):
+    db = SessionLocal()
+    try:
+        return func(db, *args)
+    finally:
+        db.close()
+
+
+def _claim(request_scope: str, key: str, fingerprint: str) -> Optional[Connection]:
+    """Захват ключа; при успехе возвращается соединение, держащее блокировку ключа"""
+    connection = lock_engine.connect()
+    try:
+        if claim_key(connection, request_scope, key, fingerprint):
+            return connection
+    except BaseException:
+        connection.close()
+        raise
+    connection.close()
+    return None
+
+
+def _fingerprint(scope: Scope, body: bytes) -> str:
+    """SHA-256 строки запроса и тела"""
+    return hashlib.sha256(scope.get("query_string", b"") + b"\n" + body).hexdigest()
+
+
+def _replay(stored) -> Response:
+    response = Response(
+        content=stored.response_body,
+        status_code=stored.response_status,
+        # Ответы, сохраненные до появления заголовков, получают только Content-Type
+        media_type=stored.response_content_type if stored.response_headers is None else None
+    )
+    response.raw_headers.extend(
+        (name.encode("latin-1"), value.encode("latin-1")) for name, value in stored.response_headers or []
+    )
+    response.raw_headers.append((b"idempotent-replayed", b"true"))
+    return response
+
+
+def _principal(headers: Headers) -> str:
+    """Владелец ключа: пользователь из access-токена (ключи разных пользователей не пересекаются)"""
+    authorization = headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            return f"user:{verify_token(authorization[7:].strip(), 'access').user_id}"
+        except HTTPException:
+            pass
+    return "anonymous"
+
+
+def _error(status_code: int, detail: str) -> Response:
+    return JSONResponse(status_code=status_code, content={"detail": detail})
+
+
+class IdempotencyMiddleware:
+    """Идемпотентность для POST-эндпоинтов из paths (шаблоны путей FastAPI)"""
+
+    def __init__(self, app: ASGIApp, paths: Iterable[str]):
+        self.app = app
+        self.patterns: List[re.Pattern] = [compile_path(path)[0] for path in paths]
+        self._in_flight: Dict[Tuple[str, str], asyncio.Event] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not any(pattern.match(scope["path"]) for pattern in self.patterns)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        key = headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await _error(
+                status.HTTP_400_BAD_REQUEST,
+                f"Idempotency-Key должен быть непустой строкой до {MAX_KEY_LENGTH} символов"
+            )(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        fingerprint = _fingerprint(scope, body)
+        request_scope = f"{scope['method']} {scope['path']} {_principal(headers)}"
+        response = await self._handle(scope, receive, send, request_scope, key, fingerprint, body)
+        if response is not None:
+            await response(scope, receive, send)
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    async def _handle(
+        self, scope: Scope, receive: Receive, send: Send,
+        request_scope: str, key: str, fingerprint: str, body: bytes
+    ) -> Optional[Response]:
+        """Выполнение или ответ из хранилища; None - ответ уже отправлен приложением"""
+        deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            lock_connection = await run_in_threadpool(_claim, request_scope, key, fingerprint)
+            if lock_connection is not None:
+                try:
+                    await self._execute(scope, receive, send, request_scope, key, body)
+                finally:
+                    await run_in_threadpool(lock_connection.close)
+                return None
+
+            stored = await run_in_threadpool(_call_with_session, get_stored_request, request_scope, key)
+            remaining = deadline - asyncio.get_running_loop().time()
+            if stored is not None and stored.fingerprint != fingerprint:
+                return _error(
+                    status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    "Idempotency-Key уже использован для другого запроса"
+                )
+            if stored is not None and stored.status == "completed":
+                logger.info("Idempotent request replayed", scope=request_scope, key=key)
+                return _replay(stored)
+
+            if remaining <= 0:
+                return _error(
+                    status.HTTP_409_CONFLICT,
+                    "Запрос с этим Idempotency-Key еще выполняется"
+                )
+            # Ключ занят (или освобожден после ошибки - тогда повторяем захват).
+            # В этом процессе - ждем события, запрос в другом процессе - опрашиваем БД
+            event = self._in_flight.get((request_scope, key))
+            try:
+                if event is not None:
+                    await asyncio.wait_for(event.wait(), timeout=remaining)
+                else:
+                    await asyncio.sleep(min(IDEMPOTENCY_POLL_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, scope: Scope, receive: Receive, send: Send, request_scope: str, key: str, body: bytes) -> None:
+        event = asyncio.Event()
+        self._in_flight[(request_scope, key)] = event
+        body_sent = False
+        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        content_type: Optional[str] = None
+        response_headers: List[Tuple[str, str]] = []
+        response_chunks: List[bytes] = []
+
+        async def replay_receive() -> Message:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def capture_send(message: Message) -> None:
+            nonlocal status_code, content_type
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = Headers(raw=message["headers"]).get("content-type")
+                response_headers.extend(
+                    (name.decode("latin-1"), value.decode("latin-1")) for name, value in message["headers"]
+                    if name.decode("latin-1").lower() not in NOT_STORED_HEADERS
+                )
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await run_in_threadpool(_call_with_session, release_key, request_scope, key)
+            raise
+        else:
+            if status_code < 500:
+                await run_in_threadpool(
+                    _call_with_session, complete_key, request_scope, key,
+                    status_code, content_type, response_headers, b"".join(response_chunks)
+                )
+            else:
+                await run_in_threadpool(_call_with_session, release_key, request_scope, key)
+        finally:
+            self._in_flight.pop((request_scope, key), None)
+            event.set()
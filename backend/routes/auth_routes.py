@@ -113,7 +113,7 @@ async def register(
             logger.warning("Failed to log audit action", error=str(audit_err))
         
         return AuthResponse(
-            user=UserResponse.from_orm(user),
+            user=UserResponse.model_validate(user),
             tokens=empty_tokens
         )
         
@@ -221,7 +221,7 @@ async def login(
         logger.warning("Failed to log audit action", error=str(audit_err))
     
     return AuthResponse(
-        user=UserResponse.from_orm(user),
+        user=UserResponse.model_validate(user),
         tokens=tokens
     )
 
@@ -309,7 +309,7 @@ async def get_current_user_info(
     current_user: User = Depends(get_current_active_user)
 ):
     """Получение информации о текущем пользователе"""
-    return UserResponse.from_orm(current_user)
+    return UserResponse.model_validate(current_user)
 
 
 @auth_router.post("/verify-token", response_model=MessageResponse)
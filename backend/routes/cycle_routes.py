@@ -0,0 +1,266 @@
+"""
+Эндпоинты циклов осмотров проекта
+Список циклов с has_data и cycle_status (кэшируется по проекту), создание и изменение циклов,
+заморозка завершенных циклов в снимки
+"""
+
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from core.database import get_db
+from core.project_database import get_project_db
+from core.models import User
+from core.schemas import CycleCreate, CycleUpdate, CycleResponse, CycleSnapshotInfo, CycleUnfreezeResponse
+from middleware.auth_dependencies import require_project_role
+from services.cycle_service import create_cycle, cycle_list_cache, cycle_status, list_cycles, update_cycle
+from services.cycle_snapshot_service import (
+    CycleRestoreConflict, freeze_cycle, snapshot_info, snapshot_store, unfreeze_cycle
+)
+from services.project_metadata_service import get_project_metadata
+from services.audit_service import AuditService
+from utils.serialization import FastJSONResponse, RowsJSONResponse, row_plan
+import structlog
+
+logger = structlog.get_logger()
+
+cycle_router = APIRouter(prefix="/v1/projects/{project_id}/cycles", tags=["Циклы"])
+
+
+@cycle_router.get("", response_model=List[CycleResponse])
+async def get_cycles(
+    project_id: int,
+    current_user: User = Depends(require_project_role("viewer")),
+    db: Session = Depends(get_db),
+    project_db: Session = Depends(get_project_db)
+):
+    """Циклы проекта: has_data - есть осмотры, cycle_status - из metadata проекта"""
+    metadata = get_project_metadata(db, project_id)
+    return RowsJSONResponse(CycleResponse, list_cycles(project_db, project_id, metadata))
+
+
+@cycle_router.post("", response_model=CycleResponse, status_code=status.HTTP_201_CREATED)
+async def post_cycle(
+    project_id: int,
+    cycle_data: CycleCreate,
+    request: Request,
+    current_user: User = Depends(require_project_role("manager")),
+    db: Session = Depends(get_db),
+    project_db: Session = Depends(get_project_db)
+):
+    """Создание цикла"""
+    try:
+        cycle = create_cycle(project_db, cycle_data)
+        project_db.commit()
+    except Exception as e:
+        project_db.rollback()
+        logger.error("Cycle create failed", project_id=project_id, error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при создании цикла"
+        )
+    cycle_list_cache.invalidate(project_id)
+
+    try:
+        await AuditService.log_action(
+            db=db,
+            user_id=current_user.id,
+            category="project",
+            action_type="project.cycle.create",
+            action_name="Создание цикла",
+            resource_type="cycle",
+            resource_id=str(cycle["cycle_id"]),
+            details=cycle_data.model_dump(exclude_none=True),
+            request=request,
+            project_id=project_id
+        )
+    except Exception as audit_err:
+        logger.warning("Failed to log audit action", error=str(audit_err))
+
+    cycle["cycle_status"] = cycle_status(cycle["cycle_id"], get_project_metadata(db, project_id))
+    return FastJSONResponse(row_plan(CycleResponse).to_dict(cycle), status_code=status.HTTP_201_CREATED)
+
+
+@cycle_router.patch("/{cycle_id}", response_model=CycleResponse)
+async def patch_cycle(
+    project_id: int,
+    cycle_id: int,
+    update_data: CycleUpdate,
+    request: Request,
+    current_user: User = Depends(require_project_role("manager")),
+    db: Session = Depends(get_db),
+    project_db: Session = Depends(get_project_db)
+):
+    """Частичное обновление цикла"""
+    try:
+        cycle = update_cycle(project_db, cycle_id, update_data)
+        project_db.commit()
+    except Exception as e:
+        project_db.rollback()
+        logger.error("Cycle update failed", project_id=project_id, cycle_id=cycle_id, error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при обновлении цикла"
+        )
+
+    if cycle is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Цикл не найден"
+        )
+    cycle_list_cache.invalidate(project_id)
+
+    try:
+        await AuditService.log_action(
+            db=db,
+            user_id=current_user.id,
+            category="project",
+            action_type="project.cycle.update",
+            action_name="Изменение цикла",
+            resource_type="cycle",
+            resource_id=str(cycle_id),
+            details=update_data.model_dump(exclude_unset=True),
+            request=request,
+            project_id=project_id
+        )
+    except Exception as audit_err:
+        logger.warning("Failed to log audit action", error=str(audit_err))
+
+    cycle["cycle_status"] = cycle_status(cycle_id, get_project_metadata(db, project_id))
+    return FastJSONResponse(row_plan(CycleResponse).to_dict(cycle))
+
+
+@cycle_router.get("/{cycle_id}/snapshot", response_model=CycleSnapshotInfo)
+async def get_cycle_snapshot(
+    project_id: int,
+    cycle_id: int,
+    current_user: User = Depends(require_project_role("viewer"))
+):
+    """Описание снимка замороженного цикла"""
+    snapshot = snapshot_store.open(project_id, cycle_id)
+    if snapshot is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Цикл не заморожен"
+        )
+    return FastJSONResponse(snapshot_info(snapshot.manifest))
+
+
+@cycle_router.post("/{cycle_id}/freeze", response_model=CycleSnapshotInfo, status_code=status.HTTP_201_CREATED)
+async def freeze_completed_cycle(
+    project_id: int,
+    cycle_id: int,
+    request: Request,
+    archive: bool = Query(False, description="Удалить строки цикла из таблиц осмотров после записи снимка"),
+    current_user: User = Depends(require_project_role("manager")),
+    db: Session = Depends(get_db),
+    project_db: Session = Depends(get_project_db)
+):
+    """
+    Заморозка завершенного цикла: осмотры всех типов и параметры позиций записываются
+    в неизменяемый колоночный снимок, исторические запросы цикла читают его.
+    archive=true дополнительно удаляет строки цикла из таблиц осмотров (вернуть - разморозкой)
+    """
+    metadata = get_project_metadata(db, project_id)
+    if metadata is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Проект не найден"
+        )
+    if cycle_id not in (metadata.get("completed_cycles") or []):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Заморозить можно только завершенный цикл"
+        )
+
+    try:
+        info = await run_in_threadpool(freeze_cycle, project_db, project_id, cycle_id, archive)
+    except FileExistsError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Цикл уже заморожен"
+        )
+    except Exception as e:
+        logger.error("Cycle freeze failed", project_id=project_id, cycle_id=cycle_id, error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при заморозке цикла"
+        )
+    cycle_list_cache.invalidate(project_id)
+
+    try:
+        await AuditService.log_action(
+            db=db,
+            user_id=current_user.id,
+            category="project",
+            action_type="project.cycle.freeze",
+            action_name="Заморозка цикла",
+            resource_type="cycle",
+            resource_id=str(cycle_id),
+            details={"archive": archive, "rows": info["rows"]},
+            request=request,
+            project_id=project_id
+        )
+    except Exception as audit_err:
+        logger.warning("Failed to log audit action", error=str(audit_err))
+
+    return FastJSONResponse(info, status_code=status.HTTP_201_CREATED)
+
+
+@cycle_router.post("/{cycle_id}/unfreeze", response_model=CycleUnfreezeResponse)
+async def unfreeze_frozen_cycle(
+    project_id: int,
+    cycle_id: int,
+    request: Request,
+    discard_conflicts: bool = Query(
+        False, description="Разморозить, отбросив строки снимка, ключ которых занят живыми строками"
+    ),
+    current_user: User = Depends(require_project_role("manager")),
+    db: Session = Depends(get_db),
+    project_db: Session = Depends(get_project_db)
+):
+    """
+    Разморозка: строки архивированного цикла возвращаются в таблицы осмотров, снимок удаляется.
+    Если ключи строк снимка заняты живыми строками - 409 с числом конфликтов по таблицам
+    """
+    try:
+        result = await run_in_threadpool(unfreeze_cycle, project_db, db, project_id, cycle_id, discard_conflicts)
+    except CycleRestoreConflict as e:
+        conflicts = ", ".join(f"{table}: {count}" for table, count in e.conflicts.items())
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Строки снимка конфликтуют с осмотрами в таблицах ({conflicts}). "
+                   f"Повторите с discard_conflicts=true, чтобы отбросить строки снимка"
+        )
+    except Exception as e:
+        project_db.rollback()
+        logger.error("Cycle unfreeze failed", project_id=project_id, cycle_id=cycle_id, error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при разморозке цикла"
+        )
+
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Цикл не заморожен"
+        )
+    cycle_list_cache.invalidate(project_id)
+
+    try:
+        await AuditService.log_action(
+            db=db,
+            user_id=current_user.id,
+            category="project",
+            action_type="project.cycle.unfreeze",
+            action_name="Разморозка цикла",
+            resource_type="cycle",
+            resource_id=str(cycle_id),
+            details=result,
+            request=request,
+            project_id=project_id
+        )
+    except Exception as audit_err:
+        logger.warning("Failed to log audit action", error=str(audit_err))
+
+    return FastJSONResponse(result)
@@ -0,0 +1,69 @@
+"""
+Эндпоинты полевых пакетов
+Пакет цикла для работы без связи: собирается в фоне один раз на версию данных,
+скачивается с поддержкой докачки (Range + If-Range)
+"""
+
+from fastapi import APIRouter, Depends, Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+from core.database import get_db
+from core.project_database import get_project_factory
+from core.models import User
+from core.schemas import FieldPackageStatus
+from middleware.auth_dependencies import require_project_role
+from services.field_package_service import field_package_builder, get_data_version, FIELD_PACKAGE_MEDIA_TYPE
+from services.project_metadata_service import get_excluded_positions
+from utils.http_range import file_response
+
+field_package_router = APIRouter(prefix="/v1/projects/{project_id}/field-packages", tags=["Полевые пакеты"])
+
+# Пакет может смениться с новой версией данных - клиент перепроверяет по ETag
+FIELD_PACKAGE_CACHE_CONTROL = "private, no-cache"
+FIELD_PACKAGE_RETRY_AFTER = "10"
+
+
+def _current_version(factory: sessionmaker, cycle_id: int) -> int:
+    db = factory()
+    try:
+        return get_data_version(db, cycle_id)
+    finally:
+        db.close()
+
+
+@field_package_router.api_route("/{cycle_id}", methods=["GET", "HEAD"])
+async def download_field_package(
+    project_id: int,
+    cycle_id: int,
+    request: Request,
+    current_user: User = Depends(require_project_role("viewer")),
+    db: Session = Depends(get_db),
+    factory: sessionmaker = Depends(get_project_factory)
+):
+    """
+    Скачивание полевого пакета цикла (zip: manifest.json, package.sqlite, thumbnails/).
+    Если пакета текущей версии еще нет - запускается сборка и возвращается 202 с Retry-After;
+    все инспекторы, запросившие пакет во время сборки, ждут ту же сборку.
+    Исключенные позиции проекта в пакет не входят, их изменение дает новый пакет
+    """
+    version = await run_in_threadpool(_current_version, factory, cycle_id)
+    package = field_package_builder.package_for(project_id, cycle_id, version, get_excluded_positions(db, project_id))
+
+    if not package.ready:
+        field_package_builder.ensure_build(factory, package)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=FieldPackageStatus(status="building", cycle_id=cycle_id, version=version).model_dump(),
+            headers={"Retry-After": FIELD_PACKAGE_RETRY_AFTER}
+        )
+
+    return file_response(
+        request,
+        package.path,
+        package.size,
+        FIELD_PACKAGE_MEDIA_TYPE,
+        etag=f'"{project_id}-{cycle_id}-{package.tag}"',
+        cache_control=FIELD_PACKAGE_CACHE_CONTROL,
+        extra_headers={"Content-Disposition": f'attachment; filename="{package.filename}"'}
+    )
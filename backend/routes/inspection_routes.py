@@ -0,0 +1,229 @@
+"""
+Эндпоинты осмотров элементов
+Пакетная запись осмотров с полевых планшетов, потоковая выдача осмотров цикла и сводка (БД проекта)
+"""
+
+from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+from core.database import get_db
+from core.inspection_types import INSPECTION_TYPES, PhotoMode
+from core.project_database import get_project_db, get_project_factory
+from core.models import User
+from core.schemas import (
+    UnifiedInspectionBatchCreate, InspectionBatchResult, InspectionSummaryResponse, InspectionHistoryResponse
+)
+from middleware.auth_dependencies import require_project_role
+from services.cycle_service import cycle_list_cache
+from services.cycle_snapshot_service import snapshot_store
+from services.image_pipeline import image_pipeline
+from services.inspection_batch_service import ingest_batch
+from services.inspection_diff_service import (
+    DIFF_STATUSES, default_diff_fields, diff_fields, get_previous_cycle, iter_cycle_diff, scored_fields
+)
+from services.inspection_history_service import get_element_history
+from services.inspection_stream_service import iter_cycle_inspections
+from services.inspection_summary_service import get_summary
+from services.project_metadata_service import get_project_metadata, metadata_to_response
+from utils.position_set import position_set_from_metadata
+from utils.serialization import FastJSONResponse
+import structlog
+
+logger = structlog.get_logger()
+
+inspection_router = APIRouter(prefix="/v1/projects/{project_id}/inspections", tags=["Осмотры"])
+
+
+@inspection_router.post("/batch", response_model=InspectionBatchResult)
+async def create_inspections_batch(
+    project_id: int,
+    payload: UnifiedInspectionBatchCreate,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(require_project_role("operator")),
+    db: Session = Depends(get_db),
+    project_db: Session = Depends(get_project_db)
+):
+    """
+    Пакетная запись осмотров (dm, ts, rp, tss, ggs, tsg) одной транзакцией.
+    Осмотр с тем же (element_id, cycle_id) обновляется. Ошибочные элементы возвращаются
+    со статусом error и не отменяют запись остальных. Фото из photos (base64) сохраняется
+    в хранилище фото проекта, в ответе - его photo_id
+    """
+    try:
+        result = await run_in_threadpool(ingest_batch, project_db, db, project_id, payload)
+    except Exception as e:
+        logger.error("Inspection batch failed", project_id=project_id, error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при сохранении осмотров"
+        )
+    # Новые осмотры могут появиться в цикле без данных (has_data в списке циклов)
+    if result.created:
+        cycle_list_cache.invalidate(project_id)
+    background_tasks.add_task(image_pipeline.build_many, [
+        item.photo_id for item in result.items if item.photo_id and item.status in ("created", "updated")
+    ])
+
+    logger.info(
+        "Inspection batch stored",
+        project_id=project_id,
+        user_id=current_user.id,
+        created=result.created,
+        updated=result.updated,
+        failed=result.failed
+    )
+    return result
+
+
+@inspection_router.get("/stream")
+async def stream_cycle_inspections(
+    project_id: int,
+    cycle_id: int,
+    photos: PhotoMode = "descriptor",
+    current_user: User = Depends(require_project_role("viewer")),
+    db: Session = Depends(get_db),
+    factory: sessionmaker = Depends(get_project_factory)
+):
+    """
+    Осмотры цикла в формате NDJSON (application/x-ndjson): по записи на строку,
+    {"type": "metadata" | "states" | "dm" | ... | "end", "data": ...}.
+    Строки читаются серверным курсором и отдаются сразу - клиент может отрисовывать
+    данные до конца выгрузки. Отсутствие записи end означает оборванный ответ.
+    Осмотры исключенных позиций (metadata.excluded_position_ranges) не выдаются
+    """
+    metadata = get_project_metadata(db, project_id)
+    if metadata is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Проект не найден"
+        )
+
+    return StreamingResponse(
+        iter_cycle_inspections(
+            factory, project_id, cycle_id,
+            metadata_to_response(metadata, compact=True).model_dump(mode="json"),
+            photo_mode=photos,
+            snapshot=snapshot_store.open(project_id, cycle_id),
+            excluded=position_set_from_metadata(metadata)
+        ),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+    )
+
+
+@inspection_router.get("/summary", response_model=InspectionSummaryResponse)
+async def get_inspection_summary(
+    project_id: int,
+    cycle_id: Optional[int] = Query(None, description="Только указанный цикл"),
+    type: Optional[str] = Query(None, description="Только указанный тип осмотра (dm, ts, rp, tss, ggs, tsg)"),
+    current_user: User = Depends(require_project_role("viewer")),
+    project_db: Session = Depends(get_project_db)
+):
+    """
+    Сводка для дашбордов: осмотрено элементов и распределение по inspectresult и state_id
+    для каждого цикла и типа осмотра. Читается только таблица сводки
+    """
+    if type is not None and type not in INSPECTION_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Неизвестный тип осмотра"
+        )
+    archived = [snapshot for snapshot in snapshot_store.open_all(project_id) if snapshot.archived]
+    return get_summary(project_db, cycle_id=cycle_id, inspection_type=type, archived=archived)
+
+
+@inspection_router.get("/diff")
+async def diff_cycle_inspections(
+    project_id: int,
+    type: str = Query(..., description="Тип осмотра (dm, ts, rp, tss, ggs, tsg)"),
+    cycle_id: int = Query(..., description="Сравниваемый цикл"),
+    base_cycle_id: Optional[int] = Query(None, description="Цикл-база (по умолчанию предыдущий цикл с осмотрами)"),
+    fields: Optional[List[str]] = Query(None, description="Сравниваемые поля (по умолчанию чеклист и state_id)"),
+    worse: Optional[List[str]] = Query(None, description="Только элементы, у которых ухудшилось хотя бы одно из полей"),
+    status_filter: List[str] = Query(["changed"], alias="status", description="changed, unchanged, new, missing"),
+    current_user: User = Depends(require_project_role("viewer")),
+    factory: sessionmaker = Depends(get_project_factory)
+):
+    """
+    Сравнение осмотров цикла с циклом-базой по элементам, в формате NDJSON:
+    запись diff_info, записи element ({поле: [было, стало]}), запись end со счетчиками.
+    Например, ухудшение общего результата: ?type=dm&cycle_id=5&worse=inspectresult
+    """
+    inspection_type = INSPECTION_TYPES.get(type)
+    if inspection_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Неизвестный тип осмотра"
+        )
+
+    fields = fields or default_diff_fields(inspection_type)
+    unknown = [field for field in fields if field not in diff_fields(inspection_type)]
+    unknown += [field for field in worse or [] if field not in scored_fields(inspection_type)]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Поля недоступны для сравнения: {', '.join(sorted(set(unknown)))}"
+        )
+    if any(value not in DIFF_STATUSES for value in status_filter):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Допустимые статусы: {', '.join(DIFF_STATUSES)}"
+        )
+    archived = [
+        snapshot.cycle_id for snapshot in snapshot_store.open_all(project_id)
+        if snapshot.archived and snapshot.cycle_id in (cycle_id, base_cycle_id)
+    ]
+    if archived:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Осмотры цикла {archived[0]} перенесены в архив, для сравнения цикл нужно разморозить"
+        )
+    # Ухудшение считается по полям из fields и worse: поле worse сравнивается всегда
+    fields = list(dict.fromkeys([*fields, *(worse or [])]))
+
+    if base_cycle_id is None:
+        project_db = factory()
+        try:
+            base_cycle_id = get_previous_cycle(project_db, inspection_type, cycle_id)
+        finally:
+            project_db.close()
+        if base_cycle_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Нет предыдущего цикла с осмотрами для сравнения"
+            )
+    elif base_cycle_id == cycle_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Цикл-база совпадает со сравниваемым циклом"
+        )
+
+    return StreamingResponse(
+        iter_cycle_diff(factory, inspection_type, cycle_id, base_cycle_id, fields, worse or [], status_filter),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+    )
+
+
+@inspection_router.get("/history/{element_id}", response_model=InspectionHistoryResponse)
+async def get_inspection_history(
+    project_id: int,
+    element_id: int,
+    type: Optional[List[str]] = Query(None, description="Типы осмотров (по умолчанию все)"),
+    current_user: User = Depends(require_project_role("viewer")),
+    project_db: Session = Depends(get_project_db)
+):
+    """
+    История осмотров элемента по всем циклам: значения чеклиста, state_id и inspect_id
+    (фото и заметки - в осмотре цикла). Отвечает из покрывающих индексов
+    """
+    unknown = [key for key in type or [] if key not in INSPECTION_TYPES]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Неизвестный тип осмотра: {', '.join(unknown)}"
+        )
+    history = get_element_history(project_db, element_id, type or [], snapshots=snapshot_store.open_all(project_id))
+    return FastJSONResponse({"element_id": element_id, "history": history})
@@ -0,0 +1,182 @@
+"""
+Эндпоинты управления правами доступа к проектам
+Массовая выдача и отзыв прав (пользователи x проекты)
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from sqlalchemy.orm import Session
+from typing import Dict, List, Tuple
+from core.database import get_db
+from core.models import User, Project
+from core.schemas import (
+    ProjectPermissionBulkGrant, ProjectPermissionBulkRevoke,
+    ProjectPermissionBulkResponse, ProjectPermissionKey
+)
+from utils.auth_utils import PROJECT_ROLE_HIERARCHY
+from middleware.auth_dependencies import require_admin
+from services.permission_service import bulk_upsert_permissions, bulk_delete_permissions
+from services.audit_service import AuditService
+import structlog
+
+logger = structlog.get_logger()
+
+permission_router = APIRouter(prefix="/v1/permissions", tags=["Права доступа"])
+
+
+def _resolve_targets(db: Session, emails: List[str], project_ids: List[int]):
+    """Разрешение email и ID проектов - по одному запросу на каждый список"""
+    unique_emails = list(dict.fromkeys(emails))
+    unique_project_ids = list(dict.fromkeys(project_ids))
+
+    users = dict(db.query(User.email, User.id).filter(User.email.in_(unique_emails)).all())
+    existing_projects = {
+        project_id for (project_id,) in db.query(Project.id).filter(Project.id.in_(unique_project_ids)).all()
+    }
+
+    unknown_emails = [email for email in unique_emails if email not in users]
+    unknown_project_ids = [project_id for project_id in unique_project_ids if project_id not in existing_projects]
+    known_project_ids = [project_id for project_id in unique_project_ids if project_id in existing_projects]
+    return users, known_project_ids, unknown_emails, unknown_project_ids
+
+
+def _keys(pairs: List[Tuple[int, int]]) -> List[ProjectPermissionKey]:
+    return [ProjectPermissionKey(user_id=user_id, project_id=project_id) for user_id, project_id in pairs]
+
+
+@permission_router.post("/bulk-grant", response_model=ProjectPermissionBulkResponse)
+async def bulk_grant_permissions(
+    grant_data: ProjectPermissionBulkGrant,
+    request: Request,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Массовая выдача прав: каждому пользователю во всех указанных проектах"""
+
+    if len(grant_data.roles) not in (1, len(grant_data.user_emails)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Укажите одну роль для всех пользователей или по роли на каждый email"
+        )
+    invalid_roles = sorted(set(grant_data.roles) - set(PROJECT_ROLE_HIERARCHY))
+    if invalid_roles:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Недопустимые роли: {', '.join(invalid_roles)}"
+        )
+
+    users, project_ids, unknown_emails, unknown_project_ids = _resolve_targets(
+        db, grant_data.user_emails, grant_data.project_ids
+    )
+
+    # Повторы email схлопываются: действует последняя указанная роль
+    entries: Dict[Tuple[int, int], str] = {}
+    for index, email in enumerate(grant_data.user_emails):
+        user_id = users.get(email)
+        if user_id is None:
+            continue
+        role = grant_data.roles[0] if len(grant_data.roles) == 1 else grant_data.roles[index]
+        for project_id in project_ids:
+            entries[(user_id, project_id)] = role
+
+    try:
+        created, updated, unchanged = bulk_upsert_permissions(db, entries)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error("Bulk permission grant failed", error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при массовой выдаче прав"
+        )
+
+    logger.info(
+        "Bulk permissions granted",
+        admin_id=current_user.id,
+        created=len(created),
+        updated=len(updated),
+        unchanged=len(unchanged)
+    )
+
+    try:
+        await AuditService.log_action(
+            db=db,
+            user_id=current_user.id,
+            category="admin",
+            action_type="admin.permission.bulk_grant",
+            action_name=f"Массовая выдача прав: {len(users)} польз. x {len(project_ids)} проект.",
+            resource_type="permission",
+            details={
+                "user_emails": list(users),
+                "project_ids": project_ids,
+                "roles": sorted(set(grant_data.roles)),
+                "created": len(created),
+                "updated": len(updated),
+                "unchanged": len(unchanged),
+                "unknown_emails": unknown_emails,
+                "unknown_project_ids": unknown_project_ids
+            },
+            request=request
+        )
+    except Exception as audit_err:
+        logger.warning("Failed to log audit action", error=str(audit_err))
+
+    return ProjectPermissionBulkResponse(
+        created=_keys(created),
+        updated=_keys(updated),
+        unchanged=_keys(unchanged),
+        unknown_emails=unknown_emails,
+        unknown_project_ids=unknown_project_ids
+    )
+
+
+@permission_router.post("/bulk-revoke", response_model=ProjectPermissionBulkResponse)
+async def bulk_revoke_permissions(
+    revoke_data: ProjectPermissionBulkRevoke,
+    request: Request,
+    current_user: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Массовый отзыв прав: у каждого пользователя во всех указанных проектах"""
+
+    users, project_ids, unknown_emails, unknown_project_ids = _resolve_targets(
+        db, revoke_data.user_emails, revoke_data.project_ids
+    )
+
+    try:
+        deleted = bulk_delete_permissions(db, list(users.values()), project_ids)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error("Bulk permission revoke failed", error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при массовом отзыве прав"
+        )
+
+    logger.info("Bulk permissions revoked", admin_id=current_user.id, deleted=len(deleted))
+
+    try:
+        await AuditService.log_action(
+            db=db,
+            user_id=current_user.id,
+            category="admin",
+            action_type="admin.permission.bulk_revoke",
+            action_name=f"Массовый отзыв прав: {len(users)} польз. x {len(project_ids)} проект.",
+            resource_type="permission",
+            details={
+                "user_emails": list(users),
+                "project_ids": project_ids,
+                "deleted": len(deleted),
+                "unknown_emails": unknown_emails,
+                "unknown_project_ids": unknown_project_ids
+            },
+            request=request
+        )
+    except Exception as audit_err:
+        logger.warning("Failed to log audit action", error=str(audit_err))
+
+    return ProjectPermissionBulkResponse(
+        deleted=_keys(deleted),
+        unknown_emails=unknown_emails,
+        unknown_project_ids=unknown_project_ids
+    )
@@ -0,0 +1,185 @@
+"""
+Эндпоинты фотографий осмотров
+Бинарная загрузка (multipart или сырое тело запроса) вместо base64 в JSON,
+выдача фото отдельным запросом с ETag, Range и долгим кэшированием.
+После загрузки в фоне строятся производные (пережатое фото и миниатюры)
+"""
+
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Request, UploadFile, status
+from sqlalchemy.orm import Session
+from typing import List, Literal, Optional
+from core.database import get_db
+from core.models import User, Photo, PhotoProject
+from core.schemas import PhotoUploadResponse, PhotoHaveNeedRequest, PhotoHaveNeedResponse
+from middleware.auth_dependencies import require_project_role
+from services.photo_storage import (
+    photo_storage, register_photo, find_known_photos, StoredPhoto, PHOTO_CONTENT_TYPES
+)
+from services.image_pipeline import image_pipeline, VARIANTS
+from utils.http_range import file_response
+import structlog
+
+logger = structlog.get_logger()
+
+photo_router = APIRouter(prefix="/v1/projects/{project_id}/photos", tags=["Фотографии"])
+
+# Содержимое адресуется хешем и не меняется - кэшируем "навсегда"
+PHOTO_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def _to_response(photo: StoredPhoto) -> PhotoUploadResponse:
+    return PhotoUploadResponse(photo_id=photo.photo_id, size=photo.size, content_type=photo.content_type)
+
+
+@photo_router.post("/have-need", response_model=PhotoHaveNeedResponse)
+async def photos_have_need(
+    project_id: int,
+    request_data: PhotoHaveNeedRequest,
+    current_user: User = Depends(require_project_role("operator")),
+    db: Session = Depends(get_db)
+):
+    """
+    Предпроверка перед загрузкой: клиент считает SHA-256 фото локально и отправляет
+    только те, которых нет в проекте (need). Для have достаточно указать photo_id в осмотре.
+    Фото, загруженное только в другой проект, попадает в need
+    """
+    requested = list(dict.fromkeys(photo_id.lower() for photo_id in request_data.photo_ids))
+    known = find_known_photos(db, project_id, requested)
+    return PhotoHaveNeedResponse(
+        have=[photo_id for photo_id in requested if photo_id in known],
+        need=[photo_id for photo_id in requested if photo_id not in known]
+    )
+
+
+def _store_received(db: Session, project_id: int, received: List[StoredPhoto]) -> None:
+    """Метаданные и связь с проектом в БД, затем перенос файлов в хранилище (порядок важен для сборщика мусора)"""
+    try:
+        for photo in received:
+            register_photo(db, project_id, photo)
+        db.commit()
+        for photo in received:
+            photo_storage.finalize(photo)
+    finally:
+        for photo in received:
+            photo_storage.discard(photo)
+
+
+@photo_router.post("", response_model=List[PhotoUploadResponse], status_code=status.HTTP_201_CREATED)
+async def upload_photos(
+    project_id: int,
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    current_user: User = Depends(require_project_role("operator")),
+    db: Session = Depends(get_db)
+):
+    """
+    Загрузка фотографий (multipart/form-data, поле files).
+    Подходит для пакета осмотров: все фото пакета одним запросом, затем photo_id в элементах
+    UnifiedInspectionBatchCreate. Порядок ответа совпадает с порядком файлов.
+    """
+    received: List[StoredPhoto] = []
+    try:
+        for upload in files:
+            try:
+                received.append(await photo_storage.receive_upload(upload))
+            finally:
+                await upload.close()
+        _store_received(db, project_id, received)
+    except HTTPException:
+        db.rollback()
+        for photo in received:
+            photo_storage.discard(photo)
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error("Photo upload failed", project_id=project_id, error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при сохранении фотографий"
+        )
+
+    background_tasks.add_task(image_pipeline.build_many, [photo.photo_id for photo in received])
+    logger.info("Photos uploaded", project_id=project_id, user_id=current_user.id, count=len(received))
+    return [_to_response(photo) for photo in received]
+
+
+@photo_router.post("/raw", response_model=PhotoUploadResponse, status_code=status.HTTP_201_CREATED)
+async def upload_photo_raw(
+    project_id: int,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(require_project_role("operator")),
+    db: Session = Depends(get_db)
+):
+    """
+    Загрузка одного фото сырым телом запроса (Content-Type: image/*), без буферизации.
+    Тип фото определяется по содержимому, не изображение отклоняется (415)
+    """
+    content_type = request.headers.get("content-type") or ""
+    if not content_type.lower().startswith("image/"):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Ожидается Content-Type: image/*"
+        )
+    try:
+        photo = await photo_storage.receive_stream(request.stream())
+        _store_received(db, project_id, [photo])
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error("Raw photo upload failed", project_id=project_id, error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при сохранении фото"
+        )
+
+    background_tasks.add_task(image_pipeline.build_many, [photo.photo_id])
+    logger.info("Photo uploaded", project_id=project_id, user_id=current_user.id, photo_id=photo.photo_id)
+    return _to_response(photo)
+
+
+@photo_router.api_route("/{photo_id}", methods=["GET", "HEAD"])
+async def get_photo(
+    project_id: int,
+    photo_id: str,
+    request: Request,
+    variant: Optional[Literal["display", "thumb_large", "thumb_small"]] = None,
+    current_user: User = Depends(require_project_role("viewer")),
+    db: Session = Depends(get_db)
+):
+    """
+    Получение фото: ETag = SHA-256, поддержка If-None-Match и Range (докачка, просмотр частями).
+    variant - производная (display - для просмотра, thumb_large/thumb_small - для списков);
+    если фото не изображение или обработка не удалась, отдается оригинал
+    """
+    photo = (
+        db.query(Photo)
+        .join(PhotoProject, PhotoProject.sha256 == Photo.sha256)
+        .filter(Photo.sha256 == photo_id, PhotoProject.project_id == project_id)
+        .first()
+    )
+    if photo is None or not photo_storage.exists(photo_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Фото не найдено"
+        )
+
+    path = photo_storage.path_for(photo_id)
+    size = photo.size
+    # Тип из БД отдается только из белого списка (фото, загруженные до проверки содержимого)
+    media_type = photo.content_type if photo.content_type in PHOTO_CONTENT_TYPES else "application/octet-stream"
+    etag = f'"{photo.sha256}"'
+    variant_path = await image_pipeline.get_variant(photo_id, variant) if variant else None
+    if variant_path is not None:
+        # Настройки варианта входят в ETag: после их смены кэш клиента не устаревает молча
+        path = variant_path
+        size = variant_path.stat().st_size
+        media_type = "image/jpeg"
+        etag = f'"{photo.sha256}.{VARIANTS[variant].key}"'
+
+    return file_response(
+        request, path, size, media_type, etag, PHOTO_CACHE_CONTROL,
+        extra_headers={"X-Content-Type-Options": "nosniff"}
+    )
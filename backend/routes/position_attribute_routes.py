@@ -0,0 +1,219 @@
+"""
+Эндпоинты параметров позиций (positions_attributes, БД проекта)
+Пакетное обновление параметров (вставка из таблицы), копирование параметров позиции на
+позицию, подобъект, объект или проект (крупная цель - фоновой задачей)
+"""
+
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Request
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+from core.database import get_db
+from core.project_database import get_project_db, get_project_factory
+from core.models import User
+from core.schemas import (
+    PositionAttributesBulkUpdate, PositionAttributesBulkResult,
+    PositionAttributesCopyRequest, PositionAttributesCopyResult, PositionAttributeCopyJobResponse
+)
+from middleware.auth_dependencies import require_project_role
+from services.position_attribute_service import (
+    ATTRIBUTE_COPY_SYNC_LIMIT, bulk_update_attributes, cancel_copy_job, copy_attributes, create_copy_job,
+    estimate_copy, get_copy_job, lock_source, run_copy_job
+)
+from services.audit_service import AuditService
+from utils.serialization import FastJSONResponse
+import structlog
+
+logger = structlog.get_logger()
+
+position_attribute_router = APIRouter(
+    prefix="/v1/projects/{project_id}/positions/attributes", tags=["Параметры позиций"]
+)
+
+
+@position_attribute_router.post("/bulk", response_model=PositionAttributesBulkResult)
+async def bulk_update_position_attributes(
+    project_id: int,
+    payload: PositionAttributesBulkUpdate,
+    request: Request,
+    current_user: User = Depends(require_project_role("manager")),
+    db: Session = Depends(get_db),
+    project_db: Session = Depends(get_project_db)
+):
+    """
+    Пакетное обновление параметров позиций одной транзакцией. Меняются только переданные поля,
+    позиция без параметров получает новую строку. Ошибочные строки возвращаются со статусом
+    error и не отменяют запись остальных
+    """
+    try:
+        result = await run_in_threadpool(bulk_update_attributes, project_db, payload)
+    except Exception as e:
+        logger.error("Position attributes bulk update failed", project_id=project_id, error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при сохранении параметров позиций"
+        )
+
+    try:
+        await AuditService.log_action(
+            db=db,
+            user_id=current_user.id,
+            category="project",
+            action_type="project.position_attributes.bulk_update",
+            action_name="Пакетное обновление параметров позиций",
+            resource_type="position_attributes",
+            details={
+                "created": result.created,
+                "updated": result.updated,
+                "unchanged": result.unchanged,
+                "failed": result.failed
+            },
+            request=request,
+            project_id=project_id
+        )
+    except Exception as audit_err:
+        logger.warning("Failed to log audit action", error=str(audit_err))
+
+    logger.info(
+        "Position attributes stored",
+        project_id=project_id,
+        user_id=current_user.id,
+        created=result.created,
+        updated=result.updated,
+        unchanged=result.unchanged,
+        failed=result.failed
+    )
+    return result
+
+
+def _copy_or_create_job(
+    project_db: Session, db: Session, project_id: int, user_id: int, copy_request: PositionAttributesCopyRequest
+) -> Optional[tuple]:
+    """
+    Синхронная часть копирования: оценка, затем копирование или создание фоновой задачи.
+    Возвращает (оценка, задача или None); None - у позиции-источника нет параметров
+    """
+    if not lock_source(project_db, copy_request.source_position_id):
+        project_db.rollback()
+        return None
+    estimate = estimate_copy(project_db, copy_request)
+
+    job = None
+    if copy_request.dry_run:
+        project_db.rollback()
+    elif estimate["targets"] > ATTRIBUTE_COPY_SYNC_LIMIT:
+        project_db.rollback()
+        job = create_copy_job(db, project_id, user_id, copy_request, estimate["targets"])
+    else:
+        estimate.update(copy_attributes(project_db, copy_request))
+        project_db.commit()
+    return estimate, job
+
+
+@position_attribute_router.post("/copy", response_model=PositionAttributesCopyResult)
+async def copy_position_attributes(
+    project_id: int,
+    copy_request: PositionAttributesCopyRequest,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(require_project_role("manager")),
+    db: Session = Depends(get_db),
+    project_db: Session = Depends(get_project_db),
+    factory: sessionmaker = Depends(get_project_factory)
+):
+    """
+    Копирование параметров позиции-источника на позицию, подобъект, объект или весь проект.
+    dry_run - только подсчет затрагиваемых позиций. Цель больше ATTRIBUTE_COPY_SYNC_LIMIT позиций
+    копируется фоновой задачей (202, прогресс - GET /copy/jobs/{job_id})
+    """
+    try:
+        copied = await run_in_threadpool(
+            _copy_or_create_job, project_db, db, project_id, current_user.id, copy_request
+        )
+    except Exception as e:
+        project_db.rollback()
+        logger.error("Position attributes copy failed", project_id=project_id, error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при копировании параметров позиций"
+        )
+    if copied is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="У позиции-источника нет параметров"
+        )
+    estimate, job = copied
+    if job is not None:
+        background_tasks.add_task(run_copy_job, factory, job.id)
+
+    result = PositionAttributesCopyResult(
+        dry_run=copy_request.dry_run,
+        job=PositionAttributeCopyJobResponse.model_validate(job) if job is not None else None,
+        **estimate
+    )
+    if copy_request.dry_run:
+        return result
+
+    try:
+        await AuditService.log_action(
+            db=db,
+            user_id=current_user.id,
+            category="project",
+            action_type="project.position_attributes.copy",
+            action_name="Копирование параметров позиций",
+            resource_type="position_attributes",
+            resource_id=str(copy_request.source_position_id),
+            details={
+                **copy_request.model_dump(exclude={"dry_run"}),
+                "targets": result.targets,
+                "job_id": job.id if job is not None else None
+            },
+            request=request,
+            project_id=project_id
+        )
+    except Exception as audit_err:
+        logger.warning("Failed to log audit action", error=str(audit_err))
+
+    if job is not None:
+        return FastJSONResponse(result.model_dump(mode="json"), status_code=status.HTTP_202_ACCEPTED)
+    return result
+
+
+@position_attribute_router.get("/copy/jobs/{job_id}", response_model=PositionAttributeCopyJobResponse)
+async def get_position_attributes_copy_job(
+    project_id: int,
+    job_id: int,
+    current_user: User = Depends(require_project_role("manager")),
+    db: Session = Depends(get_db)
+):
+    """Состояние и прогресс фоновой задачи копирования"""
+    job = get_copy_job(db, project_id, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задача копирования не найдена"
+        )
+    return job
+
+
+@position_attribute_router.post("/copy/jobs/{job_id}/cancel", response_model=PositionAttributeCopyJobResponse)
+async def cancel_position_attributes_copy_job(
+    project_id: int,
+    job_id: int,
+    current_user: User = Depends(require_project_role("manager")),
+    db: Session = Depends(get_db)
+):
+    """Отмена задачи копирования: задача останавливается после текущей порции, запись откатывается"""
+    job = get_copy_job(db, project_id, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задача копирования не найдена"
+        )
+    if not cancel_copy_job(db, job):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Задача копирования уже завершена"
+        )
+    logger.info("Position attributes copy cancel requested", project_id=project_id, job_id=job_id, user_id=current_user.id)
+    return job
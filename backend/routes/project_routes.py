@@ -0,0 +1,82 @@
+"""
+Эндпоинты проектов
+Metadata проекта (циклы, исключенные позиции)
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from sqlalchemy.orm import Session
+from core.database import get_db
+from core.models import User
+from core.schemas import ProjectMetadataResponse, ProjectMetadataUpdate
+from middleware.auth_dependencies import require_project_role
+from services.project_metadata_service import (
+    get_project_metadata, update_project_metadata, metadata_to_response
+)
+from services.audit_service import AuditService
+import structlog
+
+logger = structlog.get_logger()
+
+project_router = APIRouter(prefix="/v1/projects", tags=["Проекты"])
+
+
+@project_router.get("/{project_id}/metadata", response_model=ProjectMetadataResponse)
+async def get_metadata(
+    project_id: int,
+    compact: bool = False,
+    current_user: User = Depends(require_project_role("viewer")),
+    db: Session = Depends(get_db)
+):
+    """Получение metadata проекта (compact=true - исключенные позиции только диапазонами)"""
+    metadata = get_project_metadata(db, project_id)
+    if metadata is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Проект не найден"
+        )
+    return metadata_to_response(metadata, compact=compact)
+
+
+@project_router.patch("/{project_id}/metadata", response_model=ProjectMetadataResponse)
+async def patch_metadata(
+    project_id: int,
+    update_data: ProjectMetadataUpdate,
+    request: Request,
+    current_user: User = Depends(require_project_role("manager")),
+    db: Session = Depends(get_db)
+):
+    """Частичное обновление metadata проекта (атомарно, в БД)"""
+    try:
+        metadata = update_project_metadata(db, project_id, update_data)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error("Project metadata update failed", project_id=project_id, error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при обновлении metadata проекта"
+        )
+
+    if metadata is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Проект не найден"
+        )
+
+    try:
+        await AuditService.log_action(
+            db=db,
+            user_id=current_user.id,
+            category="project",
+            action_type="project.metadata.update",
+            action_name="Изменение metadata проекта",
+            resource_type="project",
+            resource_id=str(project_id),
+            details=update_data.model_dump(exclude_none=True),
+            request=request,
+            project_id=project_id
+        )
+    except Exception as audit_err:
+        logger.warning("Failed to log audit action", error=str(audit_err))
+
+    return metadata_to_response(metadata)
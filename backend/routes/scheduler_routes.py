@@ -0,0 +1,215 @@
+"""
+Эндпоинты планировщика осмотров
+Прогресс задач из счетчиков БД проекта (экран планировщика опрашивает его периодически),
+календарь, проверка пересечений расписания, генерация плана цикла и маршрут обхода позиций
+"""
+
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from psycopg2 import errors
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from core.database import get_db
+from core.project_database import get_project_db
+from core.models import Project, User
+from core.schemas import (
+    SchedulerTaskProgress, SchedulerCalendarTask, SchedulerConflictCheckRequest, SchedulerConflictCheckResponse,
+    SchedulerPlanRequest, SchedulerPlanResponse, RoutePlanResponse
+)
+from middleware.auth_dependencies import require_project_role
+from services.audit_service import AuditService
+from services.project_metadata_service import get_excluded_positions
+from services.route_planner_service import (
+    ROUTE_PLAN_MAX_POSITIONS, coordinates_available, get_task_subobject, load_positions, plan_route
+)
+from services.scheduler_calendar_service import find_conflicts, get_calendar
+from services.scheduler_plan_service import generate_plan
+from services.scheduler_progress_service import list_task_progress
+from utils.serialization import FastJSONResponse
+import structlog
+
+logger = structlog.get_logger()
+
+scheduler_router = APIRouter(prefix="/v1/projects/{project_id}/scheduler", tags=["Планировщик"])
+
+
+@scheduler_router.get("/progress", response_model=List[SchedulerTaskProgress])
+async def get_tasks_progress(
+    project_id: int,
+    cycle_id: Optional[int] = Query(None, description="Только задачи цикла"),
+    task_id: Optional[List[int]] = Query(None, description="Только указанные задачи"),
+    current_user: User = Depends(require_project_role("viewer")),
+    db: Session = Depends(get_db),
+    project_db: Session = Depends(get_project_db)
+):
+    """Прогресс задач: позиций и элементов DM/TS всего и осмотрено в цикле задачи (без исключенных позиций)"""
+    return FastJSONResponse(list_task_progress(
+        project_db, cycle_id=cycle_id, task_ids=task_id, excluded=get_excluded_positions(db, project_id)
+    ))
+
+
+@scheduler_router.get("/calendar", response_model=List[SchedulerCalendarTask])
+async def get_tasks_calendar(
+    project_id: int,
+    date_from: date = Query(..., description="Начало окна (YYYY-MM-DD)"),
+    date_to: date = Query(..., description="Конец окна включительно (YYYY-MM-DD)"),
+    subobject_id: Optional[int] = Query(None),
+    cycle_id: Optional[int] = Query(None),
+    current_user: User = Depends(require_project_role("viewer")),
+    project_db: Session = Depends(get_project_db)
+):
+    """Задачи, пересекающиеся с окном календаря (например, с месяцем)"""
+    if date_to < date_from:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="date_to раньше date_from"
+        )
+    return FastJSONResponse(get_calendar(project_db, date_from, date_to, subobject_id=subobject_id, cycle_id=cycle_id))
+
+
+@scheduler_router.post("/conflicts", response_model=SchedulerConflictCheckResponse)
+async def check_schedule_conflicts(
+    project_id: int,
+    request: SchedulerConflictCheckRequest,
+    current_user: User = Depends(require_project_role("viewer")),
+    project_db: Session = Depends(get_project_db)
+):
+    """
+    Проверка предлагаемого расписания до сохранения: пересечения окон задач одного подобъекта
+    с существующими задачами и между собой. Данные не меняются
+    """
+    conflicts = find_conflicts(project_db, request.tasks)
+    return FastJSONResponse({
+        "has_conflicts": bool(conflicts),
+        "items": [{"index": index, "conflicts": items} for index, items in sorted(conflicts.items())],
+    })
+
+
+@scheduler_router.post("/plan", response_model=SchedulerPlanResponse)
+async def generate_cycle_plan(
+    project_id: int,
+    plan_request: SchedulerPlanRequest,
+    request: Request,
+    current_user: User = Depends(require_project_role("manager")),
+    db: Session = Depends(get_db),
+    project_db: Session = Depends(get_project_db)
+):
+    """
+    План цикла одной транзакцией: задача с окном [start_date, end_date] для каждого подобъекта
+    с неисключенными позициями (или для subobject_ids). Уже запланированные и пересекающиеся пропускаются
+    """
+    try:
+        result = generate_plan(project_db, plan_request, get_excluded_positions(db, project_id))
+        project_db.commit()
+    except IntegrityError as e:
+        project_db.rollback()
+        if not isinstance(e.orig, errors.ExclusionViolation):
+            logger.error("Scheduler plan generation failed", project_id=project_id, cycle_id=plan_request.cycle_id, error=str(e))
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Ошибка при создании плана цикла"
+            )
+        # Задачу с пересекающимся окном записали в обход генерации плана (без блокировки подобъекта)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Окно задачи пересекается с задачей, созданной одновременно с планом. Повторите запрос"
+        )
+    except Exception as e:
+        project_db.rollback()
+        logger.error("Scheduler plan generation failed", project_id=project_id, cycle_id=plan_request.cycle_id, error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при создании плана цикла"
+        )
+
+    try:
+        await AuditService.log_action(
+            db=db,
+            user_id=current_user.id,
+            category="project",
+            action_type="project.scheduler.plan",
+            action_name="Генерация плана цикла",
+            resource_type="scheduler_tasks",
+            resource_id=str(plan_request.cycle_id),
+            details={
+                **plan_request.model_dump(mode="json"),
+                "created": result["created"],
+                "skipped_existing": result["skipped_existing"],
+                "skipped_conflicts": result["skipped_conflicts"]
+            },
+            request=request,
+            project_id=project_id
+        )
+    except Exception as audit_err:
+        logger.warning("Failed to log audit action", error=str(audit_err))
+
+    logger.info(
+        "Scheduler plan generated",
+        project_id=project_id,
+        user_id=current_user.id,
+        cycle_id=plan_request.cycle_id,
+        created=result["created"],
+        skipped_existing=result["skipped_existing"],
+        skipped_conflicts=result["skipped_conflicts"]
+    )
+    return FastJSONResponse(result)
+
+
+@scheduler_router.get("/route", response_model=RoutePlanResponse)
+async def get_inspection_route(
+    project_id: int,
+    task_id: Optional[int] = Query(None, description="Задача планировщика (маршрут по ее подобъекту)"),
+    subobject_id: Optional[int] = Query(None),
+    start_position_id: Optional[int] = Query(None, description="Начало маршрута; по умолчанию - крайняя позиция"),
+    current_user: User = Depends(require_project_role("viewer")),
+    db: Session = Depends(get_db),
+    project_db: Session = Depends(get_project_db)
+):
+    """
+    Порядок обхода позиций подобъекта по координатам (с поправкой азимута севера проекта)
+    и оценка длины маршрута. Результат кэшируется до изменения позиций
+    """
+    if (task_id is None) == (subobject_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Укажите task_id или subobject_id"
+        )
+    if not coordinates_available(project_db):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="В БД проекта не настроены координаты позиций"
+        )
+    if task_id is not None:
+        subobject_id = get_task_subobject(project_db, task_id)
+        if subobject_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Задача не найдена"
+            )
+
+    position_ids, points, version = load_positions(project_db, subobject_id, get_excluded_positions(db, project_id))
+    if not position_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="У подобъекта нет позиций с координатами"
+        )
+    if len(position_ids) > ROUTE_PLAN_MAX_POSITIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Слишком много позиций для построения маршрута (максимум {ROUTE_PLAN_MAX_POSITIONS})"
+        )
+    if start_position_id is not None and start_position_id not in position_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Начальная позиция не входит в подобъект"
+        )
+
+    project = db.query(Project).filter(Project.id == project_id).first()
+    correction = project.north_azimuth_correction if project is not None else 0.0
+    # Построение маршрута - вычисления на CPU, event loop не блокируется
+    result = await run_in_threadpool(
+        plan_route, project_id, subobject_id, position_ids, points, version, correction or 0.0, start_position_id
+    )
+    return FastJSONResponse(result)
@@ -0,0 +1,37 @@
+"""
+Эндпоинты дельта-синхронизации полевых клиентов
+Вместо полной выгрузки UnifiedInspectionResponse клиент получает только изменения
+после своей версии (осмотры, параметры позиций, задачи планировщика)
+"""
+
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from core.project_database import get_project_db
+from core.models import User
+from core.schemas import SyncChangesResponse
+from middleware.auth_dependencies import require_project_role
+from services.sync_service import get_changes, SYNC_PAGE_SIZE, SYNC_MAX_PAGE_SIZE
+from utils.serialization import FastJSONResponse
+
+sync_router = APIRouter(prefix="/v1/projects/{project_id}/sync", tags=["Синхронизация"])
+
+
+@sync_router.get("/changes", response_model=SyncChangesResponse, response_model_exclude_none=True)
+async def get_sync_changes(
+    project_id: int,
+    since: int = Query(0, ge=0, description="Версия из предыдущей синхронизации (0 - полная выгрузка)"),
+    cycle_id: Optional[int] = Query(None, description="Только изменения цикла (и сущностей без цикла)"),
+    limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=SYNC_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+    current_user: User = Depends(require_project_role("viewer")),
+    project_db: Session = Depends(get_project_db)
+):
+    """Изменения после версии since: upsert-строки и tombstone удаленных сущностей"""
+    try:
+        return FastJSONResponse(get_changes(project_db, since=since, cycle_id=cycle_id, limit=limit, cursor=cursor))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
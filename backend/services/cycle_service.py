@@ -0,0 +1,128 @@
+"""
+Циклы осмотров проекта
+Список циклов (шапка каждой страницы проекта) строится одним запросом: has_data -
+EXISTS по сводке осмотров (inspection_summary, строки по типам осмотра), без проверки
+таблиц осмотров для каждого цикла. Список кэшируется в памяти процесса по проекту и
+сбрасывается при записи осмотров и изменении циклов.
+cycle_status и признак заморозки (снимок цикла) вычисляются при каждом запросе и в кэш не входят.
+"""
+
+import os
+from typing import Any, Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from core.schemas import CycleCreate, CycleUpdate
+from services.cycle_snapshot_service import snapshot_store
+from utils.ttl_cache import GenerationalTTLCache
+import structlog
+
+logger = structlog.get_logger()
+
+# Цикл, созданный или измененный через другой воркер, появляется в списке не позже этого времени
+CYCLE_LIST_TTL_SECONDS = int(os.environ.get("CYCLE_LIST_TTL_SECONDS", "60"))
+
+CYCLE_STATUS_PLANNED = 0
+CYCLE_STATUS_ACTIVE = 1
+CYCLE_STATUS_COMPLETED = 2
+
+_CYCLE_COLUMNS = """
+    cycle_id, number,
+    CAST(date_start AS text) AS date_start,
+    CAST(date_end AS text) AS date_end,
+    description
+"""
+
+
+class CycleListCache:
+    """In-process кэш project_id -> циклы с has_data"""
+
+    def __init__(self, ttl_seconds: int = CYCLE_LIST_TTL_SECONDS):
+        self._cycles: GenerationalTTLCache[int, List[Dict[str, Any]]] = GenerationalTTLCache(ttl_seconds)
+
+    def get_cycles(self, db: Session, project_id: int) -> List[Dict[str, Any]]:
+        return self._cycles.get_or_load(project_id, lambda: self._load(db, project_id))
+
+    @staticmethod
+    def _load(db: Session, project_id: int) -> List[Dict[str, Any]]:
+        cycles = load_cycles(db)
+        logger.debug("Cycle list loaded", project_id=project_id, cycles=len(cycles))
+        return cycles
+
+    def invalidate(self, project_id: int) -> None:
+        self._cycles.invalidate([project_id])
+
+
+# Создаем глобальный экземпляр кэша
+cycle_list_cache = CycleListCache()
+
+
+def load_cycles(db: Session) -> List[Dict[str, Any]]:
+    """Циклы БД проекта с has_data одним запросом"""
+    rows = db.execute(
+        text(f"""
+            SELECT {_CYCLE_COLUMNS},
+                   EXISTS (
+                       SELECT 1 FROM inspection_summary s
+                       WHERE s.cycle_id = c.cycle_id AND s.inspected > 0
+                   ) AS has_data
+            FROM cycles c
+            ORDER BY number, cycle_id
+        """)
+    ).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def cycle_status(cycle_id: int, metadata: Optional[Dict[str, Any]]) -> int:
+    metadata = metadata or {}
+    if cycle_id in (metadata.get("completed_cycles") or []):
+        return CYCLE_STATUS_COMPLETED
+    if cycle_id == metadata.get("current_cycle_id"):
+        return CYCLE_STATUS_ACTIVE
+    return CYCLE_STATUS_PLANNED
+
+
+def list_cycles(db: Session, project_id: int, metadata: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Циклы проекта; поля совпадают с CycleResponse"""
+    # Архивированный цикл без строк в таблицах осмотров: данные есть в снимке
+    frozen = set(snapshot_store.frozen_cycles(project_id))
+    return [
+        {
+            **cycle,
+            "has_data": cycle["has_data"] or cycle["cycle_id"] in frozen,
+            "cycle_status": cycle_status(cycle["cycle_id"], metadata),
+            "frozen": cycle["cycle_id"] in frozen,
+        }
+        for cycle in cycle_list_cache.get_cycles(db, project_id)
+    ]
+
+
+def create_cycle(db: Session, cycle: CycleCreate) -> Dict[str, Any]:
+    """Создание цикла. Коммит и сброс кэша - на вызывающей стороне"""
+    row = db.execute(
+        text(f"""
+            INSERT INTO cycles (number, date_start, date_end, description)
+            VALUES (:number, :date_start, :date_end, :description)
+            RETURNING {_CYCLE_COLUMNS}
+        """),
+        cycle.model_dump()
+    ).mappings().one()
+    return {**row, "has_data": False}
+
+
+def update_cycle(db: Session, cycle_id: int, update: CycleUpdate) -> Optional[Dict[str, Any]]:
+    """Частичное обновление цикла (None - цикл не найден). Коммит и сброс кэша - на вызывающей стороне"""
+    values = update.model_dump(exclude_unset=True)
+    assignments = ", ".join(f"{field} = :{field}" for field in values) or "cycle_id = cycle_id"
+    row = db.execute(
+        text(f"""
+            UPDATE cycles c SET {assignments}
+            WHERE cycle_id = :cycle_id
+            RETURNING {_CYCLE_COLUMNS},
+                      EXISTS (
+                          SELECT 1 FROM inspection_summary s
+                          WHERE s.cycle_id = c.cycle_id AND s.inspected > 0
+                      ) AS has_data
+        """),
+        {**values, "cycle_id": cycle_id}
+    ).mappings().first()
+    return dict(row) if row else None
@@ -0,0 +1,634 @@
+"""
+Снимки завершенных циклов
+Осмотры завершенного цикла (все типы) и параметры позиций на момент заморозки
+сохраняются в неизменяемый колоночный снимок - каталог на диске:
+    manifest.json               - таблицы, число строк, колонки и их кодирование
+    <таблица>.<колонка>.npy     - числовая колонка в минимальном целом типе (int8 для оценок 0-5)
+                                  или код словаря (текст с малым числом значений, например state_id)
+    <таблица>.<колонка>.null.npy - маска NULL числовой колонки (если NULL есть)
+    <таблица>.<колонка>.json.gz - прочие колонки (заметки, даты, фото) - JSON со сжатием
+Строки отсортированы по ключу (element_id, position_id): поиск элемента - бинарный поиск
+по отображенному в память (mmap) столбцу, без чтения снимка целиком.
+
+Замороженный цикл отмечается в таблице frozen_cycles БД проекта (db/project/010_frozen_cycles.sql)
+в транзакции заморозки; пакетная запись осмотров в такой цикл отклоняется. Заморозка и запись
+осмотров сериализуются advisory-блокировкой цикла (заморозка - исключительная, запись - разделяемая).
+
+С archive=True строки цикла переносятся из таблиц осмотров в снимок в той же транзакции.
+Сводка осмотров видит это как удаление (сводка цикла читается из снимка); журнал синхронизации
+и счетчики прогресса планировщика перенос не видят (app.cycle_archive). Разморозка возвращает
+строки из снимка и удаляет его. Исторические эндпоинты (поток, история элемента, сводка)
+для замороженных циклов читают снимок.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+import orjson
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from core.inspection_types import INSPECTION_TYPES
+from core.schemas import InspectionSummaryItem
+from services.inspection_stream_service import STREAM_CHUNK_ROWS, stream_query
+from services.photo_storage import change_photo_refs
+from utils.serialization import dumps
+import structlog
+
+logger = structlog.get_logger()
+
+CYCLE_SNAPSHOT_DIR = os.environ.get(
+    "CYCLE_SNAPSHOT_DIR",
+    str(Path(__file__).parent.parent / "storage" / "snapshots")
+)
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+ATTRIBUTES_TABLE = "positions_attributes"
+# Строк в одном INSERT при разморозке
+RESTORE_CHUNK_ROWS = 5000
+# Временная таблица строк, удаленных из таблицы осмотров при архивации
+ARCHIVE_ROWS_TABLE = "cycle_archive_rows"
+# Пространство advisory-блокировок заморозки (второй ключ - cycle_id)
+FREEZE_LOCK_NAMESPACE = "cycle_freeze"
+# Текстовая колонка кодируется словарем, если значений не больше этого и не больше половины строк
+DICTIONARY_MAX_VALUES = 65535
+
+NUMERIC_TYPES = {
+    "smallint": np.int16,
+    "integer": np.int32,
+    "bigint": np.int64,
+    "real": np.float32,
+    "double precision": np.float64,
+    "boolean": np.bool_,
+}
+BYTES_TYPE = "bytea"
+
+
+# ==================== Кодирование колонок ====================
+
+def _narrow_int(values: np.ndarray) -> np.ndarray:
+    """Минимальный целый тип, вмещающий значения колонки"""
+    if len(values) == 0:
+        return values.astype(np.int8)
+    low, high = int(values.min()), int(values.max())
+    for dtype in (np.int8, np.int16, np.int32, np.int64):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return values.astype(dtype)
+    return values
+
+
+class _ColumnWriter:
+    """
+    Запись колонки в каталог снимка порциями строк. Числа и коды словаря копятся в массивах
+    NumPy, прочие значения (текст, даты, bytea) сразу пишутся в json.gz. Словарное кодирование
+    решается в close(): если различных значений мало, json.gz заменяется кодами
+    """
+
+    def __init__(self, directory: Path, table: str, name: str, pg_type: str):
+        self.base = directory / f"{table}.{name}"
+        self.column: Dict[str, Any] = {"name": name, "pg_type": pg_type}
+        self.pg_type = pg_type
+        self.rows = 0
+        self._chunks: List[np.ndarray] = []
+        self._nulls: List[np.ndarray] = []
+        self._file = None
+        # Значение -> код в порядке появления; None - колонка не кодируется словарем
+        self._codes: Optional[Dict[str, int]] = None
+        if pg_type not in NUMERIC_TYPES:
+            self._file = gzip.open(f"{self.base}.json.gz", "wb")
+            self._file.write(b"[")
+            if pg_type != BYTES_TYPE:
+                self._codes = {}
+
+    def write(self, values: List[Any]) -> None:
+        if self.pg_type in NUMERIC_TYPES:
+            self._nulls.append(np.array([value is None for value in values], dtype=bool))
+            self._chunks.append(np.array(
+                [0 if value is None else value for value in values], dtype=NUMERIC_TYPES[self.pg_type]
+            ))
+        elif values:
+            if self.pg_type == BYTES_TYPE:
+                encoded = orjson.dumps([None if value is None else "\\x" + bytes(value).hex() for value in values])
+            else:
+                # JSON-представление ответов API (даты - ISO, Decimal - строка)
+                encoded = dumps(values)
+                if self._codes is not None:
+                    self._add_codes(orjson.loads(encoded))
+            self._file.write((b"," if self.rows else b"") + encoded[1:-1])
+        self.rows += len(values)
+
+    def _add_codes(self, values: List[Any]) -> None:
+        codes = np.empty(len(values), dtype=np.int32)
+        for index, value in enumerate(values):
+            if value is None:
+                codes[index] = -1
+                continue
+            code = self._codes.setdefault(value, len(self._codes)) if isinstance(value, str) else None
+            if code is None or code >= DICTIONARY_MAX_VALUES:
+                self._codes = None
+                self._chunks = []
+                return
+            codes[index] = code
+        self._chunks.append(codes)
+
+    def close(self) -> Dict[str, Any]:
+        """Завершение записи; возвращает описание колонки для manifest"""
+        if self.pg_type in NUMERIC_TYPES:
+            dtype = NUMERIC_TYPES[self.pg_type]
+            filled = np.concatenate(self._chunks) if self._chunks else np.array([], dtype=dtype)
+            nulls = np.concatenate(self._nulls) if self._nulls else np.array([], dtype=bool)
+            if np.issubdtype(dtype, np.integer):
+                filled = _narrow_int(filled)
+            np.save(f"{self.base}.npy", filled, allow_pickle=False)
+            self.column.update(kind="numeric", dtype=str(filled.dtype), nullable=bool(nulls.any()))
+            if nulls.any():
+                np.save(f"{self.base}.null.npy", nulls, allow_pickle=False)
+            return self.column
+
+        self._file.write(b"]")
+        self._file.close()
+        if self.pg_type == BYTES_TYPE:
+            self.column.update(kind="bytes")
+            return self.column
+
+        if self._codes is not None and len(self._codes) <= min(DICTIONARY_MAX_VALUES, max(self.rows // 2, 1)):
+            dictionary = sorted(self._codes)
+            # Коды в порядке появления -> номера в отсортированном словаре (последний элемент - NULL)
+            remap = np.empty(len(dictionary) + 1, dtype=np.int32)
+            remap[-1] = -1
+            remap[[self._codes[value] for value in dictionary]] = np.arange(len(dictionary), dtype=np.int32)
+            codes = np.concatenate(self._chunks) if self._chunks else np.array([], dtype=np.int32)
+            codes = _narrow_int(remap[codes])
+            np.save(f"{self.base}.npy", codes, allow_pickle=False)
+            os.unlink(f"{self.base}.json.gz")
+            self.column.update(kind="dictionary", dtype=str(codes.dtype), dictionary=dictionary)
+            return self.column
+
+        self.column.update(kind="text")
+        return self.column
+
+    def abort(self) -> None:
+        """Закрытие файла, если запись прервана (после close ничего не делает)"""
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+
+
+# ==================== Чтение снимка ====================
+
+class CycleSnapshot:
+    """Открытый снимок цикла: колонки загружаются лениво, числовые - через mmap"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.manifest = json.loads((path / MANIFEST_NAME).read_text(encoding="utf-8"))
+        self.cycle_id: int = self.manifest["cycle_id"]
+        self.archived: bool = self.manifest["archived"]
+        self._columns: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    def has_table(self, table: str) -> bool:
+        return table in self.manifest["tables"]
+
+    def row_count(self, table: str) -> int:
+        return self.manifest["tables"][table]["rows"] if self.has_table(table) else 0
+
+    def column_names(self, table: str) -> List[str]:
+        return [column["name"] for column in self.manifest["tables"][table]["columns"]]
+
+    def _column_info(self, table: str, name: str) -> Dict[str, Any]:
+        for column in self.manifest["tables"][table]["columns"]:
+            if column["name"] == name:
+                return column
+        raise KeyError(f"{table}.{name}")
+
+    def column(self, table: str, name: str) -> Any:
+        """
+        Данные колонки: (значения, маска NULL) для числовых, (коды, словарь) для словарных,
+        список значений для прочих
+        """
+        key = (table, name)
+        cached = self._columns.get(key)
+        if cached is not None:
+            return cached
+
+        info = self._column_info(table, name)
+        base = self.path / f"{table}.{name}"
+        if info["kind"] == "numeric":
+            nulls = np.load(f"{base}.null.npy", mmap_mode="r") if info["nullable"] else None
+            data = (np.load(f"{base}.npy", mmap_mode="r"), nulls)
+        elif info["kind"] == "dictionary":
+            data = (np.load(f"{base}.npy", mmap_mode="r"), info["dictionary"])
+        else:
+            with gzip.open(f"{base}.json.gz", "rb") as file:
+                data = orjson.loads(file.read())
+        with self._lock:
+            self._columns[key] = data
+        return data
+
+    def values(self, table: str, name: str, start: int = 0, stop: Optional[int] = None) -> List[Any]:
+        """Значения колонки в диапазоне строк как объекты Python (bytea - bytes)"""
+        info = self._column_info(table, name)
+        data = self.column(table, name)
+        if info["kind"] == "numeric":
+            values, nulls = data
+            result = values[start:stop].tolist()
+            if nulls is not None:
+                result = [None if null else value for value, null in zip(result, nulls[start:stop].tolist())]
+            return result
+        if info["kind"] == "dictionary":
+            codes, dictionary = data
+            return [None if code < 0 else dictionary[code] for code in codes[start:stop].tolist()]
+        if info["kind"] == "bytes":
+            return [None if value is None else bytes.fromhex(value[2:]) for value in data[start:stop]]
+        return data[start:stop]
+
+    def rows(self, table: str, columns: Sequence[str], start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        available = [name for name in columns if name in self.column_names(table)]
+        data = [self.values(table, name, start, stop) for name in available]
+        return [dict(zip(available, row)) for row in zip(*data)]
+
+    def iter_rows(self, table: str, columns: Sequence[str], chunk_rows: int = STREAM_CHUNK_ROWS) -> Iterator[List[Dict[str, Any]]]:
+        total = self.row_count(table)
+        for start in range(0, total, chunk_rows):
+            yield self.rows(table, columns, start, min(start + chunk_rows, total))
+
+    def find(self, table: str, key_value: int) -> Tuple[int, int]:
+        """Диапазон строк с ключом таблицы = key_value (бинарный поиск по mmap-колонке)"""
+        if not self.has_table(table):
+            return 0, 0
+        keys, _ = self.column(table, self.manifest["tables"][table]["key"])
+        return int(np.searchsorted(keys, key_value, side="left")), int(np.searchsorted(keys, key_value, side="right"))
+
+    def counts(self, table: str, name: str) -> Dict[Any, int]:
+        """Число строк по значениям колонки (NULL не учитывается) - по кодам, без развертывания строк"""
+        info = self._column_info(table, name)
+        data = self.column(table, name)
+        if info["kind"] == "dictionary":
+            codes, dictionary = data
+            counted = np.bincount(np.asarray(codes)[np.asarray(codes) >= 0], minlength=len(dictionary))
+            return {dictionary[code]: int(count) for code, count in enumerate(counted.tolist()) if count}
+        if info["kind"] == "numeric":
+            values, nulls = data
+            values = np.asarray(values) if nulls is None else np.asarray(values)[~np.asarray(nulls)]
+            unique, counted = np.unique(values, return_counts=True)
+            return {value: int(count) for value, count in zip(unique.tolist(), counted.tolist())}
+        result: Dict[Any, int] = {}
+        for value in data:
+            if value is not None:
+                result[value] = result.get(value, 0) + 1
+        return result
+
+
+class CycleSnapshotStore:
+    """Каталог снимков: <root>/<project_id>/cycle_<cycle_id>/"""
+
+    def __init__(self, root: str = CYCLE_SNAPSHOT_DIR):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        # Открытые снимки; ключ включает mtime manifest (заморозка в другом воркере)
+        self._opened: Dict[Tuple[int, int], Tuple[int, CycleSnapshot]] = {}
+
+    def path(self, project_id: int, cycle_id: int) -> Path:
+        return self.root / str(project_id) / f"cycle_{cycle_id}"
+
+    def open(self, project_id: int, cycle_id: int) -> Optional[CycleSnapshot]:
+        """Снимок цикла или None, если цикл не заморожен"""
+        path = self.path(project_id, cycle_id)
+        try:
+            mtime = (path / MANIFEST_NAME).stat().st_mtime_ns
+        except FileNotFoundError:
+            with self._lock:
+                self._opened.pop((project_id, cycle_id), None)
+            return None
+
+        cached = self._opened.get((project_id, cycle_id))
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        snapshot = CycleSnapshot(path)
+        with self._lock:
+            self._opened[(project_id, cycle_id)] = (mtime, snapshot)
+        return snapshot
+
+    def frozen_cycles(self, project_id: int) -> List[int]:
+        directory = self.root / str(project_id)
+        if not directory.is_dir():
+            return []
+        return sorted(
+            int(entry.name[len("cycle_"):]) for entry in os.scandir(directory)
+            if entry.name.startswith("cycle_") and os.path.exists(os.path.join(entry.path, MANIFEST_NAME))
+        )
+
+    def open_all(self, project_id: int) -> List[CycleSnapshot]:
+        snapshots = [self.open(project_id, cycle_id) for cycle_id in self.frozen_cycles(project_id)]
+        return [snapshot for snapshot in snapshots if snapshot is not None]
+
+    def forget(self, project_id: int, cycle_id: int) -> None:
+        with self._lock:
+            self._opened.pop((project_id, cycle_id), None)
+
+
+# Создаем глобальный экземпляр хранилища снимков
+snapshot_store = CycleSnapshotStore()
+
+
+# ==================== Заморозка и разморозка ====================
+
+class CycleRestoreConflict(Exception):
+    """Строки снимка конфликтуют с живыми строками таблиц осмотров (разморозка отменена)"""
+
+    def __init__(self, cycle_id: int, conflicts: Dict[str, int]):
+        super().__init__(f"cycle {cycle_id}: {conflicts}")
+        self.cycle_id = cycle_id
+        self.conflicts = conflicts
+
+
+def lock_cycles_for_write(db: Session, cycle_ids: Sequence[int]) -> List[int]:
+    """
+    Разделяемые блокировки циклов до конца транзакции записи осмотров; возвращает
+    замороженные циклы из cycle_ids (запись в них отклоняется). Блокировки берутся
+    в порядке cycle_id, чтобы параллельные пакеты не взаимоблокировались
+    """
+    ordered = sorted(set(cycle_ids))
+    if not ordered:
+        return []
+    db.execute(
+        text("""
+            SELECT pg_advisory_xact_lock_shared(hashtext(:namespace), cycle_id)
+            FROM unnest(CAST(:cycle_ids AS integer[])) AS cycle_id
+            ORDER BY cycle_id
+        """),
+        {"namespace": FREEZE_LOCK_NAMESPACE, "cycle_ids": ordered}
+    )
+    rows = db.execute(
+        text("SELECT cycle_id FROM frozen_cycles WHERE cycle_id = ANY(CAST(:cycle_ids AS integer[]))"),
+        {"cycle_ids": ordered}
+    ).all()
+    return [row.cycle_id for row in rows]
+
+
+def _lock_cycle(db: Session, cycle_id: int, mode: Optional[str] = None) -> None:
+    """Исключительная блокировка цикла (ждет пишущие пакеты) и режим переноса строк для триггеров"""
+    db.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:namespace), :cycle_id)"),
+        {"namespace": FREEZE_LOCK_NAMESPACE, "cycle_id": cycle_id}
+    )
+    if mode is not None:
+        db.execute(text("SELECT set_config('app.cycle_archive', :mode, true)"), {"mode": mode})
+
+
+def _table_columns(db: Session, table: str) -> Dict[str, str]:
+    rows = db.execute(
+        text("""
+            SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = :table
+            ORDER BY ordinal_position
+        """),
+        {"table": table}
+    ).all()
+    return {row.column_name: row.data_type for row in rows}
+
+
+def _write_table(
+    db: Session,
+    directory: Path,
+    table: str,
+    key: str,
+    chunks: Iterator[List[dict]],
+    inspection_type: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Запись колонок таблицы по порциям строк (порции приходят отсортированными по ключу:
+    ORDER BY в запросе). В памяти остаются только числовые колонки и коды словарей
+    """
+    writers = [_ColumnWriter(directory, table, name, pg_type) for name, pg_type in _table_columns(db, table).items()]
+    try:
+        for rows in chunks:
+            for writer in writers:
+                writer.write([row[writer.column["name"]] for row in rows])
+        encoded = [writer.close() for writer in writers]
+    finally:
+        for writer in writers:
+            writer.abort()
+    return {"rows": writers[0].rows if writers else 0, "key": key, "inspection_type": inspection_type, "columns": encoded}
+
+
+def freeze_cycle(db: Session, project_id: int, cycle_id: int, archive: bool = False) -> Dict[str, Any]:
+    """
+    Запись снимка цикла. С archive=True строки цикла удаляются из таблиц осмотров
+    (DELETE ... RETURNING - снимок содержит ровно удаленные строки; они переносятся во временную
+    таблицу и читаются из нее серверным курсором в порядке ключа). Коммит выполняется здесь:
+    каталог снимка публикуется переименованием перед коммитом и удаляется, если коммит не удался.
+    FileExistsError - цикл уже заморожен
+    """
+    final = snapshot_store.path(project_id, cycle_id)
+    if (final / MANIFEST_NAME).exists():
+        raise FileExistsError(str(final))
+
+    _lock_cycle(db, cycle_id, "archive" if archive else None)
+    marked = db.execute(
+        text("""
+            INSERT INTO frozen_cycles (cycle_id, archived) VALUES (:cycle_id, :archived)
+            ON CONFLICT (cycle_id) DO NOTHING
+            RETURNING cycle_id
+        """),
+        {"cycle_id": cycle_id, "archived": archive}
+    ).first()
+    if marked is None:
+        db.rollback()
+        raise FileExistsError(str(final))
+
+    staging = final.with_name(f".{final.name}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    try:
+        tables: Dict[str, Any] = {}
+        for key, inspection_type in INSPECTION_TYPES.items():
+            table = inspection_type.table
+            if not db.execute(text("SELECT to_regclass(:table) IS NOT NULL"), {"table": table}).scalar():
+                continue
+            params = {"cycle_id": cycle_id}
+            source = table
+            if archive:
+                # Серверный курсор для DELETE недоступен: удаленные строки читаются из временной таблицы
+                source = ARCHIVE_ROWS_TABLE
+                db.execute(text(f"CREATE TEMP TABLE {source} ON COMMIT DROP AS SELECT * FROM {table} WITH NO DATA"))
+                db.execute(
+                    text(f"""
+                        WITH deleted AS (DELETE FROM {table} WHERE cycle_id = :cycle_id RETURNING *)
+                        INSERT INTO {source} SELECT * FROM deleted
+                    """),
+                    params
+                )
+            chunks = stream_query(db, f"SELECT * FROM {source} WHERE cycle_id = :cycle_id ORDER BY element_id", params)
+            tables[table] = _write_table(db, staging, table, "element_id", chunks, key)
+            if archive:
+                db.execute(text(f"DROP TABLE {source}"))
+
+        if db.execute(text("SELECT to_regclass(:table) IS NOT NULL"), {"table": ATTRIBUTES_TABLE}).scalar():
+            tables[ATTRIBUTES_TABLE] = _write_table(
+                db, staging, ATTRIBUTES_TABLE, "position_id", stream_query(db, f"SELECT * FROM {ATTRIBUTES_TABLE} ORDER BY position_id", {})
+            )
+
+        manifest = {
+            "version": SNAPSHOT_FORMAT_VERSION,
+            "project_id": project_id,
+            "cycle_id": cycle_id,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "archived": archive,
+            "tables": tables,
+        }
+        (staging / MANIFEST_NAME).write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        staging.rename(final)
+    except Exception:
+        db.rollback()
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    try:
+        db.commit()
+    except Exception:
+        shutil.rmtree(final, ignore_errors=True)
+        raise
+    snapshot_store.forget(project_id, cycle_id)
+
+    summary = snapshot_info(manifest)
+    logger.info("Cycle frozen", project_id=project_id, cycle_id=cycle_id, archived=archive, rows=summary["rows"])
+    return summary
+
+
+def _restore_value(info: Dict[str, Any], value: Any) -> Any:
+    """Значение для jsonb_populate_recordset (bytea - текстовая форма \\x..., как в снимке)"""
+    if info["kind"] == "bytes" and isinstance(value, bytes):
+        return "\\x" + value.hex()
+    return value
+
+
+def unfreeze_cycle(
+    db: Session, central_db: Session, project_id: int, cycle_id: int, discard_conflicts: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Возврат строк архивированного цикла в таблицы осмотров и удаление снимка. None - цикл
+    не заморожен. Строка снимка, ключ которой уже занят живой строкой (ручная правка БД),
+    не возвращается: такие строки считаются в conflicts, и без discard_conflicts разморозка
+    отменяется (CycleRestoreConflict), снимок остается. Ссылки на фото отброшенных строк
+    (архив их сохраняет) отпускаются в центральной БД после коммита
+    """
+    _lock_cycle(db, cycle_id, "restore")
+    snapshot = snapshot_store.open(project_id, cycle_id)
+    if snapshot is None:
+        # Отметка без снимка (каталог удален вручную) не должна блокировать запись в цикл
+        db.execute(text("DELETE FROM frozen_cycles WHERE cycle_id = :cycle_id AND NOT archived"), {"cycle_id": cycle_id})
+        db.commit()
+        return None
+
+    restored: Dict[str, int] = {}
+    conflicts: Dict[str, int] = {}
+    discarded_photos: Counter = Counter()
+    if snapshot.archived:
+        for table, info in snapshot.manifest["tables"].items():
+            if info["inspection_type"] is None:
+                continue
+            restored[table] = 0
+            columns = {column["name"]: column for column in info["columns"]}
+            for rows in snapshot.iter_rows(table, list(columns), RESTORE_CHUNK_ROWS):
+                payload = [
+                    {name: _restore_value(columns[name], value) for name, value in row.items()}
+                    for row in rows
+                ]
+                # photo_id вставленных строк: фото отброшенных - разность с фото порции
+                inserted = db.execute(
+                    text(f"""
+                        INSERT INTO {table}
+                        SELECT * FROM jsonb_populate_recordset(NULL::{table}, CAST(:rows AS jsonb))
+                        ON CONFLICT DO NOTHING
+                        RETURNING {"photo_id" if "photo_id" in columns else "NULL"} AS photo_id
+                    """),
+                    {"rows": dumps(payload).decode()}
+                ).scalars().all()
+                restored[table] += len(inserted)
+                if len(rows) > len(inserted):
+                    conflicts[table] = conflicts.get(table, 0) + len(rows) - len(inserted)
+                    discarded_photos.update(row.get("photo_id") for row in rows if row.get("photo_id"))
+                    discarded_photos.subtract(photo_id for photo_id in inserted if photo_id)
+
+    if conflicts and not discard_conflicts:
+        db.rollback()
+        logger.warning("Cycle unfreeze conflicts", project_id=project_id, cycle_id=cycle_id, conflicts=conflicts)
+        raise CycleRestoreConflict(cycle_id, conflicts)
+
+    db.execute(text("DELETE FROM frozen_cycles WHERE cycle_id = :cycle_id"), {"cycle_id": cycle_id})
+    db.commit()
+
+    # Каталог удаляется после коммита: при сбое снимок остается, повтор не дублирует строки
+    retired = snapshot.path.with_name(f".{snapshot.path.name}.removed")
+    snapshot.path.rename(retired)
+    shutil.rmtree(retired, ignore_errors=True)
+    snapshot_store.forget(project_id, cycle_id)
+
+    # Сбой здесь оставляет счетчик завышенным (фото не удаляется), но не заниженным
+    released = list(discarded_photos.elements())
+    try:
+        change_photo_refs(central_db, released=released)
+        central_db.commit()
+    except Exception as e:
+        central_db.rollback()
+        logger.warning("Failed to release discarded snapshot photos", project_id=project_id, cycle_id=cycle_id, error=str(e))
+
+    logger.info("Cycle unfrozen", project_id=project_id, cycle_id=cycle_id, restored=restored, conflicts=conflicts)
+    return {"cycle_id": cycle_id, "archived": snapshot.archived, "restored": restored, "conflicts": conflicts}
+
+
+def snapshot_info(manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """Описание снимка для API (поля CycleSnapshotInfo)"""
+    return {
+        "cycle_id": manifest["cycle_id"],
+        "archived": manifest["archived"],
+        "created_at": manifest["created_at"],
+        "rows": {table: info["rows"] for table, info in manifest["tables"].items()},
+    }
+
+
+# ==================== Чтение для исторических эндпоинтов ====================
+
+def snapshot_history(
+    snapshots: Sequence[CycleSnapshot],
+    element_id: int,
+    columns_by_type: Dict[str, List[str]]
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Строки истории элемента из снимков: {тип: [строки по циклам]}"""
+    history: Dict[str, List[Dict[str, Any]]] = {}
+    for snapshot in snapshots:
+        for key, columns in columns_by_type.items():
+            table = INSPECTION_TYPES[key].table
+            start, stop = snapshot.find(table, element_id)
+            if start < stop:
+                history.setdefault(key, []).extend(snapshot.rows(table, columns, start, stop))
+    return history
+
+
+def snapshot_summary_items(snapshot: CycleSnapshot, inspection_type: Optional[str] = None) -> List[InspectionSummaryItem]:
+    """Сводка цикла из снимка: счетчики по кодам и маскам колонок, без развертывания строк"""
+    items = []
+    for key, item in INSPECTION_TYPES.items():
+        if inspection_type is not None and key != inspection_type:
+            continue
+        table = item.table
+        if snapshot.row_count(table) == 0:
+            continue
+        names = snapshot.column_names(table)
+        items.append(InspectionSummaryItem(
+            cycle_id=snapshot.cycle_id,
+            type=key,
+            inspected=snapshot.row_count(table),
+            by_result=snapshot.counts(table, "inspectresult") if "inspectresult" in names else {},
+            by_state=snapshot.counts(table, "state_id") if "state_id" in names else {},
+        ))
+    return items
@@ -0,0 +1,355 @@
+"""
+Полевые пакеты для работы без связи
+Один сжатый архив на (проект, цикл): SQLite-база с позициями, последним осмотром каждого
+элемента, задачами цикла и справочниками, плюс миниатюры фото. Пакет собирается в фоне
+один раз на версию данных и отдается всем инспекторам с поддержкой докачки (Range).
+
+Версия данных - последняя транзакция журнала sync_changes по циклам до выбранного
+включительно и по справочникам (reference_changes, db/project/011_reference_changes.sql):
+пока данные не менялись, повторные запросы получают готовый файл. После загрузки пакета клиент
+продолжает дельта-синхронизацию с sync_version из manifest.json.
+Исключенные позиции проекта (metadata) в пакет не попадают вместе с элементами,
+параметрами и осмотрами; набор исключений входит в имя файла пакета.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import zipfile
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+from core.inspection_types import INSPECTION_TYPES
+from services.image_pipeline import image_pipeline
+from services.project_metadata_service import excluded_elements_condition, excluded_positions_condition
+from services.sync_service import SYNC_ENTITIES
+from utils.position_set import PositionIdSet
+import structlog
+
+logger = structlog.get_logger()
+
+FIELD_PACKAGE_DIR = os.environ.get(
+    "FIELD_PACKAGE_DIR",
+    str(Path(__file__).parent.parent / "storage" / "packages")
+)
+FIELD_PACKAGE_THUMBNAIL = "thumb_large"
+FIELD_PACKAGE_MEDIA_TYPE = "application/zip"
+
+# Справочники проекта, копируемые целиком, если таблица есть в БД проекта
+REFERENCE_TABLES = ("objects", "subobjects", "positions", "elements", "states")
+# Колонка ID позиции справочника: строки исключенных позиций в пакет не попадают
+POSITION_COLUMNS = {"positions": "position_id", "elements": "position_id"}
+
+
+@dataclass
+class FieldPackage:
+    project_id: int
+    cycle_id: int
+    version: int  # Версия данных (xid8 последнего изменения)
+    path: Path
+    excluded: PositionIdSet = field(default_factory=PositionIdSet)  # Исключенные позиции проекта
+
+    @property
+    def ready(self) -> bool:
+        return self.path.is_file()
+
+    @property
+    def size(self) -> int:
+        return self.path.stat().st_size
+
+    @property
+    def tag(self) -> str:
+        """Версия пакета: версия данных и набор исключенных позиций (ETag, имя файла)"""
+        return self.path.stem
+
+    @property
+    def filename(self) -> str:
+        return f"field-package-{self.project_id}-{self.cycle_id}-{self.tag}.zip"
+
+
+def get_data_version(db: Session, cycle_id: int) -> int:
+    """
+    Версия данных цикла: последняя транзакция, изменившая содержимое пакета - осмотры циклов
+    до выбранного включительно (пакет берет последний осмотр элемента), данные без цикла
+    и справочники. Журнал читается обратным проходом по индексу tx
+    """
+    version = db.execute(
+        text("""
+            SELECT CAST(greatest(
+                (SELECT tx FROM sync_changes
+                 WHERE cycle_id IS NULL OR cycle_id <= :cycle_id
+                 ORDER BY tx DESC
+                 LIMIT 1),
+                (SELECT max(tx) FROM reference_changes)
+            ) AS text)
+        """),
+        {"cycle_id": cycle_id}
+    ).scalar()
+    db.commit()
+    return int(version) if version is not None else 0
+
+
+def _sqlite_value(value: Any) -> Any:
+    if value is None or isinstance(value, (int, float, str, bytes)):
+        return value
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, memoryview):
+        return bytes(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _copy_query(db: Session, sqlite_db: sqlite3.Connection, table: str, query: str, params: Dict[str, Any]) -> Tuple[int, List[str]]:
+    """Копирование результата запроса в таблицу SQLite (типы колонок SQLite не нужны)"""
+    result = db.execute(text(query), params)
+    columns = list(result.keys())
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    sqlite_db.execute(f'CREATE TABLE "{table}" ({column_list})')
+    insert = f'INSERT INTO "{table}" VALUES ({", ".join("?" for _ in columns)})'
+    count = 0
+    while True:
+        rows = result.fetchmany(5000)
+        if not rows:
+            break
+        sqlite_db.executemany(insert, [tuple(_sqlite_value(value) for value in row) for row in rows])
+        count += len(rows)
+    return count, columns
+
+
+def _write_database(
+    db: Session, sqlite_path: Path, cycle_id: int, excluded: PositionIdSet
+) -> Tuple[int, Dict[str, int], List[str]]:
+    """
+    Выгрузка данных цикла в SQLite в одном снимке (REPEATABLE READ) без исключенных позиций.
+    Возвращает (sync_version, количество строк по таблицам, photo_id для миниатюр)
+    """
+    db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    sync_version = int(db.execute(text("SELECT CAST(pg_snapshot_xmin(pg_current_snapshot()) AS text)")).scalar())
+
+    counts: Dict[str, int] = {}
+    photo_ids: List[str] = []
+    sqlite_db = sqlite3.connect(sqlite_path)
+    try:
+        for key, inspection_type in INSPECTION_TYPES.items():
+            columns = ", ".join(inspection_type.response_columns(include_photos=False))
+            params: Dict[str, Any] = {"cycle_id": cycle_id}
+            # Последний осмотр каждого элемента до выбранного цикла включительно
+            counts[key], _ = _copy_query(
+                db, sqlite_db, f"{key}_inspections",
+                f"""
+                    SELECT DISTINCT ON (element_id) {columns}
+                    FROM {inspection_type.table}
+                    WHERE cycle_id <= :cycle_id AND {excluded_elements_condition(excluded, "element_id", params)}
+                    ORDER BY element_id, cycle_id DESC
+                """,
+                params
+            )
+            photo_ids += [row[0] for row in sqlite_db.execute(
+                f'SELECT DISTINCT photo_id FROM "{key}_inspections" WHERE photo_id IS NOT NULL'
+            )]
+            sqlite_db.execute(f'CREATE INDEX "ix_{key}_inspections_element" ON "{key}_inspections" (element_id)')
+
+        existing = set(db.execute(
+            text("SELECT table_name FROM information_schema.tables WHERE table_schema = current_schema() AND table_name = ANY(:names)"),
+            {"names": [*REFERENCE_TABLES, "positions_attributes", "scheduler_tasks"]}
+        ).scalars())
+
+        attributes = SYNC_ENTITIES["position_attributes"]
+        if attributes.table in existing:
+            params = {}
+            counts["position_attributes"], _ = _copy_query(
+                db, sqlite_db, "position_attributes",
+                f"SELECT {', '.join(attributes.columns)} FROM {attributes.table} "
+                f"WHERE {excluded_positions_condition(excluded, 'position_id', params)}",
+                params
+            )
+        tasks = SYNC_ENTITIES["scheduler_tasks"]
+        if tasks.table in existing:
+            counts["scheduler_tasks"], _ = _copy_query(
+                db, sqlite_db, "scheduler_tasks",
+                f"SELECT {', '.join(tasks.columns)} FROM {tasks.table} WHERE cycle_id = :cycle_id",
+                {"cycle_id": cycle_id}
+            )
+        for table in REFERENCE_TABLES:
+            if table in existing:
+                params = {}
+                condition = (
+                    excluded_positions_condition(excluded, POSITION_COLUMNS[table], params)
+                    if table in POSITION_COLUMNS else "TRUE"
+                )
+                counts[table], _ = _copy_query(db, sqlite_db, table, f"SELECT * FROM {table} WHERE {condition}", params)
+
+        sqlite_db.execute("CREATE TABLE package_info (key TEXT PRIMARY KEY, value TEXT)")
+        sqlite_db.executemany(
+            "INSERT INTO package_info VALUES (?, ?)",
+            [("cycle_id", str(cycle_id)), ("sync_version", str(sync_version))]
+        )
+        sqlite_db.commit()
+    finally:
+        sqlite_db.close()
+        db.rollback()
+
+    return sync_version, counts, sorted(set(photo_ids))
+
+
+def _write_archive(package: FieldPackage, sqlite_path: Path, manifest: Dict[str, Any], photo_ids: List[str]) -> int:
+    """Архив: база сжимается, JPEG-миниатюры кладутся без повторного сжатия"""
+    tmp_path = package.path.with_suffix(".zip.tmp")
+    thumbnails = 0
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+        archive.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+        archive.write(sqlite_path, "package.sqlite")
+        for photo_id in photo_ids:
+            thumbnail = image_pipeline.path_for(photo_id, FIELD_PACKAGE_THUMBNAIL)
+            if thumbnail.is_file():
+                archive.write(thumbnail, f"thumbnails/{photo_id}.jpg", compress_type=zipfile.ZIP_STORED)
+                thumbnails += 1
+    os.replace(tmp_path, package.path)
+    return thumbnails
+
+
+class FieldPackageBuilder:
+    """Сборка и кэш полевых пакетов (одна сборка на версию, в т.ч. между процессами)"""
+
+    def __init__(self, root: str = FIELD_PACKAGE_DIR):
+        self.root = Path(root)
+        self._builds: Dict[Path, asyncio.Task] = {}
+
+    def package_for(
+        self, project_id: int, cycle_id: int, version: int, excluded: PositionIdSet = PositionIdSet()
+    ) -> FieldPackage:
+        """Пакет версии данных; при исключенных позициях к имени добавляется хеш их диапазонов"""
+        name = str(version)
+        if excluded:
+            name += "-" + hashlib.sha256(excluded.to_multirange().encode()).hexdigest()[:12]
+        return FieldPackage(
+            project_id, cycle_id, version, self.root / str(project_id) / str(cycle_id) / f"{name}.zip", excluded
+        )
+
+    def is_building(self, package: FieldPackage) -> bool:
+        task = self._builds.get(package.path)
+        return task is not None and not task.done()
+
+    def ensure_build(self, factory: sessionmaker, package: FieldPackage) -> None:
+        """Запуск сборки в фоне, если пакета нет и он еще не собирается в этом процессе"""
+        key = package.path
+        if package.ready or self.is_building(package):
+            return
+        task = asyncio.get_running_loop().create_task(self.build(factory, package))
+        self._builds[key] = task
+        task.add_done_callback(lambda _: self._builds.pop(key, None))
+
+    async def build(self, factory: sessionmaker, package: FieldPackage) -> Optional[FieldPackage]:
+        """Сборка пакета. Блокировка файла не дает другим процессам собирать тот же пакет"""
+        package.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = self._lock(package.path.with_suffix(".lock"))
+        if lock_file is None:
+            return None  # Собирает другой процесс
+        try:
+            if package.ready:
+                return package
+            return await self._build_locked(factory, package)
+        except Exception as e:
+            logger.error("Field package build failed", project_id=package.project_id, cycle_id=package.cycle_id, error=str(e))
+            return None
+        finally:
+            lock_file.close()
+
+    @staticmethod
+    def _lock(lock_path: Path) -> Optional[TextIO]:
+        """
+        Захват файла блокировки без ожидания (None - файл заблокирован другим процессом).
+        Очистка удаляет файл блокировки, только захватив его, поэтому захват проверяет, что
+        заблокированный файл все еще лежит по этому пути; иначе открывается новый файл
+        """
+        while True:
+            lock_file = open(lock_path, "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                return None
+            try:
+                if os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino:
+                    return lock_file
+            except FileNotFoundError:
+                pass
+            lock_file.close()
+
+    async def _build_locked(self, factory: sessionmaker, package: FieldPackage) -> FieldPackage:
+        started = datetime.now(timezone.utc)
+        with tempfile.TemporaryDirectory(dir=package.path.parent) as tmp_dir:
+            sqlite_path = Path(tmp_dir) / "package.sqlite"
+
+            def write_database():
+                db = factory()
+                try:
+                    return _write_database(db, sqlite_path, package.cycle_id, package.excluded)
+                finally:
+                    db.close()
+
+            sync_version, counts, photo_ids = await run_in_threadpool(write_database)
+            await image_pipeline.build_many(photo_ids)
+
+            manifest = {
+                "project_id": package.project_id,
+                "cycle_id": package.cycle_id,
+                "data_version": package.version,
+                "sync_version": sync_version,
+                "excluded_position_ranges": package.excluded.to_ranges(),
+                "built_at": started.isoformat(),
+                "tables": counts,
+                "photos": len(photo_ids),
+            }
+            thumbnails = await run_in_threadpool(_write_archive, package, sqlite_path, manifest, photo_ids)
+
+        self._remove_stale(package)
+        logger.info(
+            "Field package built",
+            project_id=package.project_id,
+            cycle_id=package.cycle_id,
+            version=package.version,
+            size=package.size,
+            thumbnails=thumbnails,
+            seconds=round((datetime.now(timezone.utc) - started).total_seconds(), 2)
+        )
+        return package
+
+    @classmethod
+    def _remove_stale(cls, package: FieldPackage) -> None:
+        """
+        Удаление пакетов и файлов блокировки предыдущих версий этого цикла. Файл блокировки
+        удаляется только захваченным: сборка, которая еще держит его, продолжается, ее файлы
+        удалит следующая очистка
+        """
+        for old in package.path.parent.glob("*.lock"):
+            if old == package.path.with_suffix(".lock"):
+                continue
+            lock_file = cls._lock(old)
+            if lock_file is None:
+                continue
+            try:
+                old.with_suffix(".zip").unlink(missing_ok=True)
+                old.unlink(missing_ok=True)
+            finally:
+                lock_file.close()
+        for old in package.path.parent.glob("*.zip"):
+            if old != package.path and not old.with_suffix(".lock").exists():
+                old.unlink(missing_ok=True)
+
+
+# Создаем глобальный экземпляр сборщика
+field_package_builder = FieldPackageBuilder()
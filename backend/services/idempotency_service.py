@@ -0,0 +1,147 @@
+"""
+Хранилище ключей идемпотентности (заголовок Idempotency-Key)
+Первый запрос с ключом захватывает его (status=in_progress) и после выполнения сохраняет
+ответ. Повторы получают сохраненный ответ, параллельные повторы ждут завершения первого.
+
+Выполняющий запрос держит сессионную advisory-блокировку ключа на отдельном соединении
+(claim_key - unlock_key). Захват in_progress без результата перехватывается только под этой
+блокировкой, то есть после того, как соединение владельца закрыто (процесс упал):
+долгий запрос не выполняется повторно, сколько бы он ни длился.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+import structlog
+
+logger = structlog.get_logger()
+
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get("IDEMPOTENCY_TTL_HOURS", "24"))
+
+# Идентификатор advisory-блокировки ключа
+LOCK_ID_SQL = "hashtextextended(:scope || ' ' || :key, 0)"
+
+
+@dataclass
+class StoredRequest:
+    fingerprint: str
+    status: str  # in_progress, completed
+    response_status: Optional[int] = None
+    response_content_type: Optional[str] = None
+    response_headers: Optional[List[Tuple[str, str]]] = None
+    response_body: Optional[bytes] = None
+
+
+def claim_key(connection: Connection, scope: str, key: str, fingerprint: str) -> bool:
+    """
+    Захват ключа для выполнения запроса. True - запрос выполняет вызывающий, соединение
+    держит блокировку ключа до unlock_key (или до закрытия соединения);
+    False - ключ уже занят (результат или выполнение в другом запросе)
+    """
+    locked = connection.execute(
+        text(f"SELECT pg_try_advisory_lock({LOCK_ID_SQL})"), {"scope": scope, "key": key}
+    ).scalar()
+    connection.commit()
+    if not locked:
+        return False
+
+    # Под блокировкой in_progress означает, что владелец захвата завершился, не освободив ключ
+    row = connection.execute(
+        text("""
+            INSERT INTO idempotency_keys (scope, idempotency_key, fingerprint, status, created_at, expires_at)
+            VALUES (:scope, :key, :fingerprint, 'in_progress', now(), now() + make_interval(hours => :ttl_hours))
+            ON CONFLICT (scope, idempotency_key) DO UPDATE
+            SET fingerprint = EXCLUDED.fingerprint,
+                status = 'in_progress',
+                response_status = NULL,
+                response_content_type = NULL,
+                response_headers = NULL,
+                response_body = NULL,
+                created_at = now(),
+                expires_at = EXCLUDED.expires_at
+            WHERE idempotency_keys.expires_at < now()
+               OR idempotency_keys.status = 'in_progress'
+            RETURNING 1
+        """),
+        {"scope": scope, "key": key, "fingerprint": fingerprint, "ttl_hours": IDEMPOTENCY_TTL_HOURS}
+    ).first()
+    connection.commit()
+    if row is None:
+        unlock_key(connection, scope, key)
+        return False
+    return True
+
+
+def unlock_key(connection: Connection, scope: str, key: str) -> None:
+    """Снятие блокировки ключа (после complete_key или release_key)"""
+    connection.execute(text(f"SELECT pg_advisory_unlock({LOCK_ID_SQL})"), {"scope": scope, "key": key})
+    connection.commit()
+
+
+def get_stored_request(db: Session, scope: str, key: str) -> Optional[StoredRequest]:
+    """Сохраненный запрос по ключу (None - ключа нет или он освобожден)"""
+    row = db.execute(
+        text("""
+            SELECT fingerprint, status, response_status, response_content_type, response_headers, response_body
+            FROM idempotency_keys
+            WHERE scope = :scope AND idempotency_key = :key AND expires_at >= now()
+        """),
+        {"scope": scope, "key": key}
+    ).first()
+    db.commit()
+    if row is None:
+        return None
+    return StoredRequest(
+        fingerprint=row.fingerprint,
+        status=row.status,
+        response_status=row.response_status,
+        response_content_type=row.response_content_type,
+        response_headers=[tuple(header) for header in row.response_headers] if row.response_headers is not None else None,
+        response_body=bytes(row.response_body) if row.response_body is not None else None
+    )
+
+
+def complete_key(
+    db: Session, scope: str, key: str, status_code: int, content_type: Optional[str],
+    headers: List[Tuple[str, str]], body: bytes
+) -> None:
+    """Сохранение ответа выполненного запроса"""
+    db.execute(
+        text("""
+            UPDATE idempotency_keys
+            SET status = 'completed', response_status = :status_code,
+                response_content_type = :content_type, response_headers = CAST(:headers AS jsonb),
+                response_body = :body
+            WHERE scope = :scope AND idempotency_key = :key
+        """),
+        {
+            "scope": scope,
+            "key": key,
+            "status_code": status_code,
+            "content_type": content_type,
+            "headers": json.dumps(headers),
+            "body": body,
+        }
+    )
+    db.commit()
+
+
+def release_key(db: Session, scope: str, key: str) -> None:
+    """Освобождение ключа после сбоя: повтор запроса выполнится заново"""
+    db.execute(
+        text("DELETE FROM idempotency_keys WHERE scope = :scope AND idempotency_key = :key AND status = 'in_progress'"),
+        {"scope": scope, "key": key}
+    )
+    db.commit()
+
+
+def purge_expired_keys(db: Session) -> int:
+    """Удаление ключей с истекшим сроком хранения"""
+    deleted = db.execute(text("DELETE FROM idempotency_keys WHERE expires_at < now()")).rowcount
+    db.commit()
+    logger.info("Idempotency keys purged", deleted=deleted)
+    return deleted
@@ -0,0 +1,172 @@
+"""
+Конвейер производных изображений (пережатие и миниатюры)
+Фото с телефонов (4-8 МБ) после загрузки обрабатываются в пуле процессов: поворот по EXIF,
+уменьшение до PHOTO_MAX_DIMENSION с качеством PHOTO_JPEG_QUALITY и две миниатюры.
+Производные кэшируются на диске (root/derivatives/<вариант>/<ab>/<sha256>.jpg) и отдаются
+вместо оригиналов в списках и сетках; оригинал остается архивной копией.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+from services.photo_storage import PHOTO_STORAGE_DIR, photo_storage
+import structlog
+
+logger = structlog.get_logger()
+
+PHOTO_MAX_DIMENSION = int(os.environ.get("PHOTO_MAX_DIMENSION", "2048"))
+PHOTO_JPEG_QUALITY = int(os.environ.get("PHOTO_JPEG_QUALITY", "82"))
+PHOTO_THUMB_LARGE = int(os.environ.get("PHOTO_THUMB_LARGE", "512"))
+PHOTO_THUMB_SMALL = int(os.environ.get("PHOTO_THUMB_SMALL", "128"))
+PHOTO_PIPELINE_WORKERS = int(os.environ.get("PHOTO_PIPELINE_WORKERS", str(max((os.cpu_count() or 2) // 2, 1))))
+# Фото, которое PIL не распознал, не отправляется в пул повторно это время; записей не больше
+PHOTO_NOT_IMAGE_TTL_SECONDS = int(os.environ.get("PHOTO_NOT_IMAGE_TTL_SECONDS", "3600"))
+PHOTO_NOT_IMAGE_CACHE_SIZE = int(os.environ.get("PHOTO_NOT_IMAGE_CACHE_SIZE", "10000"))
+
+
+@dataclass(frozen=True)
+class Variant:
+    name: str
+    max_dimension: int
+    quality: int
+
+    @property
+    def key(self) -> str:
+        """Ключ кэша: смена настроек дает новые производные, а не устаревшие из кэша"""
+        return f"{self.name}_{self.max_dimension}_q{self.quality}"
+
+
+VARIANTS: Dict[str, Variant] = {
+    variant.name: variant for variant in (
+        Variant("display", PHOTO_MAX_DIMENSION, PHOTO_JPEG_QUALITY),
+        Variant("thumb_large", PHOTO_THUMB_LARGE, 75),
+        Variant("thumb_small", PHOTO_THUMB_SMALL, 70),
+    )
+}
+
+
+def render_derivatives(source: str, targets: Dict[str, tuple]) -> Dict[str, int]:
+    """
+    Выполняется в процессе пула. targets: {variant: (path, max_dimension, quality)}.
+    Возвращает размеры созданных файлов. Исключение - если исходник не изображение.
+    """
+    from PIL import Image, ImageOps
+
+    sizes: Dict[str, int] = {}
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        # От крупного к мелкому: каждая миниатюра строится из предыдущего результата
+        for name, (target, max_dimension, quality) in sorted(targets.items(), key=lambda item: -item[1][1]):
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+            target_path = Path(target)
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = target_path.with_suffix(f".{os.getpid()}.tmp")
+            image.save(tmp_path, "JPEG", quality=quality, optimize=True, progressive=True)
+            os.replace(tmp_path, target_path)
+            sizes[name] = target_path.stat().st_size
+    return sizes
+
+
+class ImagePipeline:
+    """Построение и кэш производных изображений"""
+
+    def __init__(self, root: str = PHOTO_STORAGE_DIR, workers: int = PHOTO_PIPELINE_WORKERS):
+        self.root = Path(root) / "derivatives"
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        # Не распознанные PIL: photo_id -> время отметки (повторно в пул не отправляются до истечения TTL)
+        self._not_images: "OrderedDict[str, float]" = OrderedDict()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def path_for(self, photo_id: str, variant: str) -> Path:
+        spec = VARIANTS[variant]
+        photo_storage.path_for(photo_id)  # Проверка формата ID
+        return self.root / spec.key / photo_id[:2] / f"{photo_id}.jpg"
+
+    async def build(self, photo_id: str) -> bool:
+        """Построение недостающих производных фото. False - исходник не изображение"""
+        targets = {
+            name: (str(self.path_for(photo_id, name)), spec.max_dimension, spec.quality)
+            for name, spec in VARIANTS.items()
+            if not self.path_for(photo_id, name).exists()
+        }
+        if not targets:
+            return True
+        if self._is_not_image(photo_id):
+            return False
+
+        # Параллельные запросы одного фото ждут одну задачу
+        future = self._in_flight.get(photo_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self.executor, render_derivatives, str(photo_storage.path_for(photo_id)), targets
+            )
+            self._in_flight[photo_id] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(photo_id, None))
+
+        try:
+            sizes = await future
+        except Exception as e:
+            from PIL import UnidentifiedImageError
+
+            # Сбой пула, нехватка памяти или диска - временные: следующий запрос попробует снова
+            if isinstance(e, UnidentifiedImageError):
+                self._mark_not_image(photo_id)
+            logger.warning(
+                "Photo derivatives failed", photo_id=photo_id, error=str(e),
+                not_image=isinstance(e, UnidentifiedImageError)
+            )
+            return False
+
+        logger.info("Photo derivatives built", photo_id=photo_id, sizes=sizes)
+        return True
+
+    def _is_not_image(self, photo_id: str) -> bool:
+        marked_at = self._not_images.get(photo_id)
+        if marked_at is None:
+            return False
+        if time.monotonic() - marked_at >= PHOTO_NOT_IMAGE_TTL_SECONDS:
+            del self._not_images[photo_id]
+            return False
+        return True
+
+    def _mark_not_image(self, photo_id: str) -> None:
+        self._not_images[photo_id] = time.monotonic()
+        self._not_images.move_to_end(photo_id)
+        while len(self._not_images) > PHOTO_NOT_IMAGE_CACHE_SIZE:
+            self._not_images.popitem(last=False)
+
+    async def build_many(self, photo_ids: Iterable[str]) -> None:
+        """Фоновая обработка после загрузки"""
+        await asyncio.gather(*(self.build(photo_id) for photo_id in set(photo_ids)))
+
+    async def get_variant(self, photo_id: str, variant: str) -> Optional[Path]:
+        """Путь к производной (строится по требованию); None - отдавать оригинал"""
+        path = self.path_for(photo_id, variant)
+        if path.exists() or await self.build(photo_id):
+            return path if path.exists() else None
+        return None
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Создаем глобальный экземпляр конвейера
+image_pipeline = ImagePipeline()
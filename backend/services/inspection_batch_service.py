@@ -0,0 +1,256 @@
+"""
+Пакетная запись осмотров (UnifiedInspectionBatchCreate)
+Каждый тип осмотра пишется одним INSERT ... SELECT FROM jsonb_to_recordset ... ON CONFLICT
+(element_id, cycle_id) DO UPDATE в одной транзакции на запрос. Элементы проверяются
+по отдельности, результат возвращается поэлементно. Если набор строк отклонен БД
+(например, несуществующий элемент), тип переписывается построчно в точках сохранения,
+чтобы ошибочные строки не откатывали остальные. Осмотры замороженных циклов отклоняются.
+Фото, переданное в photos (base64), не пишется в bytea: оно сохраняется в хранилище
+(services/photo_storage.py) и связывается с проектом, осмотр получает его photo_id.
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from core.inspection_types import INSPECTION_TYPES, InspectionType, CONFLICT_COLUMNS, PHOTO_COLUMN
+from core.schemas import UnifiedInspectionBatchCreate, InvalidBatchItem, InspectionBatchItemResult, InspectionBatchResult
+from services.cycle_snapshot_service import lock_cycles_for_write
+from services.photo_storage import photo_storage, find_known_photos, change_photo_refs, register_photo, StoredPhoto
+import structlog
+
+logger = structlog.get_logger()
+
+# Колонки, которые не затираются пустым значением при повторной отправке осмотра
+KEEP_EXISTING_COLUMNS = ("photo_id",)
+
+
+@dataclass
+class PreparedBatch:
+    """Проверенный пакет: строки для записи по типам и результаты по элементам"""
+    results: List[InspectionBatchItemResult] = field(default_factory=list)
+    rows: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)  # Ключ строки "idx" - номер в results
+    previous_photos: Dict[int, Optional[str]] = field(default_factory=dict)  # idx -> photo_id до обновления
+    inline_photos: Dict[int, bytes] = field(default_factory=dict)  # idx -> фото из photos (без photo_id)
+
+    def fail(self, idx: int, error: str) -> None:
+        self.results[idx].status = "error"
+        self.results[idx].error = error
+
+    def to_response(self) -> InspectionBatchResult:
+        statuses = [item.status for item in self.results]
+        return InspectionBatchResult(
+            created=statuses.count("created"),
+            updated=statuses.count("updated"),
+            failed=statuses.count("error"),
+            items=self.results
+        )
+
+
+def _db_message(error: DBAPIError) -> str:
+    return str(error.orig).strip().splitlines()[0] if error.orig is not None else str(error)
+
+
+def prepare_batch(payload: UnifiedInspectionBatchCreate) -> PreparedBatch:
+    """
+    Строки для записи из проверенного пакета (схемы *InspectionBatchItem; непрошедшие
+    проверку элементы - InvalidBatchItem). Повтор (element_id, cycle_id) внутри пакета:
+    записывается последний, предыдущие получают статус duplicate.
+    """
+    batch = PreparedBatch()
+    for key, inspection_type in INSPECTION_TYPES.items():
+        columns = inspection_type.write_columns()
+        latest: Dict[tuple, Dict[str, Any]] = {}
+        for index, item in enumerate(getattr(payload, key)):
+            idx = len(batch.results)
+            if isinstance(item, InvalidBatchItem):
+                batch.results.append(InspectionBatchItemResult(
+                    type=key, index=index, element_id=item.raw_int("element_id"), status="error", error=item.error
+                ))
+                continue
+            batch.results.append(InspectionBatchItemResult(
+                type=key, index=index, element_id=item.element_id, status="error"
+            ))
+
+            row = {"idx": idx, **{name: getattr(item, name) for name in columns}}
+            if row.get("photo_id"):
+                row["photo_id"] = row["photo_id"].lower()
+                batch.results[idx].photo_id = row["photo_id"]
+            elif getattr(item, PHOTO_COLUMN, None):
+                batch.inline_photos[idx] = getattr(item, PHOTO_COLUMN)
+
+            conflict_key = tuple(row[name] for name in CONFLICT_COLUMNS)
+            replaced = latest.get(conflict_key)
+            if replaced is not None:
+                batch.results[replaced["idx"]].status = "duplicate"
+            latest[conflict_key] = row
+            batch.results[idx].status = "created"  # Уточняется после записи
+
+        batch.rows[key] = list(latest.values())
+    return batch
+
+
+def _upsert_statement(inspection_type: InspectionType):
+    columns = inspection_type.write_columns()
+    record_definition = ", ".join(["idx integer"] + [f"{name} {sql_type}" for name, sql_type in columns.items()])
+    assignments = ", ".join(
+        f"{name} = COALESCE(EXCLUDED.{name}, t.{name})" if name in KEEP_EXISTING_COLUMNS else f"{name} = EXCLUDED.{name}"
+        for name in columns if name not in CONFLICT_COLUMNS
+    )
+    conflict = ", ".join(CONFLICT_COLUMNS)
+    join_condition = " AND ".join(f"t.{name} = i.{name}" for name in CONFLICT_COLUMNS)
+
+    # previous читает снимок до вставки - замененный photo_id нужен для счетчиков ссылок.
+    # Строки вставляются в порядке ключа, чтобы параллельные пакеты не взаимоблокировались
+    return text(f"""
+        WITH input AS (
+            SELECT * FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS r({record_definition})
+        ),
+        previous AS (
+            SELECT t.element_id, t.cycle_id, t.photo_id
+            FROM {inspection_type.table} t
+            JOIN input i ON {join_condition}
+        ),
+        upserted AS (
+            INSERT INTO {inspection_type.table} AS t ({", ".join(columns)})
+            SELECT {", ".join(columns)} FROM input ORDER BY {conflict}
+            ON CONFLICT ({conflict}) DO UPDATE SET {assignments}
+            RETURNING t.inspect_id, t.element_id, t.cycle_id, (t.xmax = 0) AS inserted
+        )
+        SELECT i.idx, u.inspect_id, u.inserted, p.photo_id AS previous_photo_id
+        FROM upserted u
+        JOIN input i USING ({conflict})
+        LEFT JOIN previous p USING ({conflict})
+    """)
+
+
+def _apply_rows(batch: PreparedBatch, rows) -> None:
+    for row in rows:
+        result = batch.results[row.idx]
+        result.status = "created" if row.inserted else "updated"
+        result.inspect_id = row.inspect_id
+        batch.previous_photos[row.idx] = row.previous_photo_id
+
+
+def write_inspections(db: Session, batch: PreparedBatch) -> None:
+    """
+    Запись проверенного пакета в БД проекта (без коммита).
+    Один запрос на тип; при отказе БД - построчно, каждая строка в своей точке сохранения.
+    Циклы пакета блокируются от заморозки до конца транзакции; осмотры замороженных циклов
+    отклоняются (снимок цикла не видит изменений таблиц)
+    """
+    pending = [
+        row for rows in batch.rows.values() for row in rows
+        if batch.results[row["idx"]].status != "error" and row.get("cycle_id") is not None
+    ]
+    frozen = set(lock_cycles_for_write(db, [row["cycle_id"] for row in pending]))
+    for row in pending:
+        if row["cycle_id"] in frozen:
+            batch.fail(row["idx"], f"Цикл {row['cycle_id']} заморожен, осмотры цикла не изменяются")
+
+    for key, rows in batch.rows.items():
+        rows = [row for row in rows if batch.results[row["idx"]].status != "error"]
+        if not rows:
+            continue
+
+        statement = _upsert_statement(INSPECTION_TYPES[key])
+        try:
+            with db.begin_nested():
+                _apply_rows(batch, db.execute(statement, {"rows": json.dumps(rows)}).all())
+            continue
+        except DBAPIError as e:
+            logger.warning("Inspection batch fell back to row-by-row", type=key, rows=len(rows), error=_db_message(e))
+
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    _apply_rows(batch, db.execute(statement, {"rows": json.dumps([row])}).all())
+            except DBAPIError as e:
+                batch.fail(row["idx"], _db_message(e))
+
+
+def store_inline_photos(central_db: Session, project_id: int, batch: PreparedBatch) -> List[str]:
+    """
+    Перенос фото из photos в хранилище: метаданные и связь с проектом (коммит центральной БД),
+    затем файлы. Строка осмотра получает photo_id; не изображение - ошибка элемента.
+    Возвращает photo_id сохраненных фото
+    """
+    received: Dict[int, StoredPhoto] = {}
+    try:
+        for rows in batch.rows.values():
+            for row in rows:
+                data = batch.inline_photos.get(row["idx"])
+                if data is None or batch.results[row["idx"]].status == "error":
+                    continue
+                try:
+                    photo = photo_storage.receive_bytes(data)
+                except HTTPException as e:
+                    batch.fail(row["idx"], e.detail)
+                    continue
+                received[row["idx"]] = photo
+                register_photo(central_db, project_id, photo)
+        central_db.commit()
+        for photo in received.values():
+            photo_storage.finalize(photo)
+    finally:
+        for photo in received.values():
+            photo_storage.discard(photo)
+
+    for rows in batch.rows.values():
+        for row in rows:
+            photo = received.get(row["idx"])
+            if photo is not None:
+                row["photo_id"] = photo.photo_id
+                batch.results[row["idx"]].photo_id = photo.photo_id
+    return sorted({photo.photo_id for photo in received.values()})
+
+
+def ingest_batch(
+    db: Session, central_db: Session, project_id: int, payload: UnifiedInspectionBatchCreate
+) -> InspectionBatchResult:
+    """
+    Пакетная запись осмотров: одна транзакция БД проекта на запрос.
+    Ссылки на фото (центральная БД) захватываются до записи и отпускаются после коммита:
+    при сбое между базами счетчик может остаться завышенным, но не заниженным.
+    Ссылаться можно только на фото, загруженные в этот проект; фото из photos
+    сохраняется в хранилище до записи осмотров (store_inline_photos)
+    """
+    batch = prepare_batch(payload)
+    store_inline_photos(central_db, project_id, batch)
+
+    photo_rows = [
+        row for rows in batch.rows.values() for row in rows
+        if row.get("photo_id") and batch.results[row["idx"]].status != "error"
+    ]
+    known = find_known_photos(central_db, project_id, (row["photo_id"] for row in photo_rows))
+    for row in photo_rows:
+        if row["photo_id"] not in known:
+            batch.fail(row["idx"], f"Фото {row['photo_id']} не загружено")
+
+    acquired = {
+        row["idx"]: row["photo_id"] for row in photo_rows
+        if batch.results[row["idx"]].status != "error"
+    }
+    change_photo_refs(central_db, acquired=acquired.values())
+    central_db.commit()
+
+    try:
+        write_inspections(db, batch)
+        db.commit()
+    except Exception:
+        db.rollback()
+        change_photo_refs(central_db, released=acquired.values())
+        central_db.commit()
+        raise
+
+    released = [
+        batch.previous_photos.get(idx) if batch.results[idx].status == "updated" else None
+        for idx in acquired
+    ] + [photo_id for idx, photo_id in acquired.items() if batch.results[idx].status == "error"]
+    change_photo_refs(central_db, released=released)
+    central_db.commit()
+
+    return batch.to_response()
@@ -0,0 +1,170 @@
+"""
+Сравнение осмотров между циклами
+Чеклист каждого элемента в цикле N сравнивается с циклом-базой (по умолчанию предыдущий
+цикл с осмотрами этого типа) за один проход: оконные функции lag/lead по cycle_id в
+разрезе element_id. Измененные поля и ухудшения вычисляются в SQL, фильтры применяются
+там же - клиенту потоком (NDJSON) уходят только подходящие элементы.
+
+Шкалы чеклиста 0-5: 0 - замечаний нет (значение по умолчанию), больше - хуже.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from sqlalchemy import text
+from sqlalchemy.orm import Session, sessionmaker
+from core.inspection_types import InspectionType
+from services.inspection_stream_service import ndjson_record, stream_query
+import structlog
+
+logger = structlog.get_logger()
+
+DIFF_STATUSES = ("changed", "unchanged", "new", "missing")
+# Поля, сравниваемые кроме чеклиста (по запросу)
+EXTRA_DIFF_FIELDS = ("state_id", "note", "photo_id")
+
+
+def diff_fields(inspection_type: InspectionType) -> List[str]:
+    """Поля, доступные для сравнения: чеклист (включая inspectresult) и служебные"""
+    return [*inspection_type.checklist_fields, *EXTRA_DIFF_FIELDS]
+
+
+def default_diff_fields(inspection_type: InspectionType) -> List[str]:
+    return [*inspection_type.checklist_fields, "state_id"]
+
+
+def scored_fields(inspection_type: InspectionType) -> List[str]:
+    """Поля со шкалой 0-5, для которых определено ухудшение"""
+    return list(inspection_type.checklist_fields)
+
+
+def get_previous_cycle(db: Session, inspection_type: InspectionType, cycle_id: int) -> Optional[int]:
+    """Ближайший предыдущий цикл с осмотрами этого типа (по сводке, без чтения таблицы осмотров)"""
+    return db.execute(
+        text("""
+            SELECT max(cycle_id) FROM inspection_summary
+            WHERE inspection_type = :inspection_type AND cycle_id < :cycle_id AND inspected > 0
+        """),
+        {"inspection_type": inspection_type.key, "cycle_id": cycle_id}
+    ).scalar()
+
+
+def _diff_query(
+    inspection_type: InspectionType,
+    fields: Sequence[str],
+    worse: Sequence[str],
+    statuses: Sequence[str]
+) -> str:
+    """
+    Один проход по двум циклам: строки цикла N получают значения базы через lag,
+    строки базы без пары в цикле N (lead пуст) - элементы, не осмотренные в цикле N
+    """
+    lag_columns = ", ".join(f"lag({field}) OVER w AS prev_{field}" for field in fields)
+    changed = ", ".join(
+        f"CASE WHEN {field} IS DISTINCT FROM prev_{field} THEN '{field}' END" for field in fields
+    )
+    # Ухудшение - рост оценки; сравнение с NULL дает NULL, такие поля не считаются
+    worsened = ", ".join(
+        f"CASE WHEN {field} > prev_{field} THEN '{field}' END" for field in worse
+    ) or "NULL"
+
+    conditions = []
+    if "changed" in statuses:
+        conditions.append("(status = 'paired' AND cardinality(changed) > 0)")
+    if "unchanged" in statuses:
+        conditions.append("(status = 'paired' AND cardinality(changed) = 0)")
+    if "new" in statuses:
+        conditions.append("status = 'new'")
+    if "missing" in statuses:
+        conditions.append("status = 'missing'")
+    where = " OR ".join(conditions)
+    if worse:
+        where = f"({where}) AND cardinality(worse) > 0"
+
+    return f"""
+        WITH pairs AS (
+            SELECT element_id, cycle_id, inspect_id, {', '.join(fields)},
+                   lag(cycle_id) OVER w AS prev_cycle_id,
+                   lag(inspect_id) OVER w AS prev_inspect_id,
+                   lead(cycle_id) OVER w AS next_cycle_id,
+                   {lag_columns}
+            FROM {inspection_type.table}
+            WHERE cycle_id IN (:base_cycle_id, :cycle_id)
+            WINDOW w AS (PARTITION BY element_id ORDER BY cycle_id)
+        ),
+        diff AS (
+            SELECT *,
+                   CASE
+                       WHEN cycle_id = :base_cycle_id THEN 'missing'
+                       WHEN prev_cycle_id IS NULL THEN 'new'
+                       ELSE 'paired'
+                   END AS status,
+                   array_remove(ARRAY[{changed}]::text[], NULL) AS changed,
+                   array_remove(ARRAY[{worsened}]::text[], NULL) AS worse
+            FROM pairs
+            WHERE cycle_id = :cycle_id OR next_cycle_id IS NULL
+        )
+        SELECT * FROM diff
+        WHERE {where}
+        ORDER BY element_id
+    """
+
+
+def _diff_record(row: Dict[str, Any]) -> Dict[str, Any]:
+    status = row["status"]
+    if status == "missing":
+        return {
+            "element_id": row["element_id"],
+            "status": status,
+            "inspect_id": None,
+            "previous_inspect_id": row["inspect_id"],
+            "changes": {},
+            "worse": [],
+        }
+    if status == "paired":
+        status = "changed" if row["changed"] else "unchanged"
+    return {
+        "element_id": row["element_id"],
+        "status": status,
+        "inspect_id": row["inspect_id"],
+        "previous_inspect_id": row["prev_inspect_id"],
+        "changes": {field: [row[f"prev_{field}"], row[field]] for field in row["changed"]} if status == "changed" else {},
+        "worse": row["worse"],
+    }
+
+
+def iter_cycle_diff(
+    factory: sessionmaker,
+    inspection_type: InspectionType,
+    cycle_id: int,
+    base_cycle_id: int,
+    fields: Sequence[str],
+    worse: Sequence[str] = (),
+    statuses: Sequence[str] = ("changed",)
+) -> Iterator[bytes]:
+    """
+    Генератор NDJSON: запись diff_info, записи element (element_id, status, changes -
+    {поле: [было, стало]}, worse - ухудшившиеся поля), запись end со счетчиками по статусам
+    """
+    counts = {status: 0 for status in DIFF_STATUSES}
+    db = factory()
+    try:
+        yield ndjson_record("diff_info", {
+            "type": inspection_type.key,
+            "cycle_id": cycle_id,
+            "base_cycle_id": base_cycle_id,
+            "fields": list(fields),
+            "worse": list(worse),
+        })
+
+        query = _diff_query(inspection_type, fields, worse, statuses)
+        for rows in stream_query(db, query, {"cycle_id": cycle_id, "base_cycle_id": base_cycle_id}):
+            records = [_diff_record(row) for row in rows]
+            for record in records:
+                counts[record["status"]] += 1
+            yield b"".join(ndjson_record("element", record) for record in records)
+
+        yield ndjson_record("end", counts)
+    except Exception as e:
+        logger.error("Inspection diff failed", type=inspection_type.key, cycle_id=cycle_id, error=str(e))
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,52 @@
+"""
+История осмотров элемента по циклам
+Колонки истории совпадают с покрывающим индексом uq_<таблица>_element_cycle
+(db/project/005_inspection_history_covering.sql), поэтому каждая таблица читается
+index-only scan. Все типы - один запрос, JSON собирается в PostgreSQL.
+Замороженные циклы дополняются из снимков (services/cycle_snapshot_service.py).
+"""
+
+from typing import Any, Dict, List, Sequence
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from core.inspection_types import INSPECTION_TYPES, InspectionType
+from services.cycle_snapshot_service import CycleSnapshot, snapshot_history
+
+
+def history_columns(inspection_type: InspectionType) -> List[str]:
+    """Колонки истории: ключ и INCLUDE покрывающего индекса (без заметок и фото)"""
+    return ["cycle_id", "inspect_id", *inspection_type.checklist_fields, "state_id"]
+
+
+def get_element_history(
+    db: Session,
+    element_id: int,
+    types: Sequence[str] = (),
+    snapshots: Sequence[CycleSnapshot] = ()
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    История по типам осмотров (типы без осмотров элемента не возвращаются).
+    Замороженные циклы (snapshots) читаются из снимков бинарным поиском по element_id
+    """
+    selected = [INSPECTION_TYPES[key] for key in (types or INSPECTION_TYPES)]
+    subqueries = ",\n".join(
+        f"""(SELECT json_agg(history_row ORDER BY history_row.cycle_id) FROM (
+                SELECT {', '.join(history_columns(inspection_type))}
+                FROM {inspection_type.table}
+                WHERE element_id = :element_id AND cycle_id <> ALL(CAST(:frozen_cycles AS integer[]))
+            ) history_row) AS {inspection_type.key}"""
+        for inspection_type in selected
+    )
+    row = db.execute(
+        text(f"SELECT {subqueries}"),
+        {"element_id": element_id, "frozen_cycles": [snapshot.cycle_id for snapshot in snapshots]}
+    ).mappings().one()
+    history = {key: rows for key, rows in row.items() if rows}
+
+    frozen = snapshot_history(
+        snapshots, element_id,
+        {inspection_type.key: history_columns(inspection_type) for inspection_type in selected}
+    )
+    for key, rows in frozen.items():
+        history[key] = sorted([*history.get(key, []), *rows], key=lambda item: item["cycle_id"])
+    return history
@@ -0,0 +1,124 @@
+"""
+Потоковая выдача осмотров цикла (NDJSON)
+Вариант UnifiedInspectionResponse без сборки списков в памяти: строки читаются
+серверным курсором порциями по STREAM_CHUNK_ROWS и сразу отдаются клиенту.
+Каждая строка ответа - JSON-запись {"type": ..., "data": ...}; порядок:
+metadata, states, dm, ts, rp, tss, ggs, tsg, end (end - признак полного ответа).
+Осмотры элементов исключенных позиций проекта не выдаются.
+"""
+
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Set
+from sqlalchemy import text
+from sqlalchemy.orm import Session, sessionmaker
+from core.database import SessionLocal
+from core.inspection_types import INSPECTION_TYPES, PHOTO_COLUMN, PhotoMode
+from services.photo_storage import describe_photos
+from services.project_metadata_service import excluded_elements_condition
+from utils.position_set import PositionIdSet
+from utils.serialization import dumps, row_plan
+import structlog
+
+if TYPE_CHECKING:
+    from services.cycle_snapshot_service import CycleSnapshot
+
+logger = structlog.get_logger()
+
+STREAM_CHUNK_ROWS = 1000
+STATES_TABLE = "states"
+
+
+def ndjson_record(record_type: str, data: Any) -> bytes:
+    return dumps({"type": record_type, "data": data}) + b"\n"
+
+
+def stream_query(db: Session, query: str, params: Dict[str, Any]) -> Iterator[List[dict]]:
+    """Порции строк из серверного курсора (память ограничена размером порции)"""
+    result = db.execute(
+        text(query).execution_options(stream_results=True, yield_per=STREAM_CHUNK_ROWS),
+        params
+    ).mappings()
+    for partition in result.partitions(STREAM_CHUNK_ROWS):
+        yield [dict(row) for row in partition]
+
+
+def excluded_element_ids(db: Session, excluded: PositionIdSet) -> Set[int]:
+    """Элементы исключенных позиций (фильтр строк снимка, где соединения с elements нет)"""
+    if not excluded:
+        return set()
+    return set(db.execute(
+        text("SELECT id FROM elements WHERE CAST(:excluded_positions AS int8multirange) @> CAST(position_id AS bigint)"),
+        {"excluded_positions": excluded.to_multirange()}
+    ).scalars())
+
+
+def iter_cycle_inspections(
+    factory: sessionmaker,
+    project_id: int,
+    cycle_id: int,
+    metadata: Dict[str, Any],
+    photo_mode: PhotoMode = "descriptor",
+    snapshot: Optional["CycleSnapshot"] = None,
+    excluded: PositionIdSet = PositionIdSet()
+) -> Iterator[bytes]:
+    """
+    Генератор NDJSON. Сессии открываются внутри генератора: зависимости запроса
+    закрываются до окончания потоковой выдачи. Осмотры замороженного цикла читаются из снимка,
+    осмотры исключенных позиций (excluded) пропускаются
+    """
+    counts: Dict[str, int] = {}
+    db = factory()
+    central_db: Optional[Session] = None
+    try:
+        yield ndjson_record("metadata", metadata)
+
+        has_states = db.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": STATES_TABLE}).scalar()
+        if has_states:
+            counts["states"] = 0
+            for rows in stream_query(db, f"SELECT * FROM {STATES_TABLE}", {}):
+                counts["states"] += len(rows)
+                yield b"".join(ndjson_record("states", row) for row in rows)
+
+        if photo_mode == "descriptor":
+            central_db = SessionLocal()
+        skipped_elements = excluded_element_ids(db, excluded) if snapshot is not None else set()
+
+        for key, inspection_type in INSPECTION_TYPES.items():
+            columns = inspection_type.response_columns(include_photos=photo_mode == "inline")
+            # Строка выдается по схеме ответа; в режиме descriptor байт фото в выдаче нет
+            plan = row_plan(inspection_type.response_schema, () if photo_mode == "inline" else (PHOTO_COLUMN,))
+            counts[key] = 0
+            if snapshot is not None:
+                chunks = snapshot.iter_rows(inspection_type.table, columns)
+            else:
+                params: Dict[str, Any] = {"cycle_id": cycle_id}
+                condition = excluded_elements_condition(excluded, "element_id", params)
+                chunks = stream_query(
+                    db,
+                    f"SELECT {', '.join(columns)} FROM {inspection_type.table} "
+                    f"WHERE cycle_id = :cycle_id AND {condition} ORDER BY element_id",
+                    params
+                )
+            for rows in chunks:
+                if skipped_elements:
+                    rows = [row for row in rows if row["element_id"] not in skipped_elements]
+                    if not rows:
+                        continue
+                if central_db is not None:
+                    descriptors = {
+                        photo_id: descriptor.model_dump(mode="json")
+                        for photo_id, descriptor in describe_photos(central_db, project_id, (row.get("photo_id") for row in rows)).items()
+                    }
+                    for row in rows:
+                        row["photo"] = descriptors.get(row["photo_id"]) if row.get("photo_id") else None
+                counts[key] += len(rows)
+                yield b"".join(ndjson_record(key, plan.to_dict(row)) for row in rows)
+
+        yield ndjson_record("end", counts)
+    except Exception as e:
+        # Заголовки уже отправлены - клиент поймет обрыв по отсутствию записи end
+        logger.error("Inspection stream failed", project_id=project_id, cycle_id=cycle_id, error=str(e))
+        raise
+    finally:
+        db.close()
+        if central_db is not None:
+            central_db.close()
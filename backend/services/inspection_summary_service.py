@@ -0,0 +1,66 @@
+"""
+Сводка осмотров по циклам для дашбордов
+Счетчики хранятся в таблице inspection_summary БД проекта и поддерживаются триггерами
+(db/project/004_inspection_summary.sql) при любой записи в таблицы осмотров,
+поэтому чтение сводки не агрегирует таблицы осмотров.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from core.inspection_types import INSPECTION_TYPES
+from core.schemas import InspectionSummaryItem, InspectionSummaryResponse
+from services.cycle_snapshot_service import CycleSnapshot, snapshot_summary_items
+
+
+def get_summary(
+    db: Session,
+    cycle_id: Optional[int] = None,
+    inspection_type: Optional[str] = None,
+    archived: Sequence[CycleSnapshot] = ()
+) -> InspectionSummaryResponse:
+    """
+    Сводка по циклам и типам осмотров (фильтры необязательны).
+    Строки архивированных циклов удалены из таблиц осмотров, их сводка считается по снимкам
+    """
+    rows = db.execute(
+        text("""
+            SELECT cycle_id, inspection_type, inspectresult, state_id, inspected
+            FROM inspection_summary
+            WHERE inspected > 0
+              AND (CAST(:cycle_id AS integer) IS NULL OR cycle_id = CAST(:cycle_id AS integer))
+              AND (CAST(:inspection_type AS text) IS NULL OR inspection_type = CAST(:inspection_type AS text))
+            ORDER BY cycle_id, inspection_type
+        """),
+        {"cycle_id": cycle_id, "inspection_type": inspection_type}
+    ).all()
+
+    items: Dict[Tuple[int, str], InspectionSummaryItem] = {}
+    for row in rows:
+        item = items.get((row.cycle_id, row.inspection_type))
+        if item is None:
+            item = items[(row.cycle_id, row.inspection_type)] = InspectionSummaryItem(
+                cycle_id=row.cycle_id, type=row.inspection_type, inspected=0
+            )
+        item.inspected += row.inspected
+        if row.inspectresult is not None:
+            item.by_result[row.inspectresult] = item.by_result.get(row.inspectresult, 0) + row.inspected
+        if row.state_id is not None:
+            item.by_state[row.state_id] = item.by_state.get(row.state_id, 0) + row.inspected
+
+    for snapshot in archived:
+        if cycle_id is None or snapshot.cycle_id == cycle_id:
+            for item in snapshot_summary_items(snapshot, inspection_type):
+                items[(item.cycle_id, item.type)] = item
+
+    # Типы в порядке реестра, как в UnifiedInspectionResponse
+    order = {key: index for index, key in enumerate(INSPECTION_TYPES)}
+    ordered: List[InspectionSummaryItem] = sorted(items.values(), key=lambda item: (item.cycle_id, order.get(item.type, len(order))))
+    return InspectionSummaryResponse(items=ordered)
+
+
+def rebuild_summary(db: Session) -> int:
+    """Полный пересчет сводки по таблицам осмотров (после ручных миграций данных). Возвращает число строк"""
+    rows_count = db.execute(text("SELECT rebuild_inspection_summary()")).scalar()
+    db.commit()
+    return rows_count
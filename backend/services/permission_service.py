@@ -0,0 +1,148 @@
+"""
+Матрица прав пользователей в проектах
+Роли пользователя во всех проектах загружаются одним запросом и хранятся в памяти процесса,
+проверка роли в проекте - поиск в словаре. Кэш пользователя сбрасывается при выдаче,
+изменении или отзыве прав (через события сессии SQLAlchemy).
+"""
+
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from core.database import SessionLocal
+from core.models import ProjectPermission
+from utils.ttl_cache import GenerationalTTLCache
+import structlog
+
+logger = structlog.get_logger()
+
+# Выданные или отозванные в другом воркере права вступают в силу не позже этого времени
+PERMISSION_MATRIX_TTL_SECONDS = int(os.environ.get("PERMISSION_MATRIX_TTL_SECONDS", "300"))
+
+
+class ProjectPermissionMatrix:
+    """In-process матрица user_id -> {project_id: role}"""
+
+    def __init__(self, ttl_seconds: int = PERMISSION_MATRIX_TTL_SECONDS):
+        self._roles: GenerationalTTLCache[int, Dict[int, str]] = GenerationalTTLCache(ttl_seconds)
+
+    def get_user_roles(self, db: Session, user_id: int) -> Dict[int, str]:
+        """Роли пользователя во всех проектах (загружаются один раз)"""
+        return self._roles.get_or_load(user_id, lambda: self._load_roles(db, user_id))
+
+    @staticmethod
+    def _load_roles(db: Session, user_id: int) -> Dict[int, str]:
+        rows = (
+            db.query(ProjectPermission.project_id, ProjectPermission.role)
+            .filter(ProjectPermission.user_id == user_id)
+            .all()
+        )
+        roles = {project_id: role for project_id, role in rows}
+        logger.debug("Permission matrix loaded", user_id=user_id, projects=len(roles))
+        return roles
+
+    def get_role(self, db: Session, user_id: int, project_id: int) -> Optional[str]:
+        """Роль пользователя в проекте или None, если прав нет"""
+        return self.get_user_roles(db, user_id).get(project_id)
+
+    def invalidate(self, user_ids: Optional[Iterable[int]] = None) -> None:
+        """Сброс кэша пользователей (None - сброс всей матрицы)"""
+        self._roles.invalidate(user_ids)
+
+
+# Создаем глобальный экземпляр матрицы
+permission_matrix = ProjectPermissionMatrix()
+
+
+# ==================== Массовая выдача и отзыв прав ====================
+
+_BULK_UPSERT_SQL = text("""
+    INSERT INTO project_permissions (user_id, project_id, role)
+    SELECT t.user_id, t.project_id, t.role
+    FROM unnest(
+        CAST(:user_ids AS integer[]),
+        CAST(:project_ids AS integer[]),
+        CAST(:roles AS varchar[])
+    ) AS t(user_id, project_id, role)
+    ON CONFLICT (user_id, project_id) DO UPDATE
+        SET role = EXCLUDED.role, updated_at = now()
+        WHERE project_permissions.role IS DISTINCT FROM EXCLUDED.role
+    RETURNING user_id, project_id, (xmax = 0) AS inserted
+""")
+
+_BULK_DELETE_SQL = text("""
+    DELETE FROM project_permissions
+    WHERE user_id = ANY(CAST(:user_ids AS integer[]))
+      AND project_id = ANY(CAST(:project_ids AS integer[]))
+    RETURNING user_id, project_id
+""")
+
+
+def bulk_upsert_permissions(
+    db: Session,
+    entries: Dict[Tuple[int, int], str]
+) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """
+    Выдача прав одним INSERT ... ON CONFLICT по массивам unnest.
+    entries: {(user_id, project_id): role}. Возвращает (created, updated, unchanged).
+    Коммит - на вызывающей стороне, матрица сбрасывается после него.
+    """
+    if not entries:
+        return [], [], []
+
+    keys = list(entries)
+    rows = db.execute(_BULK_UPSERT_SQL, {
+        "user_ids": [user_id for user_id, _ in keys],
+        "project_ids": [project_id for _, project_id in keys],
+        "roles": [entries[key] for key in keys],
+    }).all()
+
+    created = [(row.user_id, row.project_id) for row in rows if row.inserted]
+    updated = [(row.user_id, row.project_id) for row in rows if not row.inserted]
+    # Строки без изменения роли не попадают в RETURNING (условие WHERE в DO UPDATE)
+    touched = set(created) | set(updated)
+    unchanged = [key for key in keys if key not in touched]
+    _mark_pending(db, (user_id for user_id, _ in touched))
+    return created, updated, unchanged
+
+
+def bulk_delete_permissions(db: Session, user_ids: List[int], project_ids: List[int]) -> List[Tuple[int, int]]:
+    """Отзыв прав для всех пар пользователь x проект одним DELETE"""
+    if not user_ids or not project_ids:
+        return []
+
+    rows = db.execute(_BULK_DELETE_SQL, {"user_ids": user_ids, "project_ids": project_ids}).all()
+    deleted = [(row.user_id, row.project_id) for row in rows]
+    _mark_pending(db, (user_id for user_id, _ in deleted))
+    return deleted
+
+
+# ==================== Инвалидация через события сессии ====================
+
+_PENDING_KEY = "permission_matrix_pending_users"
+
+
+def _mark_pending(session: Session, user_ids: Iterable[int]) -> None:
+    """Изменения прав в обход ORM (текстовый SQL) тоже сбрасывают матрицу после коммита"""
+    session.info.setdefault(_PENDING_KEY, set()).update(user_ids)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_changed_permissions(session, flush_context):
+    """Запоминаем пользователей, чьи права изменились в текущей транзакции"""
+    pending: Set[int] = session.info.setdefault(_PENDING_KEY, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, ProjectPermission) and obj.user_id is not None:
+            pending.add(obj.user_id)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_committed_permissions(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        permission_matrix.invalidate(pending)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_pending_permissions(session):
+    session.info.pop(_PENDING_KEY, None)
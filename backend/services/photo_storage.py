@@ -0,0 +1,371 @@
+"""
+Хранилище фотографий осмотров
+Файлы принимаются потоком (кусками по PHOTO_CHUNK_SIZE), хешируются на лету и
+сохраняются по SHA-256 содержимого: root/<ab>/<sha256>. Память на запрос ограничена
+размером куска независимо от размера фото.
+
+Одинаковые фото (повторная отправка, то же фото в следующем цикле) хранятся один раз.
+Осмотры ссылаются на фото по хешу, photos.ref_count считает ссылки; фото без ссылок
+старше PHOTO_GC_GRACE_HOURS удаляются сборщиком мусора (manage.py photos-gc).
+Хранилище общее для всех проектов, доступ - по связи photo_projects: фото выдается и
+считается загруженным только в проектах, куда его загрузили.
+"""
+
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from core.schemas import PhotoDescriptor
+from utils.http_range import iter_file_range
+import structlog
+
+logger = structlog.get_logger()
+
+PHOTO_STORAGE_DIR = os.environ.get(
+    "PHOTO_STORAGE_DIR",
+    str(Path(__file__).parent.parent / "storage" / "photos")
+)
+PHOTO_CHUNK_SIZE = int(os.environ.get("PHOTO_CHUNK_SIZE", str(1024 * 1024)))  # 1 МБ
+PHOTO_MAX_SIZE = int(os.environ.get("PHOTO_MAX_SIZE", str(50 * 1024 * 1024)))  # 50 МБ
+# Загруженное фото без ссылок не удаляется это время (осмотр с ним может быть еще не отправлен)
+PHOTO_GC_GRACE_HOURS = int(os.environ.get("PHOTO_GC_GRACE_HOURS", "24"))
+
+# Допустимые форматы фото: MIME тип определяется по сигнатуре содержимого, Content-Type
+# клиента не сохраняется (иначе фото выдавалось бы, например, как text/html)
+PHOTO_SIGNATURE_SIZE = 16
+PHOTO_CONTENT_TYPES = ("image/jpeg", "image/png", "image/gif", "image/webp", "image/heic", "image/heif", "image/bmp", "image/tiff")
+HEIC_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis"}
+HEIF_BRANDS = {b"mif1", b"msf1"}
+
+
+def detect_image_type(head: bytes) -> Optional[str]:
+    """MIME тип изображения по первым байтам файла; None - не поддерживаемое изображение"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in HEIC_BRANDS:
+        return "image/heic"
+    if head[4:8] == b"ftyp" and head[8:12] in HEIF_BRANDS:
+        return "image/heif"
+    if head[:2] == b"BM":
+        return "image/bmp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "image/tiff"
+    return None
+
+
+def _check_received(size: int, head: bytes) -> str:
+    """Проверка принятого фото по размеру и сигнатуре, возвращает MIME тип"""
+    if size > PHOTO_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Размер фото превышает {PHOTO_MAX_SIZE // (1024 * 1024)} МБ"
+        )
+    if size == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Пустой файл фото"
+        )
+    content_type = detect_image_type(head)
+    if content_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Файл не является изображением (JPEG, PNG, GIF, WebP, HEIC/HEIF, BMP, TIFF)"
+        )
+    return content_type
+
+
+@dataclass
+class StoredPhoto:
+    photo_id: str  # SHA-256 содержимого (hex)
+    size: int
+    content_type: Optional[str] = None
+    tmp_path: Optional[Path] = None  # Принятый, но еще не перенесенный в хранилище файл
+
+
+class PhotoStorage:
+    """Файловое хранилище фотографий с адресацией по содержимому"""
+
+    def __init__(self, root: str = PHOTO_STORAGE_DIR):
+        self.root = Path(root)
+        self.tmp_dir = self.root / "tmp"
+
+    def path_for(self, photo_id: str) -> Path:
+        """Путь к файлу фото по SHA-256"""
+        if len(photo_id) != 64 or any(c not in "0123456789abcdef" for c in photo_id):
+            raise ValueError("Некорректный ID фото")
+        return self.root / photo_id[:2] / photo_id
+
+    def exists(self, photo_id: str) -> bool:
+        try:
+            return self.path_for(photo_id).is_file()
+        except ValueError:
+            return False
+
+    async def receive_stream(self, chunks: AsyncIterator[bytes]) -> StoredPhoto:
+        """
+        Прием потока байт во временный файл с хешированием на лету.
+        Тип фото определяется по сигнатуре содержимого, не изображение отклоняется (415).
+        Файл попадает в хранилище только через finalize() - после записи метаданных в БД.
+        """
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.tmp_dir / uuid.uuid4().hex
+        digest = hashlib.sha256()
+        head = b""
+        size = 0
+
+        try:
+            with open(tmp_path, "wb") as tmp_file:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    size += len(chunk)
+                    if size > PHOTO_MAX_SIZE:
+                        _check_received(size, head)
+                    if len(head) < PHOTO_SIGNATURE_SIZE:
+                        head += chunk[:PHOTO_SIGNATURE_SIZE - len(head)]
+                    digest.update(chunk)
+                    await run_in_threadpool(tmp_file.write, chunk)
+
+            content_type = _check_received(size, head)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        return StoredPhoto(photo_id=digest.hexdigest(), size=size, content_type=content_type, tmp_path=tmp_path)
+
+    def receive_bytes(self, data: bytes) -> StoredPhoto:
+        """
+        Прием фото, уже находящегося в памяти (base64 photos в пакете осмотров),
+        с теми же проверками, что и receive_stream. Сохраняется так же через finalize()
+        """
+        content_type = _check_received(len(data), data[:PHOTO_SIGNATURE_SIZE])
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.tmp_dir / uuid.uuid4().hex
+        try:
+            tmp_path.write_bytes(data)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return StoredPhoto(
+            photo_id=hashlib.sha256(data).hexdigest(), size=len(data), content_type=content_type, tmp_path=tmp_path
+        )
+
+    async def receive_upload(self, upload: UploadFile) -> StoredPhoto:
+        """Прием файла из multipart-запроса (Starlette уже держит его во временном файле)"""
+        async def chunks():
+            while True:
+                chunk = await upload.read(PHOTO_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+        return await self.receive_stream(chunks())
+
+    def finalize(self, photo: StoredPhoto) -> None:
+        """Перенос принятого файла в хранилище (если такое содержимое уже есть - копия не нужна)"""
+        if photo.tmp_path is None:
+            return
+        target = self.path_for(photo.photo_id)
+        if target.exists():
+            photo.tmp_path.unlink(missing_ok=True)
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(photo.tmp_path, target)
+        photo.tmp_path = None
+
+    def discard(self, photo: StoredPhoto) -> None:
+        """Удаление принятого, но не сохраненного файла"""
+        if photo.tmp_path is not None:
+            photo.tmp_path.unlink(missing_ok=True)
+            photo.tmp_path = None
+
+    def delete(self, photo_id: str) -> int:
+        """Удаление файла и его производных (миниатюр) из хранилища, возвращает освобожденный размер"""
+        path = self.path_for(photo_id)
+        derivatives = (self.root / "derivatives").glob(f"*/{photo_id[:2]}/{photo_id}.jpg")
+        freed = 0
+        for file_path in (path, *derivatives):
+            try:
+                freed += file_path.stat().st_size
+                file_path.unlink()
+            except FileNotFoundError:
+                pass
+        return freed
+
+    def iter_file(self, photo_id: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Чтение файла фото кусками в диапазоне [start, end] включительно"""
+        return iter_file_range(self.path_for(photo_id), start, end, PHOTO_CHUNK_SIZE)
+
+
+def register_photo(db: Session, project_id: int, photo: StoredPhoto) -> None:
+    """
+    Запись метаданных фото и его связи с проектом. Повторная загрузка того же содержимого
+    только обновляет updated_at, чтобы сборщик мусора не удалил фото до появления ссылок на него.
+    Вызывается до finalize(): сборщик удаляет файл до коммита удаления строки,
+    поэтому файл, перенесенный после этой записи, не будет удален.
+    """
+    db.execute(
+        text("""
+            INSERT INTO photos (sha256, size, content_type, updated_at)
+            VALUES (:sha256, :size, :content_type, now())
+            ON CONFLICT (sha256) DO UPDATE SET updated_at = now()
+        """),
+        {"sha256": photo.photo_id, "size": photo.size, "content_type": photo.content_type}
+    )
+    db.execute(
+        text("""
+            INSERT INTO photo_projects (project_id, sha256)
+            VALUES (:project_id, :sha256)
+            ON CONFLICT DO NOTHING
+        """),
+        {"project_id": project_id, "sha256": photo.photo_id}
+    )
+
+
+def link_project_photos(db: Session, project_id: int, photo_ids: Iterable[Optional[str]]) -> int:
+    """
+    Связь с проектом уже сохраненных фото (перенос ссылок осмотров, загруженных до
+    photo_projects). Возвращает количество новых связей
+    """
+    unique_ids = list({photo_id for photo_id in photo_ids if photo_id})
+    if not unique_ids:
+        return 0
+
+    result = db.execute(
+        text("""
+            INSERT INTO photo_projects (project_id, sha256)
+            SELECT :project_id, sha256 FROM photos WHERE sha256 = ANY(:ids)
+            ON CONFLICT DO NOTHING
+        """),
+        {"project_id": project_id, "ids": unique_ids}
+    )
+    return result.rowcount
+
+
+def find_known_photos(db: Session, project_id: int, photo_ids: Iterable[str]) -> Set[str]:
+    """
+    Хеши, которые уже загружены в проект (предпроверка перед загрузкой, ссылки из пакета).
+    Фото другого проекта считается незагруженным: клиент должен прислать содержимое
+    """
+    unique_ids = list({photo_id for photo_id in photo_ids if photo_id})
+    if not unique_ids:
+        return set()
+
+    rows = db.execute(
+        text("""
+            SELECT p.sha256 FROM photos p
+            JOIN photo_projects pp ON pp.sha256 = p.sha256 AND pp.project_id = :project_id
+            WHERE p.sha256 = ANY(:ids)
+        """),
+        {"project_id": project_id, "ids": unique_ids}
+    ).all()
+    return {row.sha256 for row in rows if photo_storage.exists(row.sha256)}
+
+
+def change_photo_refs(
+    db: Session,
+    acquired: Iterable[Optional[str]] = (),
+    released: Iterable[Optional[str]] = ()
+) -> None:
+    """
+    Изменение счетчиков ссылок одним UPDATE. Вызывается путями записи осмотров
+    в той же транзакции: новый photo_id - acquired, замененный/удаленный - released.
+    """
+    deltas: Dict[str, int] = {}
+    for photo_id in acquired:
+        if photo_id:
+            deltas[photo_id] = deltas.get(photo_id, 0) + 1
+    for photo_id in released:
+        if photo_id:
+            deltas[photo_id] = deltas.get(photo_id, 0) - 1
+    deltas = {photo_id: delta for photo_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    db.execute(
+        text("""
+            UPDATE photos p
+            SET ref_count = greatest(p.ref_count + d.delta, 0), updated_at = now()
+            FROM unnest(CAST(:ids AS varchar[]), CAST(:deltas AS integer[])) AS d(sha256, delta)
+            WHERE p.sha256 = d.sha256
+        """),
+        {"ids": list(deltas), "deltas": list(deltas.values())}
+    )
+
+
+def collect_garbage(db: Session, grace_hours: int = PHOTO_GC_GRACE_HOURS, batch_size: int = 1000) -> Tuple[int, int]:
+    """
+    Удаление фото без ссылок старше grace_hours. Возвращает (количество, байт освобождено).
+    Файлы удаляются до коммита: загрузка того же хеша ждет блокировку строки и
+    переносит файл уже после удаления.
+    """
+    deleted_count, freed_bytes = 0, 0
+    while True:
+        rows = db.execute(
+            text("""
+                DELETE FROM photos
+                WHERE sha256 IN (
+                    SELECT sha256 FROM photos
+                    WHERE ref_count = 0
+                      AND updated_at < now() - make_interval(hours => :grace_hours)
+                    LIMIT :batch_size
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING sha256
+            """),
+            {"grace_hours": grace_hours, "batch_size": batch_size}
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            freed_bytes += photo_storage.delete(row.sha256)
+        db.commit()
+        deleted_count += len(rows)
+
+    logger.info("Photo garbage collected", deleted=deleted_count, freed_bytes=freed_bytes)
+    return deleted_count, freed_bytes
+
+
+def photo_url(project_id: int, photo_id: str, variant: Optional[str] = None) -> str:
+    """URL загрузки фото (с префиксом /api, как его видит клиент); variant - производная"""
+    url = f"/api/v1/projects/{project_id}/photos/{photo_id}"
+    return f"{url}?variant={variant}" if variant else url
+
+
+def describe_photos(db: Session, project_id: int, photo_ids: Iterable[Optional[str]]) -> Dict[str, PhotoDescriptor]:
+    """Описания фото одним запросом к таблице photos (без чтения файлов)"""
+    unique_ids: List[str] = list({photo_id for photo_id in photo_ids if photo_id})
+    if not unique_ids:
+        return {}
+
+    rows = db.execute(
+        text("SELECT sha256, size FROM photos WHERE sha256 = ANY(:ids)"),
+        {"ids": unique_ids}
+    ).all()
+    return {
+        row.sha256: PhotoDescriptor(
+            photo_id=row.sha256,
+            size=row.size,
+            sha256=row.sha256,
+            url=photo_url(project_id, row.sha256),
+            display_url=photo_url(project_id, row.sha256, "display"),
+            thumbnail_url=photo_url(project_id, row.sha256, "thumb_large")
+        )
+        for row in rows
+    }
+
+
+# Создаем глобальный экземпляр хранилища
+photo_storage = PhotoStorage()
@@ -0,0 +1,485 @@
+"""
+Параметры позиций (positions_attributes)
+Пакетное обновление (PositionAttributesBulkUpdate): строки с одинаковым набором переданных полей
+пишутся одним INSERT ... SELECT FROM unnest(...) ON CONFLICT (position_id) DO UPDATE, который
+меняет только эти поля. Строки проверяются по отдельности; если набор отклонен БД, он
+переписывается построчно в точках сохранения, чтобы ошибочные строки не откатывали остальные.
+
+Копирование (PositionAttributesCopyRequest): параметры позиции-источника записываются в позиции
+цели одним INSERT ... SELECT ... ON CONFLICT в БД проекта. Крупная цель копируется фоновой
+задачей порциями по диапазонам position_id в одной транзакции: прогресс пишется в центральную
+БД после каждой порции, отмена откатывает транзакцию целиком. Выполняемая задача обновляет
+updated_at не реже ATTRIBUTE_COPY_HEARTBEAT_SECONDS; задача, прерванная перезапуском процесса
+(updated_at старше ATTRIBUTE_COPY_STALE_SECONDS), помечается failed - ее транзакция уже откачена.
+"""
+
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple, get_args
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker
+from core.database import SessionLocal
+from core.models import PositionAttributeCopyJob
+from core.schemas import (
+    InvalidBatchItem, PositionAttributeBase, PositionAttributeRecord,
+    PositionAttributeBulkItemResult, PositionAttributesBulkUpdate, PositionAttributesBulkResult,
+    PositionAttributesCopyRequest
+)
+import structlog
+
+logger = structlog.get_logger()
+
+# Цель больше этого числа позиций копируется фоновой задачей
+ATTRIBUTE_COPY_SYNC_LIMIT = int(os.environ.get("ATTRIBUTE_COPY_SYNC_LIMIT", "2000"))
+ATTRIBUTE_COPY_CHUNK_ROWS = int(os.environ.get("ATTRIBUTE_COPY_CHUNK_ROWS", "5000"))
+# Пульс выполняемой задачи и порог, после которого задача без пульса считается прерванной
+ATTRIBUTE_COPY_HEARTBEAT_SECONDS = int(os.environ.get("ATTRIBUTE_COPY_HEARTBEAT_SECONDS", "30"))
+ATTRIBUTE_COPY_STALE_SECONDS = int(os.environ.get("ATTRIBUTE_COPY_STALE_SECONDS", "300"))
+
+ATTRIBUTE_FIELDS = tuple(PositionAttributeBase.model_fields)
+
+# Условие на позиции p для каждого типа цели
+COPY_TARGETS = {
+    "position": "p.position_id = :target_id",
+    "subobject": "p.subobject_id = :target_id",
+    "object": "p.subobject_id IN (SELECT subobject_id FROM subobjects WHERE object_id = :target_id)",
+    "project": "TRUE",
+}
+
+JOB_ACTIVE_STATUSES = ("pending", "running")
+
+_SQL_TYPES = {float: "double precision", int: "integer"}
+
+
+def _sql_type(name: str) -> str:
+    annotation = PositionAttributeBase.model_fields[name].annotation
+    python_type = next((arg for arg in get_args(annotation) if arg is not type(None)), annotation)
+    return _SQL_TYPES[python_type]
+
+
+@dataclass
+class PreparedAttributes:
+    """Проверенный пакет: строки по наборам переданных полей и результаты по строкам"""
+    results: List[PositionAttributeBulkItemResult] = field(default_factory=list)
+    groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = field(default_factory=dict)  # Ключ строки "idx" - номер в results
+    changed: Dict[int, PositionAttributeRecord] = field(default_factory=dict)  # idx -> строка после записи
+
+    def fail(self, idx: int, error: str) -> None:
+        self.results[idx].status = "error"
+        self.results[idx].error = error
+
+    def to_response(self) -> PositionAttributesBulkResult:
+        statuses = [item.status for item in self.results]
+        return PositionAttributesBulkResult(
+            created=statuses.count("created"),
+            updated=statuses.count("updated"),
+            unchanged=statuses.count("unchanged"),
+            failed=statuses.count("error"),
+            attributes=[self.changed[idx] for idx in sorted(self.changed)],
+            items=self.results
+        )
+
+
+def _db_message(error: DBAPIError) -> str:
+    return str(error.orig).strip().splitlines()[0] if error.orig is not None else str(error)
+
+
+def prepare_attributes(payload: PositionAttributesBulkUpdate) -> PreparedAttributes:
+    """
+    Строки для записи из проверенного пакета (PositionAttributeUpdate; непрошедшие проверку
+    строки - InvalidBatchItem). Повтор position_id внутри пакета: записывается последняя
+    строка, предыдущие получают статус duplicate.
+    """
+    prepared = PreparedAttributes()
+    latest: Dict[int, Tuple[Tuple[str, ...], Dict[str, Any]]] = {}
+    for index, item in enumerate(payload.attributes):
+        if isinstance(item, InvalidBatchItem):
+            prepared.results.append(PositionAttributeBulkItemResult(
+                index=index, position_id=item.raw_int("position_id"), status="error", error=item.error
+            ))
+            continue
+        prepared.results.append(PositionAttributeBulkItemResult(
+            index=index, position_id=item.position_id, status="error"
+        ))
+
+        fields = tuple(name for name in ATTRIBUTE_FIELDS if name in item.model_fields_set)
+        row = {"idx": index, "position_id": item.position_id, **{name: getattr(item, name) for name in fields}}
+        replaced = latest.get(item.position_id)
+        if replaced is not None:
+            prepared.results[replaced[1]["idx"]].status = "duplicate"
+        latest[item.position_id] = (fields, row)
+        prepared.results[index].status = "unchanged"  # Уточняется после записи
+
+    for fields, row in latest.values():
+        prepared.groups.setdefault(fields, []).append(row)
+    return prepared
+
+
+def _upsert_statement(fields: Tuple[str, ...]):
+    columns = ("idx", "position_id", *fields)
+    arrays = ", ".join(
+        f"CAST(:{name} AS {'integer' if name in ('idx', 'position_id') else _sql_type(name)}[])" for name in columns
+    )
+    insert_columns = ", ".join(("position_id", *fields))
+    select_list = ", ".join(f"i.{name}" for name in ("position_id", *fields))
+    returning = ", ".join(f"t.{name}" for name in ATTRIBUTE_FIELDS)
+    if fields:
+        # Строка без изменений не перезаписывается (не попадает в дельта-синхронизацию)
+        assignments = ", ".join(f"{name} = EXCLUDED.{name}" for name in fields)
+        changed = " OR ".join(f"t.{name} IS DISTINCT FROM EXCLUDED.{name}" for name in fields)
+        conflict_action = f"DO UPDATE SET {assignments} WHERE {changed}"
+    else:
+        conflict_action = "DO NOTHING"
+
+    # Строки вставляются в порядке ключа, чтобы параллельные пакеты не взаимоблокировались
+    return text(f"""
+        WITH input AS (
+            SELECT * FROM unnest({arrays}) AS r({", ".join(columns)})
+        ),
+        upserted AS (
+            INSERT INTO positions_attributes AS t ({insert_columns})
+            SELECT {select_list}
+            FROM input i
+            JOIN positions p ON p.position_id = i.position_id
+            ORDER BY i.position_id
+            ON CONFLICT (position_id) {conflict_action}
+            RETURNING t.attr_id, t.position_id, {returning}, (t.xmax = 0) AS inserted
+        )
+        SELECT i.idx, p.position_id IS NULL AS missing, u.*
+        FROM input i
+        LEFT JOIN positions p ON p.position_id = i.position_id
+        LEFT JOIN upserted u ON u.position_id = i.position_id
+    """)
+
+
+def _parameters(fields: Tuple[str, ...], rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    return {name: [row[name] for row in rows] for name in ("idx", "position_id", *fields)}
+
+
+def _apply_rows(prepared: PreparedAttributes, rows) -> None:
+    for row in rows:
+        result = prepared.results[row.idx]
+        if row.missing:
+            prepared.fail(row.idx, f"Позиция {result.position_id} не найдена")
+            continue
+        if row.attr_id is None:
+            continue
+        result.status = "created" if row.inserted else "updated"
+        result.attr_id = row.attr_id
+        prepared.changed[row.idx] = PositionAttributeRecord(
+            attr_id=row.attr_id,
+            position_id=row.position_id,
+            **{name: getattr(row, name) for name in ATTRIBUTE_FIELDS}
+        )
+
+
+def write_attributes(db: Session, prepared: PreparedAttributes) -> None:
+    """
+    Запись проверенного пакета в БД проекта (без коммита).
+    Один запрос на набор полей; при отказе БД - построчно, каждая строка в своей точке сохранения
+    """
+    for fields, rows in prepared.groups.items():
+        statement = _upsert_statement(fields)
+        try:
+            with db.begin_nested():
+                _apply_rows(prepared, db.execute(statement, _parameters(fields, rows)).all())
+            continue
+        except DBAPIError as e:
+            logger.warning(
+                "Position attributes batch fell back to row-by-row", fields=list(fields), rows=len(rows), error=_db_message(e)
+            )
+
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    _apply_rows(prepared, db.execute(statement, _parameters(fields, [row])).all())
+            except DBAPIError as e:
+                prepared.fail(row["idx"], _db_message(e))
+
+
+def bulk_update_attributes(db: Session, payload: PositionAttributesBulkUpdate) -> PositionAttributesBulkResult:
+    """Пакетное обновление параметров позиций одной транзакцией БД проекта"""
+    prepared = prepare_attributes(payload)
+    try:
+        write_attributes(db, prepared)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return prepared.to_response()
+
+
+# ==================== Копирование параметров ====================
+
+def _copy_params(request: PositionAttributesCopyRequest) -> Dict[str, Any]:
+    return {"source_position_id": request.source_position_id, "target_id": request.target_id}
+
+
+def _source_select() -> str:
+    return f"SELECT {', '.join(ATTRIBUTE_FIELDS)} FROM positions_attributes WHERE position_id = :source_position_id"
+
+
+def lock_source(db: Session, source_position_id: int) -> bool:
+    """
+    Блокировка строки параметров источника до конца транзакции (FOR SHARE): порции копирования
+    видят одни и те же значения. False - у позиции нет параметров
+    """
+    row = db.execute(
+        text("SELECT 1 FROM positions_attributes WHERE position_id = :source_position_id FOR SHARE"),
+        {"source_position_id": source_position_id}
+    ).first()
+    return row is not None
+
+
+def estimate_copy(db: Session, request: PositionAttributesCopyRequest) -> Dict[str, int]:
+    """Позиции цели (без источника): всего, без параметров и с отличающимися параметрами"""
+    differs = " OR ".join(f"a.{name} IS DISTINCT FROM s.{name}" for name in ATTRIBUTE_FIELDS)
+    row = db.execute(
+        text(f"""
+            SELECT count(*) AS targets,
+                   count(*) FILTER (WHERE a.attr_id IS NULL) AS created,
+                   count(*) FILTER (WHERE a.attr_id IS NOT NULL AND ({differs})) AS updated
+            FROM positions p
+            CROSS JOIN ({_source_select()}) s
+            LEFT JOIN positions_attributes a ON a.position_id = p.position_id
+            WHERE {COPY_TARGETS[request.target_type]} AND p.position_id <> :source_position_id
+        """),
+        _copy_params(request)
+    ).mappings().one()
+    return dict(row)
+
+
+def _copy_statement(target_type: str, ranged: bool):
+    columns = ", ".join(ATTRIBUTE_FIELDS)
+    assignments = ", ".join(f"{name} = EXCLUDED.{name}" for name in ATTRIBUTE_FIELDS)
+    changed = " OR ".join(f"t.{name} IS DISTINCT FROM EXCLUDED.{name}" for name in ATTRIBUTE_FIELDS)
+    position_range = "AND p.position_id > :after AND p.position_id <= :upto" if ranged else ""
+
+    # Строки вставляются в порядке ключа, чтобы параллельные записи не взаимоблокировались
+    return text(f"""
+        WITH upserted AS (
+            INSERT INTO positions_attributes AS t (position_id, {columns})
+            SELECT p.position_id, s.*
+            FROM positions p
+            CROSS JOIN ({_source_select()}) s
+            WHERE {COPY_TARGETS[target_type]} AND p.position_id <> :source_position_id {position_range}
+            ORDER BY p.position_id
+            ON CONFLICT (position_id) DO UPDATE SET {assignments}
+            WHERE {changed}
+            RETURNING (t.xmax = 0) AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted) AS created,
+               count(*) FILTER (WHERE NOT inserted) AS updated
+        FROM upserted
+    """)
+
+
+def copy_attributes(db: Session, request: PositionAttributesCopyRequest) -> Dict[str, int]:
+    """Копирование одним запросом (без коммита; источник должен быть заблокирован lock_source)"""
+    row = db.execute(_copy_statement(request.target_type, ranged=False), _copy_params(request)).mappings().one()
+    return dict(row)
+
+
+def _next_chunk(db: Session, request: PositionAttributesCopyRequest, after: int) -> Tuple[int, Optional[int]]:
+    """Следующая порция позиций цели после after: количество и последний position_id"""
+    row = db.execute(
+        text(f"""
+            SELECT count(*) AS targets, max(position_id) AS upto
+            FROM (
+                SELECT p.position_id FROM positions p
+                WHERE {COPY_TARGETS[request.target_type]}
+                  AND p.position_id <> :source_position_id AND p.position_id > :after
+                ORDER BY p.position_id
+                LIMIT :limit
+            ) chunk
+        """),
+        {**_copy_params(request), "after": after, "limit": ATTRIBUTE_COPY_CHUNK_ROWS}
+    ).one()
+    return row.targets, row.upto
+
+
+# ==================== Фоновые задачи копирования ====================
+
+def create_copy_job(
+    central_db: Session, project_id: int, user_id: Optional[int], request: PositionAttributesCopyRequest, total: int
+) -> PositionAttributeCopyJob:
+    job = PositionAttributeCopyJob(
+        project_id=project_id,
+        user_id=user_id,
+        source_position_id=request.source_position_id,
+        target_type=request.target_type,
+        target_id=request.target_id,
+        total=total
+    )
+    central_db.add(job)
+    central_db.commit()
+    central_db.refresh(job)
+    return job
+
+
+def fail_stale_copy_jobs(central_db: Session, project_id: Optional[int] = None) -> int:
+    """
+    Задачи pending/running без пульса дольше ATTRIBUTE_COPY_STALE_SECONDS (процесс перезапущен)
+    помечаются failed: копирование шло одной транзакцией, она откачена вместе с соединением.
+    Возвращает количество помеченных задач
+    """
+    project_condition = "AND project_id = :project_id" if project_id is not None else ""
+    stale = central_db.execute(
+        text(f"""
+            UPDATE position_attribute_copy_jobs
+            SET status = 'failed', error = :error, updated_at = now(), finished_at = now()
+            WHERE status IN ('pending', 'running')
+              AND coalesce(updated_at, created_at) < clock_timestamp() - make_interval(secs => :stale_seconds)
+              {project_condition}
+            RETURNING id
+        """),
+        {
+            "error": "Задача прервана: процесс API остановлен, копирование откачено",
+            "stale_seconds": ATTRIBUTE_COPY_STALE_SECONDS,
+            "project_id": project_id
+        }
+    ).scalars().all()
+    central_db.commit()
+    if stale:
+        logger.warning("Stale position attributes copy jobs failed", job_ids=stale)
+    return len(stale)
+
+
+def get_copy_job(central_db: Session, project_id: int, job_id: int) -> Optional[PositionAttributeCopyJob]:
+    fail_stale_copy_jobs(central_db, project_id)
+    return central_db.query(PositionAttributeCopyJob).filter(
+        PositionAttributeCopyJob.id == job_id,
+        PositionAttributeCopyJob.project_id == project_id
+    ).first()
+
+
+def cancel_copy_job(central_db: Session, job: PositionAttributeCopyJob) -> bool:
+    """Запрос отмены: задача остановится после текущей порции. False - задача уже завершена"""
+    if job.status not in JOB_ACTIVE_STATUSES:
+        return False
+    job.cancel_requested = True
+    central_db.commit()
+    central_db.refresh(job)
+    return True
+
+
+def _report_progress(central_db: Session, job_id: int, **values: Any) -> bool:
+    """Запись прогресса задачи; True - запрошена отмена"""
+    assignments = ", ".join(f"{name} = :{name}" for name in values)
+    cancel_requested = central_db.execute(
+        text(f"""
+            UPDATE position_attribute_copy_jobs SET {assignments}, updated_at = now()
+            WHERE id = :job_id
+            RETURNING cancel_requested
+        """),
+        {**values, "job_id": job_id}
+    ).scalar()
+    central_db.commit()
+    return bool(cancel_requested)
+
+
+def _finish_job(central_db: Session, job_id: int, status: str, error: Optional[str] = None) -> None:
+    central_db.execute(
+        text("""
+            UPDATE position_attribute_copy_jobs
+            SET status = :status, error = :error, updated_at = now(), finished_at = :finished_at
+            WHERE id = :job_id
+        """),
+        {"status": status, "error": error, "finished_at": datetime.now(timezone.utc), "job_id": job_id}
+    )
+    central_db.commit()
+
+
+class _JobHeartbeat:
+    """Пульс задачи: updated_at обновляется в отдельном потоке, пока выполняется долгая порция"""
+
+    def __init__(self, job_id: int, interval: int = ATTRIBUTE_COPY_HEARTBEAT_SECONDS):
+        self.job_id = job_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"copy-job-{job_id}-heartbeat", daemon=True)
+
+    def __enter__(self) -> "_JobHeartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            central_db = SessionLocal()
+            try:
+                central_db.execute(
+                    text("""
+                        UPDATE position_attribute_copy_jobs SET updated_at = now()
+                        WHERE id = :job_id AND status = 'running'
+                    """),
+                    {"job_id": self.job_id}
+                )
+                central_db.commit()
+            except Exception as e:
+                logger.warning("Copy job heartbeat failed", job_id=self.job_id, error=str(e))
+            finally:
+                central_db.close()
+
+
+def run_copy_job(factory: sessionmaker, job_id: int) -> None:
+    """
+    Выполнение задачи копирования (фоновая задача FastAPI). Все порции - одна транзакция
+    БД проекта: отмена или ошибка не оставляют частично скопированную цель
+    """
+    central_db = SessionLocal()
+    db = factory()
+    try:
+        job = central_db.get(PositionAttributeCopyJob, job_id)
+        if job is None or job.status != "pending":
+            return  # Уже помечена прерванной (fail_stale_copy_jobs)
+        request = PositionAttributesCopyRequest(
+            source_position_id=job.source_position_id, target_type=job.target_type, target_id=job.target_id
+        )
+        if job.cancel_requested:
+            _finish_job(central_db, job_id, "cancelled")
+            return
+        _report_progress(central_db, job_id, status="running")
+
+        if not lock_source(db, request.source_position_id):
+            db.rollback()
+            _finish_job(central_db, job_id, "failed", f"У позиции {request.source_position_id} нет параметров")
+            return
+
+        statement = _copy_statement(request.target_type, ranged=True)
+        processed = created = updated = 0
+        after = -1
+        with _JobHeartbeat(job_id):
+            while True:
+                targets, upto = _next_chunk(db, request, after)
+                if not targets:
+                    break
+                row = db.execute(statement, {**_copy_params(request), "after": after, "upto": upto}).one()
+                processed += targets
+                created += row.created
+                updated += row.updated
+                after = upto
+                if _report_progress(central_db, job_id, processed=processed, created=created, updated=updated):
+                    db.rollback()
+                    _report_progress(central_db, job_id, processed=0, created=0, updated=0)
+                    _finish_job(central_db, job_id, "cancelled")
+                    logger.info("Position attributes copy cancelled", job_id=job_id, processed=processed)
+                    return
+
+            db.commit()
+        _finish_job(central_db, job_id, "completed")
+        logger.info("Position attributes copy completed", job_id=job_id, created=created, updated=updated)
+    except Exception as e:
+        db.rollback()
+        central_db.rollback()
+        logger.error("Position attributes copy failed", job_id=job_id, error=str(e))
+        _finish_job(central_db, job_id, "failed", str(e))
+    finally:
+        db.close()
+        central_db.close()
@@ -0,0 +1,199 @@
+"""
+Сервис metadata проектов (projects.metadata, JSONB)
+Обновления выполняются одним UPDATE ... RETURNING: jsonb_set и операции над массивами
+считаются в БД, без чтения документа в Python и без гонок между редакторами.
+Исключенные позиции хранятся компактно - диапазонами (см. utils.position_set).
+"""
+
+import json
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from core.schemas import ProjectMetadataResponse, ProjectMetadataUpdate
+from utils.position_set import PositionIdSet, position_set_from_metadata
+
+# Скалярные поля: значение -1 удаляет ключ
+SCALAR_FIELDS = ("current_cycle_id", "planned_cycle_id")
+# Списочные поля: полная замена или дельты <field>_add / <field>_remove
+LIST_FIELDS = ("completed_cycles",)
+# Множества ID, хранимые диапазонами: поле API -> ключ metadata
+RANGE_FIELDS = {"excluded_positions": "excluded_position_ranges"}
+
+CAST_JSONB = "CAST(:{param} AS jsonb)"
+
+
+def _json_array(key: str) -> str:
+    """Массив из metadata (отсутствующий ключ или не-массив - пустой массив)"""
+    return (
+        f"CASE WHEN jsonb_typeof(metadata->'{key}') = 'array' "
+        f"THEN metadata->'{key}' ELSE '[]'::jsonb END"
+    )
+
+
+def _delta_expression(key: str) -> str:
+    """Новое значение массива: (текущий ∪ add) \\ remove, отсортированный и без дублей"""
+    return f"""(
+        SELECT coalesce(jsonb_agg(v ORDER BY v), '[]'::jsonb)
+        FROM (
+            SELECT (e)::bigint AS v FROM jsonb_array_elements({_json_array(key)}) e
+            UNION SELECT unnest(CAST(:{key}_add AS bigint[]))
+            EXCEPT SELECT unnest(CAST(:{key}_remove AS bigint[]))
+        ) s
+    )"""
+
+
+def _multirange_expression(source: str, lower: str, upper: str) -> str:
+    """Мультидиапазон int8 из строк source с включительными границами lower, upper"""
+    return (
+        f"(SELECT coalesce(range_agg(int8range({lower}, {upper}, '[]')), '{{}}'::int8multirange) "
+        f"FROM {source})"
+    )
+
+
+def _range_delta_expression(key: str, ranges_key: str) -> str:
+    """
+    Новые диапазоны: (текущие диапазоны ∪ старый список ∪ add) \\ remove.
+    Арифметика мультидиапазонов int8: объем работы зависит от числа диапазонов,
+    а не от числа позиций в них
+    """
+    ranges = _multirange_expression(
+        f"jsonb_array_elements({_json_array(ranges_key)}) r", "(r->>0)::bigint", "(r->>1)::bigint"
+    )
+    listed = _multirange_expression(f"jsonb_array_elements({_json_array(key)}) e", "(e)::bigint", "(e)::bigint")
+    added = _multirange_expression(f"unnest(CAST(:{key}_add AS bigint[])) v", "v", "v")
+    removed = _multirange_expression(f"unnest(CAST(:{key}_remove AS bigint[])) v", "v", "v")
+    return f"""(
+        SELECT coalesce(jsonb_agg(jsonb_build_array(lower(r), upper(r) - 1) ORDER BY lower(r)), '[]'::jsonb)
+        FROM unnest({ranges} + {listed} + {added} - {removed}) r
+    )"""
+
+
+def build_metadata_update(update: ProjectMetadataUpdate) -> Tuple[Optional[str], Dict[str, Any]]:
+    """SQL-выражение нового значения metadata и параметры (None - изменений нет)"""
+    expression = "coalesce(metadata, '{}'::jsonb)"
+    params: Dict[str, Any] = {}
+    changed = False
+
+    for key in SCALAR_FIELDS:
+        value = getattr(update, key)
+        if value is None:
+            continue
+        changed = True
+        if value == -1:
+            expression = f"({expression} - '{key}')"
+        else:
+            expression = f"jsonb_set({expression}, '{{{key}}}', to_jsonb(CAST(:{key} AS integer)))"
+            params[key] = value
+
+    for key in LIST_FIELDS:
+        value = getattr(update, key)
+        added = getattr(update, f"{key}_add")
+        removed = getattr(update, f"{key}_remove")
+        if value is not None:
+            changed = True
+            expression = f"jsonb_set({expression}, '{{{key}}}', {CAST_JSONB.format(param=key)})"
+            params[key] = json.dumps(sorted(set(value)))
+        elif added or removed:
+            changed = True
+            expression = f"jsonb_set({expression}, '{{{key}}}', {_delta_expression(key)})"
+            params[f"{key}_add"] = list(added or [])
+            params[f"{key}_remove"] = list(removed or [])
+
+    for key, ranges_key in RANGE_FIELDS.items():
+        value = getattr(update, key)
+        added = getattr(update, f"{key}_add")
+        removed = getattr(update, f"{key}_remove")
+        if value is not None:
+            ranges = CAST_JSONB.format(param=key)
+            params[key] = json.dumps(PositionIdSet(value).to_ranges())
+        elif added or removed:
+            ranges = _range_delta_expression(key, ranges_key)
+            params[f"{key}_add"] = list(added or [])
+            params[f"{key}_remove"] = list(removed or [])
+        else:
+            continue
+        changed = True
+        # Старый формат (полный список) удаляется при первой записи
+        expression = f"jsonb_set(({expression} - '{key}'), '{{{ranges_key}}}', {ranges})"
+
+    return (expression if changed else None), params
+
+
+def metadata_to_response(metadata: Optional[Dict[str, Any]], compact: bool = False) -> ProjectMetadataResponse:
+    """
+    Преобразование JSONB metadata в схему ответа.
+    compact=True - исключенные позиции только диапазонами, без развернутого списка
+    """
+    metadata = metadata or {}
+    excluded = position_set_from_metadata(metadata)
+    return ProjectMetadataResponse(
+        completed_cycles=metadata.get("completed_cycles") or [],
+        current_cycle_id=metadata.get("current_cycle_id"),
+        planned_cycle_id=metadata.get("planned_cycle_id"),
+        excluded_positions=[] if compact else excluded.to_list(),
+        excluded_position_ranges=excluded.to_ranges()
+    )
+
+
+def get_excluded_positions(db: Session, project_id: int) -> PositionIdSet:
+    """
+    Исключенные позиции проекта для фильтрации позиций, задач планировщика и осмотров
+    (пустое множество - проект не найден или исключений нет). В SQL - через
+    excluded_positions_condition / excluded_elements_condition
+    """
+    return position_set_from_metadata(get_project_metadata(db, project_id))
+
+
+def excluded_positions_condition(excluded: PositionIdSet, column: str, params: Dict[str, Any]) -> str:
+    """
+    SQL-условие "позиция column не исключена". Множество передается одним параметром
+    int8multirange (несколько диапазонов вместо списка ID); без исключений - TRUE
+    """
+    if not excluded:
+        return "TRUE"
+    params["excluded_positions"] = excluded.to_multirange()
+    return f"NOT (CAST(:excluded_positions AS int8multirange) @> CAST({column} AS bigint))"
+
+
+def excluded_elements_condition(excluded: PositionIdSet, column: str, params: Dict[str, Any]) -> str:
+    """SQL-условие "элемент column (осмотры) не принадлежит исключенной позиции"; без исключений - TRUE"""
+    if not excluded:
+        return "TRUE"
+    params["excluded_positions"] = excluded.to_multirange()
+    return (
+        f"NOT EXISTS (SELECT 1 FROM elements excluded_elements WHERE excluded_elements.id = {column} "
+        f"AND CAST(:excluded_positions AS int8multirange) @> CAST(excluded_elements.position_id AS bigint))"
+    )
+
+
+def get_project_metadata(db: Session, project_id: int) -> Optional[Dict[str, Any]]:
+    """metadata проекта (None - проект не найден)"""
+    row = db.execute(
+        text("SELECT coalesce(metadata, '{}'::jsonb) AS metadata FROM projects WHERE id = :project_id"),
+        {"project_id": project_id}
+    ).first()
+    return row.metadata if row else None
+
+
+def update_project_metadata(
+    db: Session,
+    project_id: int,
+    update: ProjectMetadataUpdate
+) -> Optional[Dict[str, Any]]:
+    """
+    Атомарное обновление metadata одним запросом.
+    Возвращает новое значение metadata (None - проект не найден). Коммит - на вызывающей стороне.
+    """
+    expression, params = build_metadata_update(update)
+    if expression is None:
+        return get_project_metadata(db, project_id)
+
+    params["project_id"] = project_id
+    row = db.execute(
+        text(
+            f"UPDATE projects SET metadata = {expression}, updated_at = now() "
+            f"WHERE id = :project_id RETURNING metadata"
+        ),
+        params
+    ).first()
+    return row.metadata if row else None
@@ -0,0 +1,380 @@
+"""
+Планировщик маршрута обхода позиций
+Порядок посещения позиций задачи (подобъекта) строится по координатам: жадный ближайший
+сосед и улучшение 2-opt / Or-opt. Матрица расстояний и перебор вариантов для каждой
+позиции вычисляются векторно (NumPy), в Python остается только цикл по позициям.
+Маршрут открытый: начинается в стартовой позиции, заканчивается где выгоднее.
+
+Координаты - представление route_planner_positions (db/project/008_route_planner_positions.sql),
+исключенные позиции проекта в маршрут не входят.
+Результат кэшируется в памяти процесса по версии набора позиций (хэш id и координат),
+поэтому повторный запрос без изменений позиций не пересчитывает маршрут.
+"""
+
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from services.project_metadata_service import excluded_positions_condition
+from utils.position_set import PositionIdSet
+import structlog
+
+logger = structlog.get_logger()
+
+ROUTE_PLAN_CACHE_SIZE = int(os.environ.get("ROUTE_PLAN_CACHE_SIZE", "256"))
+# Время на улучшение маршрута; по его истечении возвращается лучший найденный
+ROUTE_PLAN_TIME_BUDGET_SECONDS = float(os.environ.get("ROUTE_PLAN_TIME_BUDGET_SECONDS", "0.6"))
+# Матрица расстояний - (n + 1)^2 float64: 2000 позиций - около 32 МБ на запрос
+ROUTE_PLAN_MAX_POSITIONS = int(os.environ.get("ROUTE_PLAN_MAX_POSITIONS", "2000"))
+# Длина переносимого отрезка Or-opt
+OR_OPT_SEGMENT_LENGTHS = (1, 2, 3)
+# Места вставки отрезка Or-opt - рядом с ближайшими соседями его концов
+OR_OPT_NEIGHBOURS = 10
+# Строк матрицы за один шаг расчета расстояний и поиска соседей (ограничивает временные массивы)
+DISTANCE_BLOCK_ROWS = 256
+_EPSILON = 1e-9
+
+
+class RoutePlanCache:
+    """LRU-кэш маршрутов: (project_id, версия набора позиций, старт, поправка азимута) -> маршрут"""
+
+    def __init__(self, max_size: int = ROUTE_PLAN_CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+route_plan_cache = RoutePlanCache()
+
+
+# ==================== Геометрия ====================
+
+def apply_azimuth_correction(points: np.ndarray, correction_degrees: float) -> np.ndarray:
+    """
+    Поворот координат сетки проекта к истинному северу (поправка - угол по часовой стрелке).
+    Расстояния не меняются, меняются выдаваемые координаты и азимуты переходов
+    """
+    if not correction_degrees:
+        return points
+    angle = math.radians(correction_degrees)
+    cos, sin = math.cos(angle), math.sin(angle)
+    x, y = points[:, 0], points[:, 1]
+    return np.column_stack((x * cos + y * sin, -x * sin + y * cos))
+
+
+def distance_matrix(points: np.ndarray, padding: int = 0) -> np.ndarray:
+    """
+    Матрица евклидовых расстояний n x n, дополненная padding нулевыми строками и столбцами.
+    Считается на месте блоками строк: временные массивы не больше блока
+    """
+    n = len(points)
+    matrix = np.zeros((n + padding, n + padding))
+    for first in range(0, n, DISTANCE_BLOCK_ROWS):
+        block = matrix[first:min(first + DISTANCE_BLOCK_ROWS, n), :n]
+        rows = points[first:first + len(block)]
+        np.subtract.outer(rows[:, 0], points[:, 0], out=block)
+        np.hypot(block, np.subtract.outer(rows[:, 1], points[:, 1]), out=block)
+    return matrix
+
+
+def path_length(distances: np.ndarray, order: np.ndarray) -> float:
+    return float(distances[order[:-1], order[1:]].sum())
+
+
+# ==================== Построение и улучшение маршрута ====================
+
+def nearest_neighbour(distances: np.ndarray, start: int) -> np.ndarray:
+    """Жадный маршрут: каждый раз ближайшая непосещенная позиция"""
+    n = len(distances)
+    order = np.empty(n, dtype=np.int64)
+    visited = np.zeros(n, dtype=bool)
+    current = start
+    for step in range(n):
+        order[step] = current
+        visited[current] = True
+        if step == n - 1:
+            break
+        row = np.where(visited, np.inf, distances[current])
+        current = int(row.argmin())
+    return order
+
+
+def _extended(points: np.ndarray) -> np.ndarray:
+    """
+    Матрица с фиктивной конечной точкой (индекс n, расстояние 0 до всех): открытый маршрут
+    обрабатывается как замкнутый с концом в фиктивной точке, которая никогда не переносится
+    """
+    return distance_matrix(points, padding=1)
+
+
+def _nearest(distances: np.ndarray, count: int) -> np.ndarray:
+    """
+    count ближайших соседей каждой точки (кроме нее самой). Диагональ временно заменяется
+    на inf в самой матрице, соседи ищутся блоками строк - без копий матрицы n x n
+    """
+    n = len(distances)
+    neighbours = np.empty((n, count), dtype=np.int64)
+    np.fill_diagonal(distances, np.inf)
+    try:
+        for first in range(0, n, DISTANCE_BLOCK_ROWS):
+            block = distances[first:first + DISTANCE_BLOCK_ROWS]
+            neighbours[first:first + len(block)] = np.argpartition(block, count - 1, axis=1)[:, :count]
+    finally:
+        np.fill_diagonal(distances, 0.0)
+    return neighbours
+
+
+def two_opt(distances: np.ndarray, path: np.ndarray, active: np.ndarray, deadline: float) -> Tuple[np.ndarray, bool]:
+    """
+    Проход 2-opt: для ребра (i, i+1) выгоды разворота отрезка [i+1, j] считаются сразу для всех j,
+    применяется лучший. path - с фиктивной точкой в конце; active - позиции, у которых
+    с прошлого прохода сменились соседи (остальные пропускаются). Возвращает (path, были улучшения)
+    """
+    n = len(path)
+    improved = False
+    for i in range(n - 3):
+        if time.monotonic() > deadline:
+            break
+        a, b = path[i], path[i + 1]
+        if not (active[a] or active[b]):
+            continue
+        c = path[i + 2:n - 1]
+        d = path[i + 3:n]
+        gains = distances[a, b] + distances[c, d] - distances[a, c] - distances[b, d]
+        best = int(gains.argmax())
+        if gains[best] > _EPSILON:
+            j = i + 2 + best
+            path[i + 1:j + 1] = path[i + 1:j + 1][::-1].copy()
+            improved = True
+    return path, improved
+
+
+def or_opt(
+    distances: np.ndarray,
+    path: np.ndarray,
+    neighbours: np.ndarray,
+    active: np.ndarray,
+    deadline: float
+) -> Tuple[np.ndarray, bool]:
+    """
+    Проход Or-opt: отрезок из 1-3 позиций переносится (в прямом или обратном порядке)
+    на лучшее ребро маршрута. Кандидаты - ребра, примыкающие к ближайшим соседям концов
+    отрезка; их стоимости вставки считаются векторно
+    """
+    improved = False
+    where = np.empty(len(path), dtype=np.int64)
+    where[path] = np.arange(len(path))
+    last_edge = len(path) - 2
+    for length in OR_OPT_SEGMENT_LENGTHS:
+        i = 1
+        while i + length < len(path):
+            if time.monotonic() > deadline:
+                return path, improved
+            first, last = path[i], path[i + length - 1]
+            prev, following = path[i - 1], path[i + length]
+            if not (active[first] or active[last] or active[prev] or active[following]):
+                i += 1
+                continue
+            removal_gain = distances[prev, first] + distances[last, following] - distances[prev, following]
+
+            near = where[np.concatenate((neighbours[first], neighbours[last]))]
+            edges = np.concatenate((near - 1, near))
+            # Ребра, примыкающие к отрезку и внутри него, - исходное положение отрезка
+            edges = edges[(edges >= 0) & (edges <= last_edge) & ((edges < i - 1) | (edges > i + length - 1))]
+            if len(edges) == 0:
+                i += 1
+                continue
+            left, right = path[edges], path[edges + 1]
+            base = distances[left, right]
+            forward = distances[first, left] + distances[last, right] - base
+            backward = distances[last, left] + distances[first, right] - base
+            insertion = np.minimum(forward, backward)
+            best = int(insertion.argmin())
+
+            if removal_gain - insertion[best] > _EPSILON:
+                k = int(edges[best])
+                segment = path[i:i + length]
+                if backward[best] < forward[best]:
+                    segment = segment[::-1]
+                rest = np.concatenate((path[:i], path[i + length:]))
+                # Индекс ребра в маршруте без отрезка
+                position = k + 1 if k < i else k + 1 - length
+                path = np.concatenate((rest[:position], segment, rest[position:]))
+                where[path] = np.arange(len(path))
+                improved = True
+            else:
+                i += 1
+    return path, improved
+
+
+def _adjacency(path: np.ndarray) -> np.ndarray:
+    """Предыдущая и следующая точка для каждой точки маршрута (-1 на концах)"""
+    adjacency = np.full((len(path), 2), -1, dtype=np.int64)
+    adjacency[path[1:], 0] = path[:-1]
+    adjacency[path[:-1], 1] = path[1:]
+    return adjacency
+
+
+def solve_route(
+    points: np.ndarray,
+    start: int,
+    time_budget: float = ROUTE_PLAN_TIME_BUDGET_SECONDS
+) -> Tuple[np.ndarray, float, float, int]:
+    """
+    Порядок обхода точек из start. Возвращает (порядок, длина, длина жадного маршрута, число проходов)
+    """
+    n = len(points)
+    if n <= 2:
+        order = np.array([start] + [index for index in range(n) if index != start], dtype=np.int64)
+        distances = distance_matrix(points)
+        length = path_length(distances, order)
+        return order, length, length, 0
+
+    deadline = time.monotonic() + time_budget
+    extended = _extended(points)
+    distances = extended[:n, :n]  # Представление, не копия
+    initial = nearest_neighbour(distances, start)
+    initial_length = path_length(distances, initial)
+
+    neighbours = _nearest(distances, min(OR_OPT_NEIGHBOURS, n - 1))
+    path = np.append(initial, n)
+    active = np.ones(n + 1, dtype=bool)
+    passes = 0
+    while time.monotonic() < deadline:
+        passes += 1
+        before = _adjacency(path)
+        path, improved_2opt = two_opt(extended, path, active, deadline)
+        path, improved_or = or_opt(extended, path, neighbours, active, deadline)
+        if not (improved_2opt or improved_or):
+            break
+        active = (_adjacency(path) != before).any(axis=1)
+
+    order = path[:-1]
+    return order, path_length(distances, order), initial_length, passes
+
+
+def default_start(points: np.ndarray) -> int:
+    """Старт по умолчанию - самая удаленная от центра позиция (край линейного объекта)"""
+    center = points.mean(axis=0)
+    return int(np.hypot(*(points - center).T).argmax())
+
+
+# ==================== Данные и кэш ====================
+
+def load_positions(
+    db: Session, subobject_id: int, excluded: PositionIdSet = PositionIdSet()
+) -> Tuple[List[int], np.ndarray, str]:
+    """Позиции подобъекта с координатами, кроме исключенных, и версия набора (md5 id и координат)"""
+    params: Dict[str, Any] = {"subobject_id": subobject_id}
+    rows = db.execute(
+        text(f"""
+            SELECT position_id, x, y
+            FROM route_planner_positions
+            WHERE subobject_id = :subobject_id AND {excluded_positions_condition(excluded, "position_id", params)}
+            ORDER BY position_id
+        """),
+        params
+    ).all()
+    position_ids = [row.position_id for row in rows]
+    points = np.array([(row.x, row.y) for row in rows], dtype=np.float64).reshape(-1, 2)
+    digest = hashlib.md5(np.array(position_ids, dtype=np.int64).tobytes())
+    digest.update(points.tobytes())
+    version = digest.hexdigest()
+    return position_ids, points, version
+
+
+def coordinates_available(db: Session) -> bool:
+    return db.execute(text("SELECT to_regclass('route_planner_positions') IS NOT NULL")).scalar()
+
+
+def get_task_subobject(db: Session, task_id: int) -> Optional[int]:
+    return db.execute(
+        text("SELECT subobject_id FROM scheduler_tasks WHERE id = :task_id"),
+        {"task_id": task_id}
+    ).scalar()
+
+
+def plan_route(
+    project_id: int,
+    subobject_id: int,
+    position_ids: List[int],
+    points: np.ndarray,
+    version: str,
+    correction_degrees: float = 0.0,
+    start_position_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Маршрут обхода; поля совпадают с RoutePlanResponse.
+    start_position_id должен входить в position_ids (проверяет вызывающий)
+    """
+    key = (project_id, subobject_id, version, start_position_id, correction_degrees)
+    cached = route_plan_cache.get(key)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    started = time.monotonic()
+    corrected = apply_azimuth_correction(points, correction_degrees)
+    if start_position_id is not None:
+        start = position_ids.index(start_position_id)
+    else:
+        start = default_start(corrected)
+    order, length, initial_length, passes = solve_route(corrected, start)
+
+    stops = []
+    previous = None
+    for index in order.tolist():
+        x, y = corrected[index]
+        stop = {"position_id": position_ids[index], "x": float(x), "y": float(y), "leg_distance": 0.0, "bearing": None}
+        if previous is not None:
+            dx, dy = x - previous[0], y - previous[1]
+            stop["leg_distance"] = float(math.hypot(dx, dy))
+            stop["bearing"] = round(math.degrees(math.atan2(dx, dy)) % 360, 1)
+        stops.append(stop)
+        previous = (x, y)
+
+    result = {
+        "subobject_id": subobject_id,
+        "version": version,
+        "positions": len(position_ids),
+        "total_distance": round(length, 2),
+        "nearest_neighbour_distance": round(initial_length, 2),
+        "improvement_passes": passes,
+        "azimuth_correction": correction_degrees,
+        "order": stops,
+        "cached": False,
+    }
+    route_plan_cache.put(key, result)
+    logger.info(
+        "Route planned",
+        project_id=project_id,
+        subobject_id=subobject_id,
+        positions=len(position_ids),
+        distance=result["total_distance"],
+        greedy_distance=result["nearest_neighbour_distance"],
+        duration_ms=round((time.monotonic() - started) * 1000)
+    )
+    return result
@@ -0,0 +1,81 @@
+"""
+Календарь планировщика
+Окно задачи хранится как daterange (колонка period, db/project/007_scheduler_task_period.sql),
+запросы пересечения (&&) идут по GiST-индексу. Проверка предлагаемого расписания -
+один запрос: пересечения с существующими задачами подобъекта и между задачами запроса.
+"""
+
+import json
+from datetime import date
+from typing import Any, Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from core.schemas import SchedulerProposedTask
+
+
+def get_calendar(
+    db: Session,
+    date_from: date,
+    date_to: date,
+    subobject_id: Optional[int] = None,
+    cycle_id: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Задачи, пересекающиеся с окном [date_from, date_to]"""
+    rows = db.execute(
+        text("""
+            SELECT id, subobject_id, cycle_id, start_date, end_date
+            FROM scheduler_tasks
+            WHERE period && daterange(CAST(:date_from AS date), CAST(:date_to AS date), '[]')
+              AND (CAST(:subobject_id AS integer) IS NULL OR subobject_id = CAST(:subobject_id AS integer))
+              AND (CAST(:cycle_id AS integer) IS NULL OR cycle_id = CAST(:cycle_id AS integer))
+            ORDER BY start_date, id
+        """),
+        {"date_from": date_from, "date_to": date_to, "subobject_id": subobject_id, "cycle_id": cycle_id}
+    ).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def find_conflicts(db: Session, tasks: List[SchedulerProposedTask]) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Пересечения предлагаемых окон по подобъекту: {индекс задачи: [конфликты]}.
+    Существующая задача, переносимая в этом же запросе (task_id), сравнивается по новому окну
+    """
+    proposed = [
+        {
+            "idx": index,
+            "task_id": task.task_id,
+            "subobject_id": task.subobject_id,
+            "start_date": task.start_date.isoformat(),
+            "end_date": task.end_date.isoformat(),
+        }
+        for index, task in enumerate(tasks)
+    ]
+    rows = db.execute(
+        text("""
+            WITH proposed AS (
+                SELECT p.*, daterange(p.start_date, p.end_date, '[]') AS period
+                FROM jsonb_to_recordset(CAST(:tasks AS jsonb))
+                     AS p(idx integer, task_id integer, subobject_id integer, start_date date, end_date date)
+            )
+            SELECT p.idx, t.id AS task_id, NULL::integer AS other_index, t.start_date, t.end_date
+            FROM proposed p
+            JOIN scheduler_tasks t ON t.subobject_id = p.subobject_id AND t.period && p.period
+            WHERE NOT EXISTS (SELECT 1 FROM proposed moved WHERE moved.task_id = t.id)
+            UNION ALL
+            SELECT a.idx, b.task_id, b.idx, b.start_date, b.end_date
+            FROM proposed a
+            JOIN proposed b ON b.subobject_id = a.subobject_id AND b.idx <> a.idx AND b.period && a.period
+            ORDER BY 1, 4, 2
+        """),
+        {"tasks": json.dumps(proposed)}
+    ).all()
+
+    conflicts: Dict[int, List[Dict[str, Any]]] = {}
+    for row in rows:
+        conflicts.setdefault(row.idx, []).append({
+            "task_id": row.task_id,
+            "index": row.other_index,
+            "start_date": row.start_date,
+            "end_date": row.end_date,
+        })
+    return conflicts
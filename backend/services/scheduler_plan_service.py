@@ -0,0 +1,99 @@
+"""
+Генерация плана цикла
+Задачи для всех подобъектов создаются одним INSERT ... SELECT по subobject_totals
+(подобъекты с позициями, db/project/006_scheduler_progress.sql); в той же транзакции
+заводятся строки прогресса (подобъект, цикл). Подобъекты, у которых уже есть задача
+в цикле или задача с пересекающимся окном, пропускаются. Подобъект, все позиции которого
+исключены в metadata проекта, в план не попадает.
+
+Пересечение окон проверяется по подобъекту во всех циклах, поэтому генерации планов
+(любых циклов) блокируют друг от друга свои подобъекты - advisory-блокировки транзакции
+в порядке subobject_id.
+"""
+
+from typing import Any, Dict
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from core.schemas import SchedulerPlanRequest
+from services.project_metadata_service import excluded_positions_condition
+from utils.position_set import PositionIdSet
+
+
+def generate_plan(db: Session, request: SchedulerPlanRequest, excluded: PositionIdSet = PositionIdSet()) -> Dict[str, Any]:
+    """Создание задач цикла; поля результата совпадают с SchedulerPlanResponse. Коммит - на вызывающем"""
+    params: Dict[str, Any] = {
+        "cycle_id": request.cycle_id,
+        "start_date": request.start_date,
+        "end_date": request.end_date,
+        "subobject_ids": request.subobject_ids,
+    }
+    # Без исключений условие - TRUE, иначе у подобъекта должна остаться хотя бы одна позиция
+    active = "TRUE"
+    if excluded:
+        active = (
+            "EXISTS (SELECT 1 FROM positions p WHERE p.subobject_id = s.subobject_id "
+            f"AND {excluded_positions_condition(excluded, 'p.position_id', params)})"
+        )
+    scope = f"""
+        s.total_positions > 0 AND {active}
+        AND (CAST(:subobject_ids AS integer[]) IS NULL
+             OR s.subobject_id = ANY(CAST(:subobject_ids AS integer[])))
+    """
+    # Параллельная генерация с теми же подобъектами ждет первую (иначе обе увидят окна свободными);
+    # следующий оператор читает новый снимок и видит ее задачи
+    db.execute(
+        text(f"""
+            SELECT pg_advisory_xact_lock(hashtext('scheduler_plan'), subobject_id)
+            FROM (SELECT s.subobject_id FROM subobject_totals s WHERE {scope} ORDER BY s.subobject_id) locked
+        """),
+        params
+    ).all()
+    row = db.execute(
+        text(f"""
+            WITH candidates AS (
+                SELECT s.subobject_id,
+                       EXISTS (
+                           SELECT 1 FROM scheduler_tasks t
+                           WHERE t.subobject_id = s.subobject_id AND t.cycle_id = :cycle_id
+                       ) AS planned,
+                       EXISTS (
+                           SELECT 1 FROM scheduler_tasks t
+                           WHERE t.subobject_id = s.subobject_id
+                             AND t.period && daterange(CAST(:start_date AS date), CAST(:end_date AS date), '[]')
+                       ) AS overlapping
+                FROM subobject_totals s
+                WHERE {scope}
+            ),
+            created AS (
+                INSERT INTO scheduler_tasks (subobject_id, cycle_id, start_date, end_date, created_at, updated_at)
+                SELECT subobject_id, :cycle_id, CAST(:start_date AS date), CAST(:end_date AS date), now(), now()
+                FROM candidates
+                WHERE NOT planned AND NOT overlapping
+                ORDER BY subobject_id
+                RETURNING id, subobject_id
+            ),
+            progress AS (
+                INSERT INTO subobject_cycle_progress (subobject_id, cycle_id)
+                SELECT subobject_id, :cycle_id FROM created
+                ORDER BY subobject_id
+                ON CONFLICT (subobject_id, cycle_id) DO NOTHING
+            )
+            SELECT
+                (SELECT count(*) FROM candidates WHERE planned) AS skipped_existing,
+                (SELECT count(*) FROM candidates WHERE overlapping AND NOT planned) AS skipped_conflicts,
+                (SELECT COALESCE(array_agg(id ORDER BY subobject_id), '{{}}') FROM created) AS task_ids,
+                (SELECT COALESCE(array_agg(requested ORDER BY requested), '{{}}')
+                 FROM unnest(CAST(:subobject_ids AS integer[])) AS requested
+                 WHERE requested NOT IN (SELECT subobject_id FROM candidates)) AS not_found
+        """),
+        params
+    ).one()
+
+    return {
+        "cycle_id": request.cycle_id,
+        "created": len(row.task_ids),
+        "skipped_existing": row.skipped_existing,
+        "skipped_conflicts": row.skipped_conflicts,
+        "not_found": row.not_found,
+        "task_ids": row.task_ids,
+    }
@@ -0,0 +1,125 @@
+"""
+Прогресс задач планировщика
+Счетчики по (подобъект, цикл) поддерживаются триггерами БД проекта
+(db/project/006_scheduler_progress.sql) при записи осмотров, позиций и элементов.
+Список задач с прогрессом - один запрос по первичным ключам таблиц счетчиков.
+Исключенные позиции проекта (metadata, в БД проекта их нет) вычитаются из счетчиков
+при чтении: второй запрос считает только их вклад, по индексу позиций подобъектов задач.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from utils.position_set import PositionIdSet
+
+# Вклад исключенных позиций: всего по подобъекту (cycle_id NULL) и осмотрено по (подобъект, цикл)
+EXCLUDED_PROGRESS_SQL = """
+    WITH excluded_positions AS (
+        SELECT p.position_id, p.subobject_id
+        FROM positions p
+        WHERE p.subobject_id = ANY(CAST(:subobject_ids AS integer[]))
+          AND CAST(:excluded_positions AS int8multirange) @> CAST(p.position_id AS bigint)
+    ),
+    excluded_elements AS (
+        SELECT x.subobject_id, e.element_id, e.inspection_type
+        FROM excluded_positions x
+        JOIN scheduler_progress_elements e ON e.position_id = x.position_id
+    )
+    SELECT subobject_id, NULL::integer AS cycle_id,
+           (SELECT count(*) FROM excluded_positions x WHERE x.subobject_id = s.subobject_id) AS positions,
+           count(*) FILTER (WHERE inspection_type = 'dm') AS dm_elements,
+           count(*) FILTER (WHERE inspection_type = 'ts') AS ts_elements
+    FROM (SELECT DISTINCT subobject_id FROM excluded_positions) s
+    LEFT JOIN excluded_elements USING (subobject_id)
+    GROUP BY subobject_id
+    UNION ALL
+    SELECT x.subobject_id, c.cycle_id, count(*), 0, 0
+    FROM excluded_positions x
+    JOIN position_cycle_inspections c ON c.position_id = x.position_id
+    WHERE c.cycle_id = ANY(CAST(:cycle_ids AS integer[])) AND c.inspected > 0
+    GROUP BY x.subobject_id, c.cycle_id
+    UNION ALL
+    SELECT e.subobject_id, i.cycle_id, 0,
+           count(*) FILTER (WHERE i.inspection_type = 'dm'),
+           count(*) FILTER (WHERE i.inspection_type = 'ts')
+    FROM excluded_elements e
+    JOIN (
+        SELECT element_id, cycle_id, 'dm' AS inspection_type FROM dm_inspections
+        UNION ALL SELECT element_id, cycle_id, 'ts' FROM ts_inspections
+    ) i ON i.element_id = e.element_id
+    WHERE i.cycle_id = ANY(CAST(:cycle_ids AS integer[]))
+    GROUP BY e.subobject_id, i.cycle_id
+"""
+
+
+def _progress(completed: int, total: int) -> float:
+    if total <= 0:
+        return 0.0
+    return round(min(completed, total) * 100.0 / total, 1)
+
+
+def _excluded_progress(db: Session, rows: List[Dict[str, Any]], excluded: PositionIdSet) -> Dict[Tuple, Tuple[int, int, int]]:
+    """Вклад исключенных позиций: (подобъект, None) -> всего, (подобъект, цикл) -> осмотрено"""
+    result: Dict[Tuple, Tuple[int, int, int]] = {}
+    for row in db.execute(
+        text(EXCLUDED_PROGRESS_SQL),
+        {
+            "excluded_positions": excluded.to_multirange(),
+            "subobject_ids": sorted({row["subobject_id"] for row in rows}),
+            "cycle_ids": sorted({row["cycle_id"] for row in rows}),
+        }
+    ).all():
+        key = (row.subobject_id, row.cycle_id)
+        positions, dm_elements, ts_elements = result.get(key, (0, 0, 0))
+        result[key] = (positions + row.positions, dm_elements + row.dm_elements, ts_elements + row.ts_elements)
+    return result
+
+
+def list_task_progress(
+    db: Session,
+    cycle_id: Optional[int] = None,
+    task_ids: Optional[List[int]] = None,
+    excluded: PositionIdSet = PositionIdSet()
+) -> List[Dict[str, Any]]:
+    """
+    Прогресс задач (фильтры необязательны); поля совпадают с SchedulerTaskProgress.
+    excluded - исключенные позиции проекта, не входят ни во всего, ни в осмотрено
+    """
+    rows = db.execute(
+        text("""
+            SELECT t.id AS task_id, t.subobject_id, t.cycle_id,
+                   COALESCE(s.total_positions, 0) AS total_positions,
+                   COALESCE(p.completed_positions, 0) AS completed_positions,
+                   COALESCE(s.total_dm_elements, 0) AS total_dm_elements,
+                   COALESCE(p.completed_dm_elements, 0) AS completed_dm_elements,
+                   COALESCE(s.total_ts_elements, 0) AS total_ts_elements,
+                   COALESCE(p.completed_ts_elements, 0) AS completed_ts_elements
+            FROM scheduler_tasks t
+            LEFT JOIN subobject_totals s ON s.subobject_id = t.subobject_id
+            LEFT JOIN subobject_cycle_progress p ON p.subobject_id = t.subobject_id AND p.cycle_id = t.cycle_id
+            WHERE (CAST(:cycle_id AS integer) IS NULL OR t.cycle_id = CAST(:cycle_id AS integer))
+              AND (CAST(:task_ids AS integer[]) IS NULL OR t.id = ANY(CAST(:task_ids AS integer[])))
+            ORDER BY t.start_date, t.id
+        """),
+        {"cycle_id": cycle_id, "task_ids": task_ids}
+    ).mappings().all()
+
+    corrections = _excluded_progress(db, rows, excluded) if excluded and rows else {}
+    result = []
+    for row in rows:
+        item = dict(row)
+        for prefix, key in (("total", (row["subobject_id"], None)), ("completed", (row["subobject_id"], row["cycle_id"]))):
+            positions, dm_elements, ts_elements = corrections.get(key, (0, 0, 0))
+            item[f"{prefix}_positions"] = max(item[f"{prefix}_positions"] - positions, 0)
+            item[f"{prefix}_dm_elements"] = max(item[f"{prefix}_dm_elements"] - dm_elements, 0)
+            item[f"{prefix}_ts_elements"] = max(item[f"{prefix}_ts_elements"] - ts_elements, 0)
+        item["progress"] = _progress(item["completed_positions"], item["total_positions"])
+        result.append(item)
+    return result
+
+
+def reconcile_progress(db: Session) -> int:
+    """Сверка счетчиков с данными и исправление расхождений. Возвращает число ключей с расхождениями"""
+    drift = db.execute(text("SELECT reconcile_scheduler_progress()")).scalar()
+    db.commit()
+    return drift
@@ -0,0 +1,158 @@
+"""
+Дельта-синхронизация полевых клиентов
+Журнал sync_changes в БД проекта (db/project/003_sync_changes.sql) заполняется триггерами:
+одна строка на сущность с версией последнего изменения. Клиент запрашивает изменения
+после своей версии и получает только upsert-строки и tombstone удаленных сущностей.
+Синхронизация без изменений - один индексный запрос к журналу.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Type
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from core.inspection_types import DERIVED_RESPONSE_FIELDS, INSPECTION_TYPES, PHOTO_COLUMN
+from core.schemas import PositionAttributeBase, PositionAttributeRecord
+from utils.serialization import row_plan
+
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 5000
+
+
+@dataclass(frozen=True)
+class SyncEntity:
+    name: str
+    table: str
+    id_column: str
+    columns: Tuple[str, ...]
+    schema: Optional[Type[BaseModel]] = None  # Схема строки (None - строка выдается как есть)
+    exclude: Tuple[str, ...] = ()  # Поля схемы, которых нет в выдаче
+
+
+SYNC_ENTITIES: Dict[str, SyncEntity] = {
+    **{
+        key: SyncEntity(
+            key, inspection_type.table, "inspect_id", tuple(inspection_type.response_columns(include_photos=False)),
+            inspection_type.response_schema, (PHOTO_COLUMN, *DERIVED_RESPONSE_FIELDS)
+        )
+        for key, inspection_type in INSPECTION_TYPES.items()
+    },
+    "position_attributes": SyncEntity(
+        "position_attributes", "positions_attributes", "attr_id",
+        ("attr_id", "position_id", *PositionAttributeBase.model_fields), PositionAttributeRecord
+    ),
+    "scheduler_tasks": SyncEntity(
+        "scheduler_tasks", "scheduler_tasks", "id",
+        ("id", "subobject_id", "cycle_id", "start_date", "end_date", "created_at", "updated_at")
+    ),
+}
+
+
+@dataclass(frozen=True)
+class SyncCursor:
+    """Позиция внутри синхронизации: версия, которую получит клиент, и последняя выданная запись"""
+    version: int
+    tx: int
+    entity: str
+    entity_id: int
+
+    def encode(self) -> str:
+        return f"{self.version}.{self.tx}.{self.entity}.{self.entity_id}"
+
+    @classmethod
+    def decode(cls, value: str) -> "SyncCursor":
+        try:
+            version, tx, entity, entity_id = value.split(".")
+            return cls(int(version), int(tx), entity, int(entity_id))
+        except ValueError:
+            raise ValueError("Некорректный cursor")
+
+
+def _load_rows(db: Session, entity: SyncEntity, ids: List[int]) -> Dict[int, dict]:
+    rows = db.execute(
+        text(f"SELECT {', '.join(entity.columns)} FROM {entity.table} WHERE {entity.id_column} = ANY(:ids)"),
+        {"ids": ids}
+    ).mappings().all()
+    if entity.schema is None:
+        return {row[entity.id_column]: dict(row) for row in rows}
+    plan = row_plan(entity.schema, entity.exclude)
+    return {row[entity.id_column]: plan.to_dict(row) for row in rows}
+
+
+def get_changes(
+    db: Session,
+    since: int = 0,
+    cycle_id: Optional[int] = None,
+    limit: int = SYNC_PAGE_SIZE,
+    cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Изменения после версии since. cycle_id ограничивает сущности цикла (осмотры, задачи
+    планировщика); сущности без цикла (параметры позиций) выдаются всегда.
+    Возвращает готовый к кодированию dict в форме SyncChangesResponse (без полей None):
+    строки журнала не проходят через валидацию pydantic.
+    Осмотры архивированных циклов не выдаются: строки перенесены в снимок, клиенты хранят
+    свои копии; при разморозке возвращенные строки попадают в журнал заново
+    """
+    position = SyncCursor.decode(cursor) if cursor else None
+    limit = max(1, min(limit, SYNC_MAX_PAGE_SIZE))
+
+    after_condition = ""
+    params = {
+        "since": str(since), "cycle_id": cycle_id, "limit": limit + 1,
+        "inspection_entities": list(INSPECTION_TYPES)
+    }
+    if position is not None:
+        after_condition = "AND (tx, entity, entity_id) > (CAST(:after_tx AS xid8), :after_entity, :after_id)"
+        params.update(after_tx=str(position.tx), after_entity=position.entity, after_id=position.entity_id)
+
+    # Версия для клиента - xmin снимка: транзакции с меньшим ID завершены и уже видны
+    rows = db.execute(
+        text(f"""
+            SELECT CAST(pg_snapshot_xmin(pg_current_snapshot()) AS text) AS watermark,
+                   c.entity, c.entity_id, c.deleted, c.tx
+            FROM (SELECT 1) AS snapshot
+            LEFT JOIN LATERAL (
+                SELECT entity, entity_id, deleted, CAST(tx AS text) AS tx
+                FROM sync_changes
+                WHERE tx >= CAST(:since AS xid8)
+                  AND (CAST(:cycle_id AS integer) IS NULL OR cycle_id IS NULL OR cycle_id = CAST(:cycle_id AS integer))
+                  AND NOT (entity = ANY(CAST(:inspection_entities AS text[]))
+                           AND cycle_id IN (SELECT cycle_id FROM frozen_cycles WHERE archived))
+                  {after_condition}
+                ORDER BY tx, entity, entity_id
+                LIMIT :limit
+            ) c ON true
+        """),
+        params
+    ).all()
+
+    version = position.version if position is not None else int(rows[0].watermark)
+    changed = [row for row in rows if row.entity is not None]
+    has_more = len(changed) > limit
+    changed = changed[:limit]
+
+    upsert_ids: Dict[str, List[int]] = {}
+    for row in changed:
+        if not row.deleted and row.entity in SYNC_ENTITIES:
+            upsert_ids.setdefault(row.entity, []).append(row.entity_id)
+    loaded = {
+        name: _load_rows(db, SYNC_ENTITIES[name], ids)
+        for name, ids in upsert_ids.items()
+    }
+
+    changes = []
+    for row in changed:
+        data = loaded.get(row.entity, {}).get(row.entity_id)
+        # Строка удалена после чтения журнала - tombstone придет со следующей синхронизацией,
+        # но клиенту уже сейчас нужно ее удалить
+        if data is None:
+            changes.append({"entity": row.entity, "id": row.entity_id, "deleted": True})
+        else:
+            changes.append({"entity": row.entity, "id": row.entity_id, "deleted": False, "data": data})
+
+    response: Dict[str, Any] = {"version": version, "changes": changes}
+    if has_more:
+        last = changed[-1]
+        response["next_cursor"] = SyncCursor(version, int(last.tx), last.entity, last.entity_id).encode()
+    return response
@@ -0,0 +1,50 @@
+"""
+Эквивалентность быстрой сериализации строк (utils/serialization.py) и pydantic:
+JSON быстрого пути должен совпадать с Model.model_validate(row).model_dump(mode="json")
+для всех схем, которые отдаются через row_plan
+"""
+
+import orjson
+import pytest
+from core.inspection_types import DERIVED_RESPONSE_FIELDS, INSPECTION_TYPES, PHOTO_COLUMN
+from core.schemas import CycleResponse, PositionAttributeRecord
+from services.sync_service import SYNC_ENTITIES
+from utils.serialization import RowsJSONResponse, compare_with_pydantic, row_plan, rows_to_json, sample_rows
+
+RESPONSE_SCHEMAS = [inspection_type.response_schema for inspection_type in INSPECTION_TYPES.values()]
+
+
+@pytest.mark.parametrize("model", [*RESPONSE_SCHEMAS, CycleResponse, PositionAttributeRecord], ids=lambda m: m.__name__)
+@pytest.mark.parametrize("exclude", [(), (PHOTO_COLUMN,), (PHOTO_COLUMN, *DERIVED_RESPONSE_FIELDS)])
+def test_row_plan_matches_pydantic(model, exclude):
+    exclude = tuple(name for name in exclude if name in model.model_fields)
+    assert compare_with_pydantic(model, sample_rows(model, 30), exclude) == []
+
+
+@pytest.mark.parametrize("model", RESPONSE_SCHEMAS, ids=lambda m: m.__name__)
+def test_bytea_memoryview_encoded_like_validate_photos(model):
+    if PHOTO_COLUMN not in model.model_fields:
+        pytest.skip("В таблице нет колонки фото")
+    row = {**sample_rows(model, 2)[1], PHOTO_COLUMN: memoryview(b"\x00\xffphoto")}
+    assert compare_with_pydantic(model, [row]) == []
+
+
+@pytest.mark.parametrize("model", [*RESPONSE_SCHEMAS, CycleResponse], ids=lambda m: m.__name__)
+def test_missing_columns_get_schema_defaults(model):
+    required = {name for name, info in model.model_fields.items() if info.is_required()}
+    row = {name: value for name, value in sample_rows(model, 2)[1].items() if name in required}
+    assert compare_with_pydantic(model, [row]) == []
+
+
+def test_rows_to_json_is_json_array_of_model_dumps():
+    rows = sample_rows(CycleResponse, 10)
+    expected = [CycleResponse.model_validate(row).model_dump(mode="json") for row in rows]
+    assert orjson.loads(rows_to_json(CycleResponse, rows)) == expected
+    assert orjson.loads(RowsJSONResponse(CycleResponse, rows).body) == expected
+
+
+@pytest.mark.parametrize("name", [name for name, entity in SYNC_ENTITIES.items() if entity.schema is not None])
+def test_sync_entity_plan_covers_selected_columns(name):
+    """План строки синхронизации выдает ровно колонки, которые читает SELECT"""
+    entity = SYNC_ENTITIES[name]
+    assert {field for field, _, _ in row_plan(entity.schema, entity.exclude).fields} == set(entity.columns)
@@ -227,6 +227,23 @@ def check_user_permissions(user: User, required_role: str) -> bool:
     return user_level >= required_level
 
 
+# Иерархия ролей в проекте (ProjectPermission.role)
+PROJECT_ROLE_HIERARCHY = {
+    "no_access": 0,   # Нет доступа
+    "viewer": 1,      # Просмотр
+    "operator": 2,    # Ввод данных (осмотры, измерения)
+    "manager": 3      # Управление проектом
+}
+
+
+def check_project_permissions(project_role: Optional[str], required_role: str) -> bool:
+    """Проверка роли пользователя в проекте (отсутствие записи = no_access)"""
+    user_level = PROJECT_ROLE_HIERARCHY.get(project_role or "no_access", 0)
+    required_level = PROJECT_ROLE_HIERARCHY.get(required_role, 0)
+
+    return user_level > 0 and user_level >= required_level
+
+
 def get_encryption_key() -> bytes:
     """Получить ключ шифрования из переменной окружения или сгенерировать новый"""
     encryption_key = os.environ.get("ENCRYPTION_KEY")
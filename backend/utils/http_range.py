@@ -0,0 +1,100 @@
+"""
+Выдача файлов с поддержкой Range, If-Range и If-None-Match
+Общая для фото и полевых пакетов: докачка после обрыва связи, ответ 304 по ETag
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from fastapi import HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Диапазон из заголовка Range (только один диапазон; иначе - весь файл)"""
+    if not range_header:
+        return None
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+
+    start_text, end_text = match.groups()
+    if start_text:
+        start = int(start_text)
+        end = min(int(end_text), size - 1) if end_text else size - 1
+    else:
+        # bytes=-N - последние N байт
+        start = max(size - int(end_text), 0)
+        end = size - 1
+
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Недопустимый диапазон",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Совпадение ETag с заголовком If-None-Match (ответ 304)"""
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+def iter_file_range(path: Path, start: int = 0, end: Optional[int] = None, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """Чтение файла кусками в диапазоне [start, end] включительно"""
+    if end is None:
+        end = path.stat().st_size - 1
+    remaining = end - start + 1
+    with open(path, "rb") as source:
+        source.seek(start)
+        while remaining > 0:
+            chunk = source.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_response(
+    request: Request,
+    path: Path,
+    size: int,
+    media_type: str,
+    etag: str,
+    cache_control: str,
+    extra_headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Ответ с файлом: 304 по If-None-Match, 206 по Range (с учетом If-Range), для HEAD - только заголовки"""
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        **(extra_headers or {}),
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # If-Range: докачка только той же версии файла, иначе - файл целиком
+    if_range = request.headers.get("if-range")
+    byte_range = parse_range(request.headers.get("range"), size) if not if_range or if_range.strip() == etag else None
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, status.HTTP_200_OK
+    else:
+        (start, end), status_code = byte_range, status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+
+    return StreamingResponse(
+        iter_file_range(path, start, end),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type
+    )
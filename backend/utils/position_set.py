@@ -0,0 +1,159 @@
+"""
+Компактное множество ID позиций
+Хранится как отсортированные непересекающиеся диапазоны [start, end] (run-length),
+на линейных объектах исключенные позиции идут подряд, поэтому десятки тысяч ID
+занимают несколько диапазонов. Проверка принадлежности - бинарный поиск,
+объединение/разность/пересечение - линейное слияние диапазонов.
+"""
+
+from array import array
+from bisect import bisect_right
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+
+class PositionIdSet:
+    """Неизменяемое множество целых ID в виде диапазонов"""
+
+    __slots__ = ("_starts", "_ends", "_size")
+
+    def __init__(self, ids: Iterable[int] = ()):
+        starts, ends = array("q"), array("q")
+        for value in sorted(set(ids)):
+            if ends and value == ends[-1] + 1:
+                ends[-1] = value
+            else:
+                starts.append(value)
+                ends.append(value)
+        self._set_ranges(starts, ends)
+
+    def _set_ranges(self, starts: array, ends: array) -> None:
+        self._starts = starts
+        self._ends = ends
+        self._size = sum(end - start + 1 for start, end in zip(starts, ends))
+
+    @classmethod
+    def _from_sorted_ranges(cls, ranges: Iterable[Sequence[int]]) -> "PositionIdSet":
+        """Сборка из диапазонов, отсортированных по началу (пересекающиеся и смежные склеиваются)"""
+        starts, ends = array("q"), array("q")
+        for start, end in ranges:
+            if end < start:
+                continue
+            if ends and start <= ends[-1] + 1:
+                if end > ends[-1]:
+                    ends[-1] = end
+            else:
+                starts.append(start)
+                ends.append(end)
+        result = cls.__new__(cls)
+        result._set_ranges(starts, ends)
+        return result
+
+    @classmethod
+    def from_ranges(cls, ranges: Iterable[Sequence[int]]) -> "PositionIdSet":
+        """Множество из списка диапазонов [[start, end], ...] (границы включительно)"""
+        return cls._from_sorted_ranges(sorted((int(r[0]), int(r[1])) for r in ranges))
+
+    def to_ranges(self) -> List[List[int]]:
+        """Диапазоны [[start, end], ...] для хранения в JSON"""
+        return [[start, end] for start, end in zip(self._starts, self._ends)]
+
+    def to_list(self) -> List[int]:
+        return list(self)
+
+    def to_multirange(self) -> str:
+        """Литерал int8multirange для фильтрации в SQL: NOT (CAST(:ranges AS int8multirange) @> id)"""
+        return "{" + ",".join(f"[{start},{end + 1})" for start, end in zip(self._starts, self._ends)) + "}"
+
+    def _ranges(self) -> Iterator[tuple]:
+        return zip(self._starts, self._ends)
+
+    def __contains__(self, value: object) -> bool:
+        if not isinstance(value, int):
+            return False
+        index = bisect_right(self._starts, value) - 1
+        return index >= 0 and value <= self._ends[index]
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in self._ranges():
+            yield from range(start, end + 1)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return bool(self._starts)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PositionIdSet):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __hash__(self) -> int:
+        return hash((self._starts.tobytes(), self._ends.tobytes()))
+
+    def __repr__(self) -> str:
+        return f"PositionIdSet(size={self._size}, ranges={len(self._starts)})"
+
+    def union(self, other: "PositionIdSet") -> "PositionIdSet":
+        merged: List[tuple] = []
+        left, right = list(self._ranges()), list(other._ranges())
+        i = j = 0
+        while i < len(left) or j < len(right):
+            if j >= len(right) or (i < len(left) and left[i][0] <= right[j][0]):
+                merged.append(left[i])
+                i += 1
+            else:
+                merged.append(right[j])
+                j += 1
+        return self._from_sorted_ranges(merged)
+
+    def difference(self, other: "PositionIdSet") -> "PositionIdSet":
+        result: List[tuple] = []
+        cuts = list(other._ranges())
+        j = 0
+        for start, end in self._ranges():
+            while j < len(cuts) and cuts[j][1] < start:
+                j += 1
+            k = j
+            current = start
+            while k < len(cuts) and cuts[k][0] <= end:
+                if cuts[k][0] > current:
+                    result.append((current, cuts[k][0] - 1))
+                current = max(current, cuts[k][1] + 1)
+                k += 1
+            if current <= end:
+                result.append((current, end))
+        return self._from_sorted_ranges(result)
+
+    def intersection(self, other: "PositionIdSet") -> "PositionIdSet":
+        result: List[tuple] = []
+        left, right = list(self._ranges()), list(other._ranges())
+        i = j = 0
+        while i < len(left) and j < len(right):
+            start = max(left[i][0], right[j][0])
+            end = min(left[i][1], right[j][1])
+            if start <= end:
+                result.append((start, end))
+            if left[i][1] < right[j][1]:
+                i += 1
+            else:
+                j += 1
+        return self._from_sorted_ranges(result)
+
+    __or__ = union
+    __sub__ = difference
+    __and__ = intersection
+
+
+def position_set_from_metadata(
+    metadata: Optional[dict],
+    ranges_key: str = "excluded_position_ranges",
+    list_key: str = "excluded_positions"
+) -> PositionIdSet:
+    """Множество из metadata проекта: компактные диапазоны плюс старый формат списком"""
+    metadata = metadata or {}
+    result = PositionIdSet.from_ranges(metadata.get(ranges_key) or [])
+    legacy = metadata.get(list_key)
+    if legacy:
+        result = result | PositionIdSet(int(value) for value in legacy)
+    return result
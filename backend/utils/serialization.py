@@ -0,0 +1,173 @@
+"""
+Быстрая сериализация строк БД для эндпоинтов чтения
+Строки из БД доверенные, поэтому валидация pydantic (from_attributes, field_validator
+на каждой строке) не нужна: по схеме ответа один раз строится план полей, строка
+отображается в dict по плану и кодируется orjson. Результат совпадает с
+Model.model_validate(row).model_dump(mode="json") - тесты tests/test_serialization.py,
+замер: python manage.py bench-serialization.
+Используется потоковой выдачей осмотров, дельта-синхронизацией и списком циклов.
+"""
+
+import base64
+import typing
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Type
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+# Конвертер значения поля (None - значение кодируется orjson как есть)
+Converter = Optional[Callable[[Any], Any]]
+
+
+def _encode_bytes(value: Any) -> Any:
+    """bytea -> base64, как validate_photos в схемах осмотров"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode("utf-8")
+    return value
+
+
+def _dump_model(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    return value
+
+
+def json_default(value: Any) -> Any:
+    """Типы, которые orjson не кодирует сам (правила совпадают с pydantic mode="json")"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode("utf-8")
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=json_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON-ответ через orjson (без повторной проверки по response_model)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _annotation_types(annotation: Any) -> Tuple[Any, ...]:
+    args = typing.get_args(annotation)
+    if typing.get_origin(annotation) is typing.Union:
+        return tuple(arg for nested in args for arg in _annotation_types(nested))
+    return (annotation,)
+
+
+def _converter_for(annotation: Any) -> Converter:
+    types = _annotation_types(annotation)
+    if any(isinstance(t, type) and issubclass(t, BaseModel) for t in types):
+        return _dump_model
+    if bytes in types:
+        return _encode_bytes
+    return None
+
+
+class RowPlan:
+    """
+    План отображения строки в dict для схемы ответа (строится один раз на схему).
+    exclude - поля схемы, которых нет в выдаче (например, bytea фото в режиме descriptor)
+    """
+
+    __slots__ = ("model", "fields")
+
+    def __init__(self, model: Type[BaseModel], exclude: Tuple[str, ...] = ()):
+        self.model = model
+        self.fields: List[Tuple[str, Any, Converter]] = []
+        for name, info in model.model_fields.items():
+            if name in exclude:
+                continue
+            default = None if info.default is PydanticUndefined else info.default
+            self.fields.append((name, default, _converter_for(info.annotation)))
+
+    def to_dict(self, row: Mapping[str, Any]) -> Dict[str, Any]:
+        result = {}
+        for name, default, converter in self.fields:
+            value = row.get(name, default)
+            if converter is not None and value is not None:
+                value = converter(value)
+            result[name] = value
+        return result
+
+    def to_dicts(self, rows: Iterable[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+        return [self.to_dict(row) for row in rows]
+
+
+@lru_cache(maxsize=None)
+def row_plan(model: Type[BaseModel], exclude: Tuple[str, ...] = ()) -> RowPlan:
+    return RowPlan(model, exclude)
+
+
+def rows_to_json(model: Type[BaseModel], rows: Iterable[Mapping[str, Any]], exclude: Tuple[str, ...] = ()) -> bytes:
+    """JSON-массив строк по схеме model без валидации"""
+    return dumps(row_plan(model, exclude).to_dicts(rows))
+
+
+class RowsJSONResponse(JSONResponse):
+    """Ответ - список строк БД по схеме model (без валидации pydantic)"""
+
+    def __init__(self, model: Type[BaseModel], rows: Iterable[Mapping[str, Any]], **kwargs: Any):
+        self.model = model
+        super().__init__(rows, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        return rows_to_json(self.model, content)
+
+
+def compare_with_pydantic(
+    model: Type[BaseModel], rows: Iterable[Mapping[str, Any]], exclude: Tuple[str, ...] = ()
+) -> List[str]:
+    """Расхождения быстрого пути с model_validate + model_dump(mode="json") (пустой список - совпадает)"""
+    plan = row_plan(model, exclude)
+    mismatches = []
+    for index, row in enumerate(rows):
+        expected = orjson.loads(model.model_validate(dict(row)).model_dump_json(exclude=set(exclude)))
+        actual = orjson.loads(dumps(plan.to_dict(row)))
+        if expected != actual:
+            differing = sorted(key for key in expected.keys() | actual.keys() if expected.get(key) != actual.get(key))
+            mismatches.append(f"{model.__name__}[{index}]: {', '.join(differing)}")
+    return mismatches
+
+
+SAMPLE_VALUES: Dict[Any, Callable[[int], Any]] = {
+    bool: lambda i: i % 2 == 0,
+    int: lambda i: i,
+    float: lambda i: i * 0.25,
+    str: lambda i: f"value-{i}",
+    bytes: lambda i: bytes([i % 256]) * 16,
+}
+
+
+def sample_rows(model: Type[BaseModel], count: int) -> List[Dict[str, Any]]:
+    """
+    Синтетические строки по схеме (сравнение с pydantic и замер): все поля, в т.ч. bytea,
+    вложенные модели и NULL в необязательных полях
+    """
+    rows = []
+    for i in range(count):
+        row = {}
+        for name, info in model.model_fields.items():
+            all_types = _annotation_types(info.annotation)
+            types = [t for t in all_types if t is not type(None)]
+            if len(types) < len(all_types) and i % 3 == 0:
+                row[name] = None
+            elif isinstance(types[0], type) and issubclass(types[0], BaseModel):
+                row[name] = types[0](photo_id=f"{i:064x}", size=i, sha256=f"{i:064x}", url=f"/photos/{i}")
+            else:
+                row[name] = SAMPLE_VALUES[types[0]](i)
+        rows.append(row)
+    return rows
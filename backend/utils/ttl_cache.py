@@ -0,0 +1,45 @@
+"""
+Кэш в памяти процесса со временем жизни записи и поколениями ключей
+Загрузка значения идет без блокировки; поколение ключа увеличивается при инвалидации,
+и значение, загруженное до нее, в кэш не записывается. Время жизни ограничивает
+устаревание, когда инвалидация выполнена в другом процессе.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Generic, Hashable, Iterable, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class GenerationalTTLCache(Generic[K, V]):
+    """Ключ -> (время загрузки, значение) с поколениями ключей"""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: Dict[K, Tuple[float, V]] = {}
+        self._generations: Dict[K, int] = {}
+
+    def get_or_load(self, key: K, load: Callable[[], V]) -> V:
+        """Значение из кэша или загруженное load() (в кэш - если ключ не сброшен за время загрузки)"""
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+            return entry[1]
+
+        generation = self._generations.get(key, 0)
+        value = load()
+        with self._lock:
+            if self._generations.get(key, 0) == generation:
+                self._entries[key] = (time.monotonic(), value)
+        return value
+
+    def invalidate(self, keys: Optional[Iterable[K]] = None) -> None:
+        """Сброс ключей (None - сброс всего кэша)"""
+        with self._lock:
+            if keys is None:
+                keys = set(self._generations) | set(self._entries)
+            for key in keys:
+                self._generations[key] = self._generations.get(key, 0) + 1
+                self._entries.pop(key, None)
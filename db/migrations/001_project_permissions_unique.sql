@@ -0,0 +1,11 @@
+-- Уникальность прав пользователя в проекте: одна запись на пару (user_id, project_id)
+
+-- Удаляем дубликаты, оставляя последнюю запись
+DELETE FROM project_permissions pp
+USING project_permissions newer
+WHERE pp.user_id = newer.user_id
+  AND pp.project_id = newer.project_id
+  AND pp.id < newer.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_project_permissions_user_project
+    ON project_permissions (user_id, project_id);
@@ -0,0 +1,7 @@
+-- Метаданные фотографий осмотров (сами файлы - в PHOTO_STORAGE_DIR по SHA-256)
+CREATE TABLE IF NOT EXISTS photos (
+    sha256 VARCHAR(64) PRIMARY KEY,
+    size BIGINT NOT NULL,
+    content_type VARCHAR(100),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
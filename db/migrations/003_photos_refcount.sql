@@ -0,0 +1,6 @@
+-- Счетчик ссылок осмотров на фото и время последнего изменения (для сборщика мусора)
+ALTER TABLE photos ADD COLUMN IF NOT EXISTS ref_count INTEGER DEFAULT 0 NOT NULL;
+ALTER TABLE photos ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE;
+UPDATE photos SET updated_at = created_at WHERE updated_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS ix_photos_orphans ON photos (updated_at) WHERE ref_count = 0;
@@ -0,0 +1,22 @@
+-- Фоновые задачи копирования параметров позиций (PositionAttributesCopyRequest на крупную цель).
+-- Прогресс и запрос отмены хранятся в центральной БД: их видят все воркеры API
+CREATE TABLE IF NOT EXISTS position_attribute_copy_jobs (
+    id SERIAL PRIMARY KEY,
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    source_position_id INTEGER NOT NULL,
+    target_type VARCHAR(20) NOT NULL,
+    target_id INTEGER,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    total INTEGER NOT NULL DEFAULT 0,
+    processed INTEGER NOT NULL DEFAULT 0,
+    created INTEGER NOT NULL DEFAULT 0,
+    updated INTEGER NOT NULL DEFAULT 0,
+    cancel_requested BOOLEAN NOT NULL DEFAULT false,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS ix_position_attribute_copy_jobs_project_id ON position_attribute_copy_jobs (project_id);
@@ -0,0 +1,13 @@
+-- Принадлежность фото проектам: хранилище общее (одно содержимое - один файл), но фото
+-- выдается и считается загруженным (have-need, ссылка из пакета осмотров) только в проектах,
+-- куда оно было загружено. Связь пишется при загрузке фото в проект.
+-- Фото, загруженные до миграции, связываются командой manage.py photos-link-projects
+-- (по ссылкам photo_id в осмотрах БД проектов).
+CREATE TABLE IF NOT EXISTS photo_projects (
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    sha256 VARCHAR(64) NOT NULL REFERENCES photos(sha256) ON DELETE CASCADE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (project_id, sha256)
+);
+
+CREATE INDEX IF NOT EXISTS ix_photo_projects_sha256 ON photo_projects (sha256);
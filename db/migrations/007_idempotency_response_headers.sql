@@ -0,0 +1,3 @@
+-- Заголовки сохраненного ответа: повтор запроса получает их вместе с телом
+-- (список пар [имя, значение] в порядке ответа)
+ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS response_headers JSONB;
@@ -0,0 +1,8 @@
+-- БД проекта: ссылка осмотра на фото в хранилище (SHA-256) вместо bytea в строке.
+-- Чтение списков осмотров в режиме photos=descriptor не затрагивает колонку photos.
+ALTER TABLE dm_inspections ADD COLUMN IF NOT EXISTS photo_id VARCHAR(64);
+ALTER TABLE ts_inspections ADD COLUMN IF NOT EXISTS photo_id VARCHAR(64);
+ALTER TABLE rp_inspections ADD COLUMN IF NOT EXISTS photo_id VARCHAR(64);
+ALTER TABLE tss_inspections ADD COLUMN IF NOT EXISTS photo_id VARCHAR(64);
+ALTER TABLE ggs_inspections ADD COLUMN IF NOT EXISTS photo_id VARCHAR(64);
+ALTER TABLE tsg_inspections ADD COLUMN IF NOT EXISTS photo_id VARCHAR(64);
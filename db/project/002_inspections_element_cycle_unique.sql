@@ -0,0 +1,57 @@
+-- БД проекта: один осмотр элемента в цикле. Ключ (element_id, cycle_id) нужен пакетной
+-- записи (INSERT ... ON CONFLICT) - повторная отправка пакета обновляет осмотр, а не дублирует.
+--
+-- Существующие дубликаты не удаляются: в таблице остается последний осмотр (наибольший
+-- inspect_id), более ранние переносятся в <таблица>_duplicates для разбора вручную.
+-- Конфликтующие пары (element_id, cycle_id) перечисляются в WARNING.
+
+DO $$
+DECLARE
+    inspection_table text;
+    duplicates_table text;
+    moved integer;
+    conflicts text;
+BEGIN
+    FOREACH inspection_table IN ARRAY ARRAY[
+        'dm_inspections', 'ts_inspections', 'rp_inspections',
+        'tss_inspections', 'ggs_inspections', 'tsg_inspections'
+    ] LOOP
+        duplicates_table := inspection_table || '_duplicates';
+
+        EXECUTE format(
+            'SELECT string_agg(format(''(%%s, %%s) x%%s'', element_id, cycle_id, n), '', '' ORDER BY element_id, cycle_id)
+             FROM (SELECT element_id, cycle_id, count(*) AS n FROM %I
+                   GROUP BY element_id, cycle_id HAVING count(*) > 1) d',
+            inspection_table
+        ) INTO conflicts;
+
+        IF conflicts IS NOT NULL THEN
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I (LIKE %I, moved_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now())',
+                duplicates_table, inspection_table
+            );
+            EXECUTE format(
+                'WITH moved AS (
+                     DELETE FROM %1$I i
+                     WHERE EXISTS (
+                         SELECT 1 FROM %1$I newer
+                         WHERE newer.element_id = i.element_id
+                           AND newer.cycle_id = i.cycle_id
+                           AND newer.inspect_id > i.inspect_id
+                     )
+                     RETURNING i.*
+                 )
+                 INSERT INTO %2$I SELECT * FROM moved',
+                inspection_table, duplicates_table
+            );
+            GET DIAGNOSTICS moved = ROW_COUNT;
+            RAISE WARNING '%: % duplicate inspections moved to % (element_id, cycle_id): %',
+                inspection_table, moved, duplicates_table, conflicts;
+        END IF;
+
+        EXECUTE format(
+            'CREATE UNIQUE INDEX IF NOT EXISTS %I ON %I (element_id, cycle_id)',
+            'uq_' || inspection_table || '_element_cycle', inspection_table
+        );
+    END LOOP;
+END $$;
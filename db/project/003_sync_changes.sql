@@ -0,0 +1,99 @@
+-- БД проекта: журнал изменений для дельта-синхронизации полевых клиентов.
+-- Одна строка на сущность (последнее изменение), удаление оставляет tombstone (deleted = true).
+-- Версия - ID транзакции (xid8), монотонная в пределах БД проекта. Клиент получает
+-- версию = xmin снимка: все транзакции до нее завершены, поэтому изменения
+-- из транзакций, закоммиченных позже, не теряются.
+
+CREATE TABLE IF NOT EXISTS sync_changes (
+    entity VARCHAR(50) NOT NULL,  -- dm, ts, rp, tss, ggs, tsg, position_attributes, scheduler_tasks
+    entity_id BIGINT NOT NULL,
+    cycle_id INTEGER,  -- NULL - сущность не привязана к циклу
+    deleted BOOLEAN NOT NULL DEFAULT false,
+    tx XID8 NOT NULL,
+    PRIMARY KEY (entity, entity_id)
+);
+
+-- Запрос "изменения после версии" читается только из индекса
+CREATE INDEX IF NOT EXISTS ix_sync_changes_tx
+    ON sync_changes (tx, entity, entity_id) INCLUDE (cycle_id, deleted);
+
+-- Триггер уровня оператора: пакетная запись в тысячи строк - один INSERT в журнал.
+-- Аргументы: сущность, колонка ID, колонка цикла ('' - нет)
+CREATE OR REPLACE FUNCTION track_sync_changes() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    cycle_expression text := CASE WHEN TG_ARGV[2] = '' THEN 'NULL::integer' ELSE quote_ident(TG_ARGV[2]) END;
+    changed_rows text := CASE WHEN TG_OP = 'DELETE' THEN 'old_rows' ELSE 'new_rows' END;
+BEGIN
+    EXECUTE format(
+        'INSERT INTO sync_changes (entity, entity_id, cycle_id, deleted, tx)
+         SELECT DISTINCT ON (%2$I) %1$L, %2$I, %3$s, %4$L, pg_current_xact_id() FROM %5$I
+         ON CONFLICT (entity, entity_id) DO UPDATE
+         SET cycle_id = EXCLUDED.cycle_id, deleted = EXCLUDED.deleted, tx = EXCLUDED.tx',
+        TG_ARGV[0], TG_ARGV[1], cycle_expression, TG_OP = 'DELETE', changed_rows
+    );
+    RETURN NULL;
+END $$;
+
+-- Таблицы переходов допускаются только для триггера на одно событие - три триггера на таблицу
+CREATE OR REPLACE FUNCTION enable_sync_tracking(tracked_table text, entity text, id_column text, cycle_column text)
+RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF to_regclass(tracked_table) IS NULL THEN
+        RAISE NOTICE 'Table % not found, sync tracking skipped', tracked_table;
+        RETURN;
+    END IF;
+
+    EXECUTE format('DROP TRIGGER IF EXISTS sync_track_insert ON %I', tracked_table);
+    EXECUTE format('DROP TRIGGER IF EXISTS sync_track_update ON %I', tracked_table);
+    EXECUTE format('DROP TRIGGER IF EXISTS sync_track_delete ON %I', tracked_table);
+    EXECUTE format(
+        'CREATE TRIGGER sync_track_insert AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows
+         FOR EACH STATEMENT EXECUTE FUNCTION track_sync_changes(%L, %L, %L)',
+        tracked_table, entity, id_column, cycle_column
+    );
+    EXECUTE format(
+        'CREATE TRIGGER sync_track_update AFTER UPDATE ON %I REFERENCING NEW TABLE AS new_rows
+         FOR EACH STATEMENT EXECUTE FUNCTION track_sync_changes(%L, %L, %L)',
+        tracked_table, entity, id_column, cycle_column
+    );
+    EXECUTE format(
+        'CREATE TRIGGER sync_track_delete AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows
+         FOR EACH STATEMENT EXECUTE FUNCTION track_sync_changes(%L, %L, %L)',
+        tracked_table, entity, id_column, cycle_column
+    );
+END $$;
+
+SELECT enable_sync_tracking('dm_inspections', 'dm', 'inspect_id', 'cycle_id');
+SELECT enable_sync_tracking('ts_inspections', 'ts', 'inspect_id', 'cycle_id');
+SELECT enable_sync_tracking('rp_inspections', 'rp', 'inspect_id', 'cycle_id');
+SELECT enable_sync_tracking('tss_inspections', 'tss', 'inspect_id', 'cycle_id');
+SELECT enable_sync_tracking('ggs_inspections', 'ggs', 'inspect_id', 'cycle_id');
+SELECT enable_sync_tracking('tsg_inspections', 'tsg', 'inspect_id', 'cycle_id');
+SELECT enable_sync_tracking('positions_attributes', 'position_attributes', 'attr_id', '');
+SELECT enable_sync_tracking('scheduler_tasks', 'scheduler_tasks', 'id', 'cycle_id');
+
+-- Начальное наполнение: существующие строки попадают в первую синхронизацию
+INSERT INTO sync_changes (entity, entity_id, cycle_id, tx)
+SELECT 'dm', inspect_id, cycle_id, pg_current_xact_id() FROM dm_inspections
+UNION ALL SELECT 'ts', inspect_id, cycle_id, pg_current_xact_id() FROM ts_inspections
+UNION ALL SELECT 'rp', inspect_id, cycle_id, pg_current_xact_id() FROM rp_inspections
+UNION ALL SELECT 'tss', inspect_id, cycle_id, pg_current_xact_id() FROM tss_inspections
+UNION ALL SELECT 'ggs', inspect_id, cycle_id, pg_current_xact_id() FROM ggs_inspections
+UNION ALL SELECT 'tsg', inspect_id, cycle_id, pg_current_xact_id() FROM tsg_inspections
+ON CONFLICT (entity, entity_id) DO NOTHING;
+
+DO $$
+BEGIN
+    IF to_regclass('positions_attributes') IS NOT NULL THEN
+        INSERT INTO sync_changes (entity, entity_id, tx)
+        SELECT 'position_attributes', attr_id, pg_current_xact_id() FROM positions_attributes
+        ON CONFLICT (entity, entity_id) DO NOTHING;
+    END IF;
+    IF to_regclass('scheduler_tasks') IS NOT NULL THEN
+        INSERT INTO sync_changes (entity, entity_id, cycle_id, tx)
+        SELECT 'scheduler_tasks', id, cycle_id, pg_current_xact_id() FROM scheduler_tasks
+        ON CONFLICT (entity, entity_id) DO NOTHING;
+    END IF;
+END $$;
@@ -0,0 +1,112 @@
+-- БД проекта: сводка осмотров для дашбордов.
+-- Количество осмотренных элементов по (цикл, тип осмотра, inspectresult, state_id).
+-- Поддерживается триггерами уровня оператора на таблицах осмотров: любая запись
+-- (одиночная, пакетная, ручная правка в БД) меняет счетчики в той же транзакции.
+-- Эндпоинты сводки читают только эту таблицу, таблицы осмотров не агрегируются.
+
+CREATE TABLE IF NOT EXISTS inspection_summary (
+    cycle_id INTEGER NOT NULL,
+    inspection_type VARCHAR(10) NOT NULL,  -- dm, ts, rp, tss, ggs, tsg
+    inspectresult INTEGER,
+    state_id VARCHAR(50),
+    inspected INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT uq_inspection_summary UNIQUE NULLS NOT DISTINCT (cycle_id, inspection_type, inspectresult, state_id)
+);
+
+-- Дельта счетчиков: +1 за строку new_rows, -1 за строку old_rows (UPDATE - обе таблицы).
+-- Строки сводки обновляются в порядке ключа, чтобы параллельные пакеты не взаимоблокировались.
+-- Аргумент: тип осмотра
+CREATE OR REPLACE FUNCTION track_inspection_summary() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    changes text := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT cycle_id, inspectresult, state_id, 1 AS delta FROM new_rows'
+        WHEN 'DELETE' THEN 'SELECT cycle_id, inspectresult, state_id, -1 AS delta FROM old_rows'
+        ELSE 'SELECT cycle_id, inspectresult, state_id, 1 AS delta FROM new_rows
+              UNION ALL SELECT cycle_id, inspectresult, state_id, -1 FROM old_rows'
+    END;
+BEGIN
+    EXECUTE format(
+        'INSERT INTO inspection_summary AS s (cycle_id, inspection_type, inspectresult, state_id, inspected)
+         SELECT cycle_id, %L, inspectresult, state_id, sum(delta)
+         FROM (%s) AS changes
+         WHERE cycle_id IS NOT NULL
+         GROUP BY cycle_id, inspectresult, state_id
+         HAVING sum(delta) <> 0
+         ORDER BY cycle_id, inspectresult, state_id
+         ON CONFLICT ON CONSTRAINT uq_inspection_summary DO UPDATE
+         SET inspected = s.inspected + EXCLUDED.inspected',
+        TG_ARGV[0], changes
+    );
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION enable_inspection_summary(tracked_table text, inspection_type text)
+RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF to_regclass(tracked_table) IS NULL THEN
+        RAISE NOTICE 'Table % not found, inspection summary skipped', tracked_table;
+        RETURN;
+    END IF;
+
+    EXECUTE format('DROP TRIGGER IF EXISTS summary_track_insert ON %I', tracked_table);
+    EXECUTE format('DROP TRIGGER IF EXISTS summary_track_update ON %I', tracked_table);
+    EXECUTE format('DROP TRIGGER IF EXISTS summary_track_delete ON %I', tracked_table);
+    EXECUTE format(
+        'CREATE TRIGGER summary_track_insert AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows
+         FOR EACH STATEMENT EXECUTE FUNCTION track_inspection_summary(%L)',
+        tracked_table, inspection_type
+    );
+    EXECUTE format(
+        'CREATE TRIGGER summary_track_update AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+         FOR EACH STATEMENT EXECUTE FUNCTION track_inspection_summary(%L)',
+        tracked_table, inspection_type
+    );
+    EXECUTE format(
+        'CREATE TRIGGER summary_track_delete AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows
+         FOR EACH STATEMENT EXECUTE FUNCTION track_inspection_summary(%L)',
+        tracked_table, inspection_type
+    );
+END $$;
+
+-- Полный пересчет сводки (manage.py rebuild-inspection-summary).
+-- Блокировка сводки ждет завершения пишущих транзакций, новые записи ждут пересчета
+-- и затем применяют свою дельту к пересчитанным счетчикам
+CREATE OR REPLACE FUNCTION rebuild_inspection_summary()
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    inspection record;
+    rows_count integer;
+BEGIN
+    LOCK TABLE inspection_summary IN EXCLUSIVE MODE;
+    DELETE FROM inspection_summary;
+    FOR inspection IN
+        SELECT * FROM (VALUES
+            ('dm_inspections', 'dm'), ('ts_inspections', 'ts'), ('rp_inspections', 'rp'),
+            ('tss_inspections', 'tss'), ('ggs_inspections', 'ggs'), ('tsg_inspections', 'tsg')
+        ) AS t (tracked_table, inspection_type)
+    LOOP
+        CONTINUE WHEN to_regclass(inspection.tracked_table) IS NULL;
+        EXECUTE format(
+            'INSERT INTO inspection_summary (cycle_id, inspection_type, inspectresult, state_id, inspected)
+             SELECT cycle_id, %L, inspectresult, state_id, count(*)
+             FROM %I
+             WHERE cycle_id IS NOT NULL
+             GROUP BY cycle_id, inspectresult, state_id',
+            inspection.inspection_type, inspection.tracked_table
+        );
+    END LOOP;
+    SELECT count(*) INTO rows_count FROM inspection_summary;
+    RETURN rows_count;
+END $$;
+
+SELECT enable_inspection_summary('dm_inspections', 'dm');
+SELECT enable_inspection_summary('ts_inspections', 'ts');
+SELECT enable_inspection_summary('rp_inspections', 'rp');
+SELECT enable_inspection_summary('tss_inspections', 'tss');
+SELECT enable_inspection_summary('ggs_inspections', 'ggs');
+SELECT enable_inspection_summary('tsg_inspections', 'tsg');
+
+SELECT rebuild_inspection_summary();
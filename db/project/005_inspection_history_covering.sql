@@ -0,0 +1,43 @@
+-- БД проекта: история осмотров элемента по циклам из index-only scan.
+-- Уникальный индекс (element_id, cycle_id) из 002 заменяется на покрывающий с теми же
+-- ключами: INCLUDE - inspect_id, state_id и колонки чеклиста (все, кроме текста заметок и фото).
+-- Ключ тот же, поэтому INSERT ... ON CONFLICT (element_id, cycle_id) пакетной записи
+-- использует его как раньше, а второй индекс на те же ключи не нужен.
+-- Index-only scan требует актуальной карты видимости (autovacuum).
+
+DO $$
+DECLARE
+    inspection_table text;
+    index_name text;
+    included text;
+BEGIN
+    FOREACH inspection_table IN ARRAY ARRAY[
+        'dm_inspections', 'ts_inspections', 'rp_inspections',
+        'tss_inspections', 'ggs_inspections', 'tsg_inspections'
+    ] LOOP
+        CONTINUE WHEN to_regclass(inspection_table) IS NULL;
+        index_name := 'uq_' || inspection_table || '_element_cycle';
+
+        -- Индекс уже покрывающий - повторный запуск ничего не делает
+        CONTINUE WHEN EXISTS (
+            SELECT 1 FROM pg_index
+            WHERE indexrelid = to_regclass(index_name) AND indnatts > indnkeyatts
+        );
+
+        SELECT string_agg(quote_ident(column_name), ', ' ORDER BY ordinal_position) INTO included
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = inspection_table
+          AND column_name NOT IN ('element_id', 'cycle_id', 'note', 'photos', 'photo_id')
+          AND data_type NOT IN ('text', 'bytea');
+
+        EXECUTE format('DROP INDEX IF EXISTS %I', index_name || '_covering');
+        EXECUTE format(
+            'CREATE UNIQUE INDEX %I ON %I (element_id, cycle_id) INCLUDE (%s)',
+            index_name || '_covering', inspection_table, included
+        );
+        EXECUTE format('DROP INDEX IF EXISTS %I', index_name);
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', index_name || '_covering', index_name);
+        EXECUTE format('ANALYZE %I', inspection_table);
+    END LOOP;
+END $$;
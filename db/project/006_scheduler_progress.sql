@@ -0,0 +1,293 @@
+-- БД проекта: счетчики прогресса задач планировщика.
+-- Задача - это (подобъект, цикл), поэтому счетчики хранятся по этому ключу, а не по задаче:
+-- список задач - одно соединение scheduler_tasks с двумя таблицами счетчиков по индексам,
+-- а перенос задачи на другой подобъект/цикл не требует пересчета.
+--   subobject_totals - позиций и элементов DM/TS в подобъекте (триггеры на positions/elements)
+--   subobject_cycle_progress - осмотрено в цикле: позиций (хотя бы один осмотренный элемент)
+--                              и элементов DM/TS (триггеры на таблицах осмотров)
+--   position_cycle_inspections - осмотров позиции в цикле (для перехода позиции 0 <-> 1+)
+-- Счетчики меняются в транзакции записи; расхождения после ручных правок (например,
+-- перенос элемента на другую позицию) исправляет reconcile_scheduler_progress()
+-- (manage.py reconcile-scheduler-progress).
+
+CREATE TABLE IF NOT EXISTS subobject_totals (
+    subobject_id INTEGER PRIMARY KEY,
+    total_positions INTEGER NOT NULL DEFAULT 0,
+    total_dm_elements INTEGER NOT NULL DEFAULT 0,
+    total_ts_elements INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS subobject_cycle_progress (
+    subobject_id INTEGER NOT NULL,
+    cycle_id INTEGER NOT NULL,
+    completed_positions INTEGER NOT NULL DEFAULT 0,
+    completed_dm_elements INTEGER NOT NULL DEFAULT 0,
+    completed_ts_elements INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (subobject_id, cycle_id)
+);
+
+CREATE TABLE IF NOT EXISTS position_cycle_inspections (
+    position_id INTEGER NOT NULL,
+    cycle_id INTEGER NOT NULL,
+    inspected INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (position_id, cycle_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_scheduler_tasks_cycle ON scheduler_tasks (cycle_id);
+
+-- Ожидаемые значения счетчиков по текущим данным (пересчет и проверка расхождений)
+CREATE OR REPLACE FUNCTION expected_scheduler_progress(
+    OUT totals_sql text, OUT progress_sql text, OUT positions_sql text
+)
+LANGUAGE plpgsql AS $$
+DECLARE
+    inspections text := '';
+    inspection record;
+BEGIN
+    FOR inspection IN
+        SELECT * FROM (VALUES
+            ('dm_inspections', 'dm'), ('ts_inspections', 'ts'), ('rp_inspections', 'rp'),
+            ('tss_inspections', 'tss'), ('ggs_inspections', 'ggs'), ('tsg_inspections', 'tsg')
+        ) AS t (tracked_table, inspection_type)
+    LOOP
+        CONTINUE WHEN to_regclass(inspection.tracked_table) IS NULL;
+        inspections := inspections || CASE WHEN inspections = '' THEN '' ELSE ' UNION ALL ' END || format(
+            'SELECT element_id, cycle_id, %L AS inspection_type FROM %I WHERE cycle_id IS NOT NULL',
+            inspection.inspection_type, inspection.tracked_table
+        );
+    END LOOP;
+
+    totals_sql := '
+        SELECT p.subobject_id,
+               count(DISTINCT p.position_id)::integer AS total_positions,
+               count(e.element_id) FILTER (WHERE e.inspection_type = ''dm'')::integer AS total_dm_elements,
+               count(e.element_id) FILTER (WHERE e.inspection_type = ''ts'')::integer AS total_ts_elements
+        FROM positions p
+        LEFT JOIN scheduler_progress_elements e ON e.position_id = p.position_id
+        WHERE p.subobject_id IS NOT NULL
+        GROUP BY p.subobject_id';
+    positions_sql := format('
+        SELECT e.position_id, i.cycle_id, count(*)::integer AS inspected
+        FROM (%s) i
+        JOIN scheduler_progress_elements e ON e.element_id = i.element_id
+        GROUP BY e.position_id, i.cycle_id', inspections);
+    progress_sql := format('
+        SELECT e.subobject_id, i.cycle_id,
+               count(DISTINCT e.position_id)::integer AS completed_positions,
+               count(*) FILTER (WHERE i.inspection_type = ''dm'')::integer AS completed_dm_elements,
+               count(*) FILTER (WHERE i.inspection_type = ''ts'')::integer AS completed_ts_elements
+        FROM (%s) i
+        JOIN scheduler_progress_elements e ON e.element_id = i.element_id
+        WHERE e.subobject_id IS NOT NULL
+        GROUP BY e.subobject_id, i.cycle_id', inspections);
+END $$;
+
+-- Осмотры: дельта по (позиция, цикл); переход счетчика позиции через ноль меняет
+-- completed_positions. RETURNING upsert-а дает значение после конкурентных транзакций,
+-- поэтому переход определяется верно и при параллельной записи. Аргумент: тип осмотра
+CREATE OR REPLACE FUNCTION track_scheduler_progress() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    changes text := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT element_id, cycle_id, 1 AS delta FROM new_rows'
+        WHEN 'DELETE' THEN 'SELECT element_id, cycle_id, -1 AS delta FROM old_rows'
+        ELSE 'SELECT element_id, cycle_id, 1 AS delta FROM new_rows
+              UNION ALL SELECT element_id, cycle_id, -1 FROM old_rows'
+    END;
+BEGIN
+    EXECUTE format(
+        'WITH mapped AS (
+             SELECT e.position_id, e.subobject_id, c.cycle_id, sum(c.delta)::integer AS delta
+             FROM (%s) c
+             JOIN scheduler_progress_elements e ON e.element_id = c.element_id
+             WHERE c.cycle_id IS NOT NULL AND e.subobject_id IS NOT NULL
+             GROUP BY e.position_id, e.subobject_id, c.cycle_id
+             HAVING sum(c.delta) <> 0
+         ),
+         position_counts AS (
+             INSERT INTO position_cycle_inspections AS p (position_id, cycle_id, inspected)
+             SELECT position_id, cycle_id, delta FROM mapped
+             ORDER BY position_id, cycle_id
+             ON CONFLICT (position_id, cycle_id) DO UPDATE SET inspected = p.inspected + EXCLUDED.inspected
+             RETURNING p.position_id, p.cycle_id, p.inspected
+         )
+         INSERT INTO subobject_cycle_progress AS s
+             (subobject_id, cycle_id, completed_positions, completed_dm_elements, completed_ts_elements)
+         SELECT m.subobject_id, m.cycle_id,
+                sum(CASE
+                    WHEN p.inspected > 0 AND p.inspected - m.delta <= 0 THEN 1
+                    WHEN p.inspected <= 0 AND p.inspected - m.delta > 0 THEN -1
+                    ELSE 0
+                END)::integer,
+                CASE WHEN %2$L = ''dm'' THEN sum(m.delta)::integer ELSE 0 END,
+                CASE WHEN %2$L = ''ts'' THEN sum(m.delta)::integer ELSE 0 END
+         FROM mapped m
+         JOIN position_counts p ON p.position_id = m.position_id AND p.cycle_id = m.cycle_id
+         GROUP BY m.subobject_id, m.cycle_id
+         ORDER BY m.subobject_id, m.cycle_id
+         ON CONFLICT (subobject_id, cycle_id) DO UPDATE
+         SET completed_positions = s.completed_positions + EXCLUDED.completed_positions,
+             completed_dm_elements = s.completed_dm_elements + EXCLUDED.completed_dm_elements,
+             completed_ts_elements = s.completed_ts_elements + EXCLUDED.completed_ts_elements',
+        changes, TG_ARGV[0]
+    );
+    RETURN NULL;
+END $$;
+
+-- Позиции и элементы меняются редко: итоги затронутых подобъектов пересчитываются целиком.
+-- Аргумент: выражение, дающее subobject_id строки переходной таблицы
+CREATE OR REPLACE FUNCTION track_subobject_totals() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    changed_rows text := CASE TG_OP
+        WHEN 'INSERT' THEN format('SELECT %s AS subobject_id FROM new_rows r', TG_ARGV[0])
+        WHEN 'DELETE' THEN format('SELECT %s AS subobject_id FROM old_rows r', TG_ARGV[0])
+        ELSE format('SELECT %1$s AS subobject_id FROM new_rows r UNION SELECT %1$s FROM old_rows r', TG_ARGV[0])
+    END;
+BEGIN
+    EXECUTE format(
+        'WITH affected AS (
+             SELECT DISTINCT subobject_id FROM (%s) a WHERE subobject_id IS NOT NULL
+         )
+         INSERT INTO subobject_totals AS t (subobject_id, total_positions, total_dm_elements, total_ts_elements)
+         SELECT a.subobject_id,
+                (SELECT count(*) FROM positions p WHERE p.subobject_id = a.subobject_id),
+                (SELECT count(*) FROM scheduler_progress_elements e
+                 WHERE e.subobject_id = a.subobject_id AND e.inspection_type = ''dm''),
+                (SELECT count(*) FROM scheduler_progress_elements e
+                 WHERE e.subobject_id = a.subobject_id AND e.inspection_type = ''ts'')
+         FROM affected a
+         ORDER BY a.subobject_id
+         ON CONFLICT (subobject_id) DO UPDATE
+         SET total_positions = EXCLUDED.total_positions,
+             total_dm_elements = EXCLUDED.total_dm_elements,
+             total_ts_elements = EXCLUDED.total_ts_elements',
+        changed_rows
+    );
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION enable_statement_triggers(tracked_table text, prefix text, function_name text, argument text)
+RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', prefix || '_insert', tracked_table);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', prefix || '_update', tracked_table);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', prefix || '_delete', tracked_table);
+    EXECUTE format(
+        'CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows
+         FOR EACH STATEMENT EXECUTE FUNCTION %I(%L)',
+        prefix || '_insert', tracked_table, function_name, argument
+    );
+    EXECUTE format(
+        'CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+         FOR EACH STATEMENT EXECUTE FUNCTION %I(%L)',
+        prefix || '_update', tracked_table, function_name, argument
+    );
+    EXECUTE format(
+        'CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows
+         FOR EACH STATEMENT EXECUTE FUNCTION %I(%L)',
+        prefix || '_delete', tracked_table, function_name, argument
+    );
+END $$;
+
+-- Проверка счетчиков: пересчет по данным, исправление расхождений.
+-- Возвращает число ключей с расхождениями (0 - счетчики верны)
+CREATE OR REPLACE FUNCTION reconcile_scheduler_progress()
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    expected record;
+    drift integer;
+    total_drift integer := 0;
+BEGIN
+    -- Пишущие транзакции дожидаются проверки и применяют дельты к исправленным счетчикам
+    LOCK TABLE subobject_totals, subobject_cycle_progress, position_cycle_inspections IN EXCLUSIVE MODE;
+    SELECT * INTO expected FROM expected_scheduler_progress();
+
+    EXECUTE format('CREATE TEMP TABLE expected_rows ON COMMIT DROP AS %s', expected.totals_sql);
+    SELECT count(DISTINCT subobject_id) INTO drift FROM (
+        (SELECT * FROM expected_rows EXCEPT SELECT * FROM subobject_totals)
+        UNION ALL (SELECT * FROM subobject_totals WHERE total_positions + total_dm_elements + total_ts_elements <> 0
+                   EXCEPT SELECT * FROM expected_rows)
+    ) d;
+    IF drift > 0 THEN
+        DELETE FROM subobject_totals;
+        INSERT INTO subobject_totals SELECT * FROM expected_rows;
+    END IF;
+    total_drift := total_drift + drift;
+    DROP TABLE expected_rows;
+
+    EXECUTE format('CREATE TEMP TABLE expected_rows ON COMMIT DROP AS %s', expected.progress_sql);
+    SELECT count(DISTINCT (subobject_id, cycle_id)) INTO drift FROM (
+        (SELECT * FROM expected_rows EXCEPT SELECT * FROM subobject_cycle_progress)
+        UNION ALL (SELECT * FROM subobject_cycle_progress WHERE completed_positions + completed_dm_elements + completed_ts_elements <> 0
+                   EXCEPT SELECT * FROM expected_rows)
+    ) d;
+    IF drift > 0 THEN
+        DELETE FROM subobject_cycle_progress;
+        INSERT INTO subobject_cycle_progress SELECT * FROM expected_rows;
+    END IF;
+    total_drift := total_drift + drift;
+    DROP TABLE expected_rows;
+
+    EXECUTE format('CREATE TEMP TABLE expected_rows ON COMMIT DROP AS %s', expected.positions_sql);
+    SELECT count(DISTINCT (position_id, cycle_id)) INTO drift FROM (
+        (SELECT * FROM expected_rows EXCEPT SELECT * FROM position_cycle_inspections)
+        UNION ALL (SELECT * FROM position_cycle_inspections WHERE inspected <> 0 EXCEPT SELECT * FROM expected_rows)
+    ) d;
+    IF drift > 0 THEN
+        DELETE FROM position_cycle_inspections;
+        INSERT INTO position_cycle_inspections SELECT * FROM expected_rows;
+    END IF;
+    total_drift := total_drift + drift;
+    DROP TABLE expected_rows;
+
+    RETURN total_drift;
+END $$;
+
+-- Связь элемента с позицией и типом. Если в БД проекта колонки называются иначе,
+-- достаточно переопределить это представление - триггеры и пересчет используют только его
+DO $$
+DECLARE
+    inspection record;
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'elements' AND column_name = 'position_id'
+    ) OR NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'elements' AND column_name = 'element_type'
+    ) THEN
+        RAISE NOTICE 'elements.position_id/element_type not found, scheduler progress tracking skipped';
+        RETURN;
+    END IF;
+
+    CREATE OR REPLACE VIEW scheduler_progress_elements AS
+    SELECT e.id AS element_id, e.position_id, p.subobject_id, e.element_type AS inspection_type
+    FROM elements e
+    JOIN positions p ON p.position_id = e.position_id;
+
+    CREATE INDEX IF NOT EXISTS ix_positions_subobject ON positions (subobject_id);
+    CREATE INDEX IF NOT EXISTS ix_elements_position ON elements (position_id);
+
+    FOR inspection IN
+        SELECT * FROM (VALUES
+            ('dm_inspections', 'dm'), ('ts_inspections', 'ts'), ('rp_inspections', 'rp'),
+            ('tss_inspections', 'tss'), ('ggs_inspections', 'ggs'), ('tsg_inspections', 'tsg')
+        ) AS t (tracked_table, inspection_type)
+    LOOP
+        CONTINUE WHEN to_regclass(inspection.tracked_table) IS NULL;
+        PERFORM enable_statement_triggers(
+            inspection.tracked_table, 'progress_track', 'track_scheduler_progress', inspection.inspection_type
+        );
+    END LOOP;
+
+    PERFORM enable_statement_triggers('positions', 'totals_track', 'track_subobject_totals', 'r.subobject_id');
+    PERFORM enable_statement_triggers(
+        'elements', 'totals_track', 'track_subobject_totals',
+        '(SELECT p.subobject_id FROM positions p WHERE p.position_id = r.position_id)'
+    );
+
+    PERFORM reconcile_scheduler_progress();
+END $$;
@@ -0,0 +1,59 @@
+-- БД проекта: окно задачи планировщика как daterange с GiST-индексом.
+-- period вычисляется из start_date/end_date (обе даты включительно), поэтому код,
+-- пишущий даты, не меняется. Запросы календаря (period && окно) и проверка пересечений
+-- по подобъекту идут по индексу.
+-- Если доступно расширение btree_gist и пересекающихся задач нет, добавляется ограничение
+-- исключения: задачи одного подобъекта не пересекаются по датам.
+
+DO $$
+DECLARE
+    has_btree_gist boolean := true;
+BEGIN
+    IF to_regclass('scheduler_tasks') IS NULL THEN
+        RAISE NOTICE 'Table scheduler_tasks not found, task period skipped';
+        RETURN;
+    END IF;
+
+    -- Даты, хранившиеся строками YYYY-MM-DD, переводятся в date
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'scheduler_tasks' AND column_name = 'start_date') <> 'date' THEN
+        ALTER TABLE scheduler_tasks ALTER COLUMN start_date TYPE date USING CAST(start_date AS date);
+    END IF;
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'scheduler_tasks' AND column_name = 'end_date') <> 'date' THEN
+        ALTER TABLE scheduler_tasks ALTER COLUMN end_date TYPE date USING CAST(end_date AS date);
+    END IF;
+
+    ALTER TABLE scheduler_tasks
+        ADD COLUMN IF NOT EXISTS period daterange
+        GENERATED ALWAYS AS (daterange(start_date, end_date, '[]')) STORED;
+
+    CREATE INDEX IF NOT EXISTS ix_scheduler_tasks_period ON scheduler_tasks USING gist (period);
+
+    BEGIN
+        CREATE EXTENSION IF NOT EXISTS btree_gist;
+    EXCEPTION WHEN OTHERS THEN
+        has_btree_gist := false;
+        RAISE NOTICE 'Extension btree_gist unavailable, per-subobject period index skipped';
+    END;
+    IF NOT has_btree_gist THEN
+        RETURN;
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'ex_scheduler_tasks_subobject_period') THEN
+        RETURN;
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM scheduler_tasks a
+        JOIN scheduler_tasks b ON a.subobject_id = b.subobject_id AND a.id < b.id AND a.period && b.period
+    ) THEN
+        -- Пересечения уже есть в данных: только индекс, ограничение - после разбора конфликтов
+        RAISE NOTICE 'Overlapping scheduler tasks found, exclusion constraint skipped';
+        CREATE INDEX IF NOT EXISTS ix_scheduler_tasks_subobject_period ON scheduler_tasks USING gist (subobject_id, period);
+    ELSE
+        ALTER TABLE scheduler_tasks
+            ADD CONSTRAINT ex_scheduler_tasks_subobject_period
+            EXCLUDE USING gist (subobject_id WITH =, period WITH &&);
+    END IF;
+END $$;
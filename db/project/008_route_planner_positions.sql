@@ -0,0 +1,28 @@
+-- БД проекта: координаты позиций для планировщика маршрута обхода.
+-- Планировщик читает только представление route_planner_positions; если в БД проекта
+-- координаты хранятся иначе, достаточно переопределить его.
+-- Источник: positions.x/y, иначе средние координаты элементов позиции (elements.x/y).
+
+DO $$
+BEGIN
+    IF (SELECT count(*) FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'positions' AND column_name IN ('x', 'y')) = 2 THEN
+        CREATE OR REPLACE VIEW route_planner_positions AS
+        SELECT position_id, subobject_id, x, y
+        FROM positions
+        WHERE x IS NOT NULL AND y IS NOT NULL;
+    ELSIF (SELECT count(*) FROM information_schema.columns
+           WHERE table_schema = current_schema() AND table_name = 'elements' AND column_name IN ('x', 'y', 'position_id')) = 3 THEN
+        CREATE OR REPLACE VIEW route_planner_positions AS
+        SELECT p.position_id, p.subobject_id, avg(e.x) AS x, avg(e.y) AS y
+        FROM positions p
+        JOIN elements e ON e.position_id = p.position_id
+        WHERE e.x IS NOT NULL AND e.y IS NOT NULL
+        GROUP BY p.position_id, p.subobject_id;
+    ELSE
+        RAISE NOTICE 'Position coordinates not found, route_planner_positions skipped';
+        RETURN;
+    END IF;
+
+    CREATE INDEX IF NOT EXISTS ix_positions_subobject ON positions (subobject_id);
+END $$;
@@ -0,0 +1,55 @@
+-- БД проекта: одна строка параметров на позицию. Ключ position_id нужен пакетному
+-- обновлению параметров (INSERT ... ON CONFLICT (position_id) DO UPDATE).
+--
+-- Существующие дубликаты не удаляются: в таблице остается последняя запись позиции
+-- (наибольший attr_id), более ранние переносятся в positions_attributes_duplicates
+-- для разбора вручную. Конфликтующие position_id перечисляются в WARNING.
+
+DO $$
+DECLARE
+    moved integer;
+    conflicts text;
+BEGIN
+    IF to_regclass('positions_attributes') IS NULL THEN
+        RAISE NOTICE 'Table positions_attributes not found, position key skipped';
+        RETURN;
+    END IF;
+
+    -- Ключ мог быть создан вместе с таблицей
+    IF EXISTS (
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = 'positions_attributes'::regclass
+          AND i.indisunique AND i.indnkeyatts = 1 AND i.indpred IS NULL
+          AND a.attname = 'position_id'
+    ) THEN
+        RETURN;
+    END IF;
+
+    SELECT string_agg(format('%s x%s', position_id, n), ', ' ORDER BY position_id) INTO conflicts
+    FROM (SELECT position_id, count(*) AS n FROM positions_attributes
+          GROUP BY position_id HAVING count(*) > 1) d;
+
+    IF conflicts IS NOT NULL THEN
+        CREATE TABLE IF NOT EXISTS positions_attributes_duplicates (
+            LIKE positions_attributes,
+            moved_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        );
+        WITH moved_rows AS (
+            DELETE FROM positions_attributes a
+            WHERE EXISTS (
+                SELECT 1 FROM positions_attributes newer
+                WHERE newer.position_id = a.position_id
+                  AND newer.attr_id > a.attr_id
+            )
+            RETURNING a.*
+        )
+        INSERT INTO positions_attributes_duplicates SELECT * FROM moved_rows;
+        GET DIAGNOSTICS moved = ROW_COUNT;
+        RAISE WARNING 'positions_attributes: % duplicate rows moved to positions_attributes_duplicates (position_id): %',
+            moved, conflicts;
+    END IF;
+
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_positions_attributes_position ON positions_attributes (position_id);
+END $$;
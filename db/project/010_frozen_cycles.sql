@@ -0,0 +1,166 @@
+-- БД проекта: замороженные циклы (снимок на диске, services/cycle_snapshot_service.py).
+-- Строка пишется в транзакции заморозки и удаляется в транзакции разморозки: пакетная запись
+-- осмотров проверяет ее под разделяемой advisory-блокировкой цикла и отклоняет осмотры
+-- замороженного цикла, поэтому правки не теряются за снимком.
+--
+-- Архивация (archive = true) переносит строки цикла в снимок, а не удаляет осмотры:
+--   * журнал синхронизации не получает tombstone - полевые клиенты сохраняют свои копии,
+--     а изменения архивированного цикла не выдаются до разморозки (строк в таблицах нет);
+--   * счетчики прогресса задач планировщика цикла сохраняются (ни архивация, ни возврат
+--     строк их не меняют), пересчет reconcile_scheduler_progress() их не трогает.
+-- Транзакция заморозки/разморозки сообщает триггерам о переносе через
+-- set_config('app.cycle_archive', 'archive' | 'restore', true).
+
+CREATE TABLE IF NOT EXISTS frozen_cycles (
+    cycle_id INTEGER PRIMARY KEY,
+    archived BOOLEAN NOT NULL DEFAULT false,
+    frozen_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION track_sync_changes() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    cycle_expression text := CASE WHEN TG_ARGV[2] = '' THEN 'NULL::integer' ELSE quote_ident(TG_ARGV[2]) END;
+    changed_rows text := CASE WHEN TG_OP = 'DELETE' THEN 'old_rows' ELSE 'new_rows' END;
+BEGIN
+    -- Архивация цикла: строки переносятся в снимок, клиентам удалять нечего.
+    -- Возврат строк при разморозке журналируется: клиенты, подключившиеся во время архива, их получат
+    IF current_setting('app.cycle_archive', true) = 'archive' THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format(
+        'INSERT INTO sync_changes (entity, entity_id, cycle_id, deleted, tx)
+         SELECT DISTINCT ON (%2$I) %1$L, %2$I, %3$s, %4$L, pg_current_xact_id() FROM %5$I
+         ON CONFLICT (entity, entity_id) DO UPDATE
+         SET cycle_id = EXCLUDED.cycle_id, deleted = EXCLUDED.deleted, tx = EXCLUDED.tx',
+        TG_ARGV[0], TG_ARGV[1], cycle_expression, TG_OP = 'DELETE', changed_rows
+    );
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION track_scheduler_progress() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    changes text := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT element_id, cycle_id, 1 AS delta FROM new_rows'
+        WHEN 'DELETE' THEN 'SELECT element_id, cycle_id, -1 AS delta FROM old_rows'
+        ELSE 'SELECT element_id, cycle_id, 1 AS delta FROM new_rows
+              UNION ALL SELECT element_id, cycle_id, -1 FROM old_rows'
+    END;
+BEGIN
+    -- Перенос строк цикла в снимок и обратно не меняет прогресс: счетчики архивированного цикла сохраняются
+    IF current_setting('app.cycle_archive', true) IN ('archive', 'restore') THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format(
+        'WITH mapped AS (
+             SELECT e.position_id, e.subobject_id, c.cycle_id, sum(c.delta)::integer AS delta
+             FROM (%s) c
+             JOIN scheduler_progress_elements e ON e.element_id = c.element_id
+             WHERE c.cycle_id IS NOT NULL AND e.subobject_id IS NOT NULL
+             GROUP BY e.position_id, e.subobject_id, c.cycle_id
+             HAVING sum(c.delta) <> 0
+         ),
+         position_counts AS (
+             INSERT INTO position_cycle_inspections AS p (position_id, cycle_id, inspected)
+             SELECT position_id, cycle_id, delta FROM mapped
+             ORDER BY position_id, cycle_id
+             ON CONFLICT (position_id, cycle_id) DO UPDATE SET inspected = p.inspected + EXCLUDED.inspected
+             RETURNING p.position_id, p.cycle_id, p.inspected
+         )
+         INSERT INTO subobject_cycle_progress AS s
+             (subobject_id, cycle_id, completed_positions, completed_dm_elements, completed_ts_elements)
+         SELECT m.subobject_id, m.cycle_id,
+                sum(CASE
+                    WHEN p.inspected > 0 AND p.inspected - m.delta <= 0 THEN 1
+                    WHEN p.inspected <= 0 AND p.inspected - m.delta > 0 THEN -1
+                    ELSE 0
+                END)::integer,
+                CASE WHEN %2$L = ''dm'' THEN sum(m.delta)::integer ELSE 0 END,
+                CASE WHEN %2$L = ''ts'' THEN sum(m.delta)::integer ELSE 0 END
+         FROM mapped m
+         JOIN position_counts p ON p.position_id = m.position_id AND p.cycle_id = m.cycle_id
+         GROUP BY m.subobject_id, m.cycle_id
+         ORDER BY m.subobject_id, m.cycle_id
+         ON CONFLICT (subobject_id, cycle_id) DO UPDATE
+         SET completed_positions = s.completed_positions + EXCLUDED.completed_positions,
+             completed_dm_elements = s.completed_dm_elements + EXCLUDED.completed_dm_elements,
+             completed_ts_elements = s.completed_ts_elements + EXCLUDED.completed_ts_elements',
+        changes, TG_ARGV[0]
+    );
+    RETURN NULL;
+END $$;
+
+-- Пересчет счетчиков не трогает архивированные циклы: их осмотров нет в таблицах,
+-- счетчики сохранены с момента архивации
+CREATE OR REPLACE FUNCTION reconcile_scheduler_progress()
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    expected record;
+    drift integer;
+    total_drift integer := 0;
+BEGIN
+    -- Пишущие транзакции дожидаются проверки и применяют дельты к исправленным счетчикам
+    LOCK TABLE subobject_totals, subobject_cycle_progress, position_cycle_inspections IN EXCLUSIVE MODE;
+    SELECT * INTO expected FROM expected_scheduler_progress();
+
+    EXECUTE format('CREATE TEMP TABLE expected_rows ON COMMIT DROP AS %s', expected.totals_sql);
+    SELECT count(DISTINCT subobject_id) INTO drift FROM (
+        (SELECT * FROM expected_rows EXCEPT SELECT * FROM subobject_totals)
+        UNION ALL (SELECT * FROM subobject_totals WHERE total_positions + total_dm_elements + total_ts_elements <> 0
+                   EXCEPT SELECT * FROM expected_rows)
+    ) d;
+    IF drift > 0 THEN
+        DELETE FROM subobject_totals;
+        INSERT INTO subobject_totals SELECT * FROM expected_rows;
+    END IF;
+    total_drift := total_drift + drift;
+    DROP TABLE expected_rows;
+
+    EXECUTE format(
+        'CREATE TEMP TABLE expected_rows ON COMMIT DROP AS
+         SELECT * FROM (%s) e WHERE e.cycle_id NOT IN (SELECT cycle_id FROM frozen_cycles WHERE archived)',
+        expected.progress_sql
+    );
+    SELECT count(DISTINCT (subobject_id, cycle_id)) INTO drift FROM (
+        (SELECT * FROM expected_rows
+         EXCEPT SELECT * FROM subobject_cycle_progress
+                WHERE cycle_id NOT IN (SELECT cycle_id FROM frozen_cycles WHERE archived))
+        UNION ALL (SELECT * FROM subobject_cycle_progress
+                   WHERE completed_positions + completed_dm_elements + completed_ts_elements <> 0
+                     AND cycle_id NOT IN (SELECT cycle_id FROM frozen_cycles WHERE archived)
+                   EXCEPT SELECT * FROM expected_rows)
+    ) d;
+    IF drift > 0 THEN
+        DELETE FROM subobject_cycle_progress WHERE cycle_id NOT IN (SELECT cycle_id FROM frozen_cycles WHERE archived);
+        INSERT INTO subobject_cycle_progress SELECT * FROM expected_rows;
+    END IF;
+    total_drift := total_drift + drift;
+    DROP TABLE expected_rows;
+
+    EXECUTE format(
+        'CREATE TEMP TABLE expected_rows ON COMMIT DROP AS
+         SELECT * FROM (%s) e WHERE e.cycle_id NOT IN (SELECT cycle_id FROM frozen_cycles WHERE archived)',
+        expected.positions_sql
+    );
+    SELECT count(DISTINCT (position_id, cycle_id)) INTO drift FROM (
+        (SELECT * FROM expected_rows
+         EXCEPT SELECT * FROM position_cycle_inspections
+                WHERE cycle_id NOT IN (SELECT cycle_id FROM frozen_cycles WHERE archived))
+        UNION ALL (SELECT * FROM position_cycle_inspections
+                   WHERE inspected <> 0
+                     AND cycle_id NOT IN (SELECT cycle_id FROM frozen_cycles WHERE archived)
+                   EXCEPT SELECT * FROM expected_rows)
+    ) d;
+    IF drift > 0 THEN
+        DELETE FROM position_cycle_inspections WHERE cycle_id NOT IN (SELECT cycle_id FROM frozen_cycles WHERE archived);
+        INSERT INTO position_cycle_inspections SELECT * FROM expected_rows;
+    END IF;
+    total_drift := total_drift + drift;
+    DROP TABLE expected_rows;
+
+    RETURN total_drift;
+END $$;
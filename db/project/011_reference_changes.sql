@@ -0,0 +1,42 @@
+-- БД проекта: версии справочников для полевых пакетов (services/field_package_service.py).
+-- Справочники (объекты, подобъекты, позиции, элементы, состояния) не входят в журнал
+-- sync_changes, но копируются в пакет целиком: их изменение должно давать новую версию данных.
+-- Одна строка на таблицу - последняя транзакция, изменившая справочник (xid8, как tx журнала).
+
+CREATE TABLE IF NOT EXISTS reference_changes (
+    table_name VARCHAR(50) PRIMARY KEY,
+    tx XID8 NOT NULL
+);
+
+-- Триггер уровня оператора без таблиц переходов: достаточно номера транзакции
+CREATE OR REPLACE FUNCTION track_reference_changes() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO reference_changes (table_name, tx)
+    VALUES (TG_TABLE_NAME, pg_current_xact_id())
+    ON CONFLICT (table_name) DO UPDATE SET tx = EXCLUDED.tx;
+    RETURN NULL;
+END $$;
+
+DO $$
+DECLARE
+    reference_table text;
+BEGIN
+    FOREACH reference_table IN ARRAY ARRAY['objects', 'subobjects', 'positions', 'elements', 'states'] LOOP
+        IF to_regclass(reference_table) IS NULL THEN
+            RAISE NOTICE 'Table % not found, reference tracking skipped', reference_table;
+            CONTINUE;
+        END IF;
+
+        EXECUTE format('DROP TRIGGER IF EXISTS reference_track_changes ON %I', reference_table);
+        EXECUTE format(
+            'CREATE TRIGGER reference_track_changes AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I
+             FOR EACH STATEMENT EXECUTE FUNCTION track_reference_changes()',
+            reference_table
+        );
+        -- Начальная версия: пакеты, собранные до миграции, пересобираются один раз
+        INSERT INTO reference_changes (table_name, tx)
+        VALUES (reference_table, pg_current_xact_id())
+        ON CONFLICT (table_name) DO NOTHING;
+    END LOOP;
+END $$;